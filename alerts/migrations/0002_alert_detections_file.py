@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='detections_file',
+            field=models.FileField(blank=True, null=True, upload_to='alerts/detections/'),
+        ),
+    ]
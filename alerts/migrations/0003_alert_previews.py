@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0002_alert_detections_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='contact_sheet',
+            field=models.ImageField(blank=True, null=True, upload_to='alerts/thumbnails/'),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='preview',
+            field=models.FileField(blank=True, null=True, upload_to='alerts/thumbnails/'),
+        ),
+    ]
@@ -56,6 +56,10 @@ class Alert(models.Model):
     # Media storage
     video_file = models.FileField(upload_to='alerts/videos/', blank=True, null=True)
     thumbnail = models.ImageField(upload_to='alerts/thumbnails/', blank=True, null=True)
+    contact_sheet = models.ImageField(upload_to='alerts/thumbnails/', blank=True, null=True)
+    preview = models.FileField(upload_to='alerts/thumbnails/', blank=True, null=True)
+    # Per-frame boxes for videos stored without burned-in overlays (gzipped JSON)
+    detections_file = models.FileField(upload_to='alerts/detections/', blank=True, null=True)
     
     # Metadata
     notes = models.TextField(blank=True, null=True)
@@ -286,4 +286,86 @@ class AlertViewSet(viewsets.ModelViewSet):
                 'data': {},
                 'message': 'Error retrieving video file.',
                 'errors': [str(e)]
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=True, methods=['get'])
+    def detections(self, request, pk=None):
+        """Get the per-frame detections of an alert video, for drawing overlays client-side."""
+        alert = self.get_object()
+        
+        file_path = os.path.join(settings.MEDIA_ROOT, str(alert.detections_file)) if alert.detections_file else None
+        if not file_path or not os.path.exists(file_path):
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'No detections file available for this alert.',
+                'errors': ['Detections file not found.']
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            from utils.detection_track import DetectionTrack
+            
+            track = DetectionTrack.load(file_path)
+            return Response({
+                'success': True,
+                'data': track.to_dict(),
+                'message': 'Detections retrieved successfully.',
+                'errors': []
+            })
+            
+        except Exception as e:
+            logger.error(f"Error retrieving detections for alert {alert.id}: {str(e)}")
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'Error retrieving detections.',
+                'errors': [str(e)]
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=True, methods=['get'], url_path='annotated-video')
+    def annotated_video(self, request, pk=None):
+        """
+        Get the alert video with detection boxes drawn in.
+        A video that has not been rendered yet is queued for rendering; the response carries
+        the task id to poll, and the video is served once the task has finished.
+        """
+        alert = self.get_object()
+        
+        if not alert.video_file or not os.path.exists(os.path.join(settings.MEDIA_ROOT, str(alert.video_file))):
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'No video file available for this alert.',
+                'errors': ['Video file not found.']
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            if alert.detections_file:
+                from utils.video_processor import VideoProcessor
+                from detectors.tasks import render_annotated_video
+                
+                file_path = VideoProcessor().get_annotated_video(alert)
+                if file_path is None:
+                    result = render_annotated_video.delay(alert.id)
+                    return Response({
+                        'success': True,
+                        'data': {'task_id': result.id, 'state': result.state},
+                        'message': 'Annotated video queued for rendering.',
+                        'errors': []
+                    }, status=status.HTTP_202_ACCEPTED)
+            else:
+                # Videos processed in annotated mode already have the boxes drawn in
+                file_path = os.path.join(settings.MEDIA_ROOT, str(alert.video_file))
+            
+            response = FileResponse(open(file_path, 'rb'))
+            response['Content-Disposition'] = f'inline; filename="{os.path.basename(file_path)}"'
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error retrieving annotated video for alert {alert.id}: {str(e)}")
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'Error retrieving annotated video.',
+                'errors': [str(e)]
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1,13 +1,16 @@
 # cameras/consumers.py
 
 import json
+import asyncio
 import logging
-import base64
 from typing import Dict, Any
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from utils.adaptive_quality import QUALITY_TIERS, AdaptiveQuality
 from utils.camera_stream_manager import stream_manager
+from utils.frame_bus import frame_bus
+from utils.frame_protocol import BINARY_SUBPROTOCOL, PROTOCOLS, negotiate_protocol
 
 logger = logging.getLogger('security_ai')
 
@@ -20,6 +23,10 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
         self.session_id = None
         self.group_name = None
         self.user = None
+        self.protocol = 'json'
+        self.frames = None
+        self.frame_task = None
+        self.rate = None
     
     async def connect(self):
         """Handle WebSocket connection"""
@@ -42,18 +49,29 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
             import uuid
             self.session_id = str(uuid.uuid4())
             
-            # Join camera group
+            # Join camera group; it carries control events, frames come from the frame bus
             self.group_name = f"camera_{self.camera_id}"
             await self.channel_layer.group_add(self.group_name, self.channel_name)
+            # A slow client is sent the newest frame, stepped down in quality, or paused
+            # while stalled, so frames never pile up for it
+            self.rate = AdaptiveQuality(pace_frames=False)
+            self.frames = frame_bus.subscribe(self.group_name, latest=True)
+            self.frame_task = asyncio.ensure_future(self.forward_frames())
+            
+            # Clients offering the binary subprotocol get frames as binary messages
+            self.protocol, subprotocol = negotiate_protocol(self.scope)
             
             # Accept connection
-            await self.accept()
+            await self.accept(subprotocol=subprotocol)
             
             # Send connection confirmation
             await self.send(text_data=json.dumps({
                 'type': 'connection_established',
                 'camera_id': self.camera_id,
                 'session_id': self.session_id,
+                'protocol': self.protocol,
+                'protocols': list(PROTOCOLS),
+                'binary_subprotocol': BINARY_SUBPROTOCOL,
                 'message': 'Connected to camera stream'
             }))
             
@@ -72,6 +90,12 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
                     self.camera_id, self.session_id
                 )
             
+            # Stop receiving frames
+            if self.frame_task:
+                self.frame_task.cancel()
+            if self.frames:
+                self.frames.close()
+            
             # Leave camera group
             if self.group_name:
                 await self.channel_layer.group_discard(self.group_name, self.channel_name)
@@ -81,9 +105,16 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error in WebSocket disconnect: {str(e)}")
     
-    async def receive(self, text_data):
-        """Handle messages from WebSocket"""
+    async def receive(self, text_data=None, bytes_data=None):
+        """Handle messages from WebSocket; clients only send JSON control messages"""
         try:
+            if text_data is None:
+                await self.send(text_data=json.dumps({
+                    'type': 'error',
+                    'message': 'Control messages must be JSON text'
+                }))
+                return
+            
             data = json.loads(text_data)
             message_type = data.get('type')
             
@@ -93,8 +124,12 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
                 await self.handle_stop_stream(data)
             elif message_type == 'change_quality':
                 await self.handle_change_quality(data)
+            elif message_type == 'set_protocol':
+                await self.handle_set_protocol(data)
             elif message_type == 'ping':
                 await self.send(text_data=json.dumps({'type': 'pong'}))
+            elif message_type == 'pong':
+                await self.apply_quality(self.rate.on_pong(data.get('id')))
             else:
                 await self.send(text_data=json.dumps({
                     'type': 'error',
@@ -127,16 +162,18 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
                 }))
                 return
             
-            # Start streaming
+            # Start streaming; frames for this session arrive through the frame bus
             success = await database_sync_to_async(stream_manager.start_stream)(
                 self.camera_id,
                 str(self.user.id),
                 self.session_id,
                 camera.stream_url,
-                quality
+                quality,
+                self.protocol
             )
             
             if success:
+                self.rate.request(quality if quality in QUALITY_TIERS else 'medium')
                 await self.send(text_data=json.dumps({
                     'type': 'stream_started',
                     'camera_id': self.camera_id,
@@ -187,35 +224,20 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
         try:
             quality = data.get('quality', 'medium')
             
-            # Stop current stream
-            await database_sync_to_async(stream_manager.stop_stream)(
-                self.camera_id, self.session_id
-            )
-            
-            # Get camera details
-            camera = await self.get_camera()
-            if not camera:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': 'Camera not found'
-                }))
-                return
-            
-            # Start stream with new quality
-            success = await database_sync_to_async(stream_manager.start_stream)(
-                self.camera_id,
-                str(self.user.id),
-                self.session_id,
-                camera.stream_url,
-                quality
+            # The camera's capture is shared, so only this session's encoding changes
+            success = await database_sync_to_async(stream_manager.change_quality)(
+                self.camera_id, self.session_id, quality
             )
             
             if success:
+                # The chosen quality is also the ceiling automatic changes stay under
+                self.rate.request(quality)
                 await self.send(text_data=json.dumps({
                     'type': 'quality_changed',
                     'camera_id': self.camera_id,
                     'session_id': self.session_id,
-                    'quality': quality
+                    'quality': quality,
+                    'automatic': False
                 }))
             else:
                 await self.send(text_data=json.dumps({
@@ -230,23 +252,78 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
                 'message': 'Failed to change quality'
             }))
     
-    async def stream_frame(self, event):
+    async def handle_set_protocol(self, data):
+        """Switch between JSON and binary frame messages"""
+        protocol = data.get('protocol')
+        if protocol not in PROTOCOLS:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f'Unknown protocol: {protocol}'
+            }))
+            return
+        
+        self.protocol = protocol
+        # Running streams switch at the next frame; otherwise it applies when the stream starts
+        await database_sync_to_async(stream_manager.set_protocol)(
+            self.camera_id, self.session_id, protocol
+        )
+        
+        await self.send(text_data=json.dumps({
+            'type': 'protocol_changed',
+            'protocol': protocol
+        }))
+    
+    async def apply_quality(self, quality):
+        """Move the session to the quality picked for its connection, if it changed"""
+        if quality is None:
+            return
+        
+        if await database_sync_to_async(stream_manager.change_quality)(self.camera_id, self.session_id, quality):
+            await self.send(text_data=json.dumps({
+                'type': 'quality_changed',
+                'camera_id': self.camera_id,
+                'session_id': self.session_id,
+                'quality': quality,
+                'automatic': True,
+                'connection': self.rate.get_stats()
+            }))
+    
+    async def forward_frames(self):
+        """Send the camera's frames from the frame bus for as long as the connection lasts"""
+        async for metadata, payloads in self.frames:
+            if self.session_id not in metadata['sessions']:
+                continue
+            
+            # Pings queue behind the frames, so their round trips measure the client's backlog
+            ping = self.rate.next_ping()
+            if ping:
+                await self.send(text_data=json.dumps(ping))
+            await self.apply_quality(self.rate.check_stall())
+            
+            if self.rate.allow_frame():
+                await self.stream_frame(metadata, payloads)
+    
+    async def stream_frame(self, metadata, payloads):
         """Send frame to WebSocket client"""
         try:
-            # Only send frames for our session
-            if event.get('session_id') != self.session_id:
+            # Only send frames due for our session
+            name = metadata['sessions'].get(self.session_id)
+            if name is None:
                 return
             
-            # Encode frame as base64
-            frame_b64 = base64.b64encode(event['frame']).decode('utf-8')
+            # Binary frames are the header and JPEG packed by the capture hub, sent as-is
+            if name.startswith('binary:'):
+                await self.send(bytes_data=payloads[name])
+                return
             
+            # Frames arrive base64-encoded once per rendition by the capture hub
             await self.send(text_data=json.dumps({
                 'type': 'frame',
-                'camera_id': event['camera_id'],
-                'session_id': event['session_id'],
-                'frame': frame_b64,
-                'frame_number': event['frame_number'],
-                'timestamp': event['timestamp']
+                'camera_id': metadata['camera_id'],
+                'session_id': self.session_id,
+                'frame': payloads[name],
+                'frame_number': metadata['frame_number'],
+                'timestamp': metadata['timestamp']
             }))
             
         except Exception as e:
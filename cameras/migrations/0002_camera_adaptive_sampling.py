@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='adaptive_sampling',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='idle_frame_stride',
+            field=models.IntegerField(default=30),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='motion_frame_stride',
+            field=models.IntegerField(default=2),
+        ),
+        migrations.AddField(
+            model_name='camera',
+            name='motion_threshold',
+            field=models.FloatField(default=0.02),
+        ),
+    ]
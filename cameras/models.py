@@ -39,6 +39,12 @@ class Camera(models.Model):
     image_size = models.IntegerField(default=640)
     frame_rate = models.IntegerField(default=10)  # Process every nth frame
     
+    # Adaptive sampling: process every nth frame while there is motion, every mth when static
+    adaptive_sampling = models.BooleanField(default=True)
+    motion_frame_stride = models.IntegerField(default=2)
+    idle_frame_stride = models.IntegerField(default=30)
+    motion_threshold = models.FloatField(default=0.02)  # Fraction of changed pixels
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Camera'
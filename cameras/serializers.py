@@ -86,6 +86,7 @@ class CameraSettingsSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'detection_enabled', 'fire_smoke_detection', 'fall_detection',
             'violence_detection', 'choking_detection', 'face_recognition',
-            'confidence_threshold', 'iou_threshold', 'image_size', 'frame_rate'
+            'confidence_threshold', 'iou_threshold', 'image_size', 'frame_rate',
+            'adaptive_sampling', 'motion_frame_stride', 'idle_frame_stride', 'motion_threshold'
         )
         read_only_fields = ('id',)
\ No newline at end of file
@@ -2,11 +2,21 @@ from .fire_smoke_detector import FireSmokeDetector
 from .fall_detector import FallDetector
 from .violence_detector import ViolenceDetector
 from .choking_detector import ChokingDetector
+from .batching import FrameBatcher
+from .detections import Detections, render_detections
+from .registry import ModelRegistry, model_registry
+from .scheduler import InferenceScheduler
 
 # Export all detector classes
 __all__ = [
     'FireSmokeDetector',
     'FallDetector',
     'ViolenceDetector',
-    'ChokingDetector'
+    'ChokingDetector',
+    'FrameBatcher',
+    'Detections',
+    'render_detections',
+    'ModelRegistry',
+    'model_registry',
+    'InferenceScheduler'
 ]
\ No newline at end of file
@@ -0,0 +1,59 @@
+import os
+import sys
+import logging
+from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger('security_ai')
+
+# manage.py commands that serve requests and should warm up like a worker would
+SERVING_COMMANDS = ('runserver', 'runworker')
+
+def start_model_warm_up(**kwargs):
+    """Warm every preloaded detector at the image size it is configured for"""
+    from .registry import model_registry
+    from utils.model_manager import ModelManager
+
+    model_manager = ModelManager()
+    image_sizes = {}
+    for key in settings.DETECTION_SETTINGS['PRELOAD_DETECTORS']:
+        if key not in settings.MODEL_PATHS:
+            continue
+        # Like validate_models, tolerate missing weights instead of failing health checks forever
+        if not os.path.exists(settings.MODEL_PATHS[key]):
+            logger.warning(f"Not warming up {key}: model file not found at {settings.MODEL_PATHS[key]}")
+            continue
+        image_sizes[key] = model_manager.get_detector_config(key)['image_size']
+
+    # Health checks report the worker as not ready until this finishes
+    model_registry.start_warm_up(image_sizes)
+
+    logger.info(f"Started model warm-up for: {', '.join(image_sizes)}")
+
+
+class DetectorsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'detectors'
+    
+    def ready(self):
+        if not settings.DETECTION_SETTINGS['PRELOAD_MODELS']:
+            return
+        
+        # The Celery parent process only forks the pool; a warm-up thread there would leave
+        # its locks, torch thread pools and 'warming' status to every child. Each pool
+        # process warms up its own models once it has been forked instead.
+        if _is_celery_worker():
+            from celery.signals import worker_process_init
+            worker_process_init.connect(start_model_warm_up, weak=False)
+            return
+        
+        # Skip one-off management commands such as migrate or collectstatic
+        if sys.argv[0].endswith('manage.py') and (len(sys.argv) < 2 or sys.argv[1] not in SERVING_COMMANDS):
+            return
+        
+        start_model_warm_up()
+
+
+def _is_celery_worker():
+    program = sys.argv[0]
+    return os.path.basename(program) == 'celery' or program.endswith(os.path.join('celery', '__main__.py'))
@@ -0,0 +1,282 @@
+import os
+import json
+import glob
+import shutil
+import hashlib
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+import numpy as np
+import torch
+from django.conf import settings
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+from ultralytics.utils.ops import scale_boxes
+
+try:
+    from ultralytics.utils.nms import non_max_suppression
+except ImportError:  # ultralytics < 8.4
+    from ultralytics.utils.ops import non_max_suppression
+
+from .engine import preprocess_frames
+
+logger = logging.getLogger('security_ai')
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Return a short sha256 of a file's contents, used to key exported models"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class RuntimeModel:
+    """
+    YOLO-compatible wrapper around an exported model run by a non-PyTorch runtime.
+    predict returns ultralytics Results objects, so detector callers see the same
+    contract whichever backend is in use.
+    """
+
+    def __init__(self, runner, names, model_path):
+        self.runner = runner
+        self.names = names
+        self.model_path = model_path
+        self.predictor = None
+
+    def predict(self, source, conf=0.25, iou=0.45, imgsz=640, **kwargs):
+        """Run the model on one frame or a list of frames"""
+        frames = list(source) if isinstance(source, (list, tuple)) else [source]
+        tensor = preprocess_frames(frames, imgsz)
+        return self.predict_tensor(tensor, frames, conf, iou)
+
+    def predict_tensor(self, tensor, frames, conf, iou):
+        """Run the model on an already letterboxed (N, 3, S, S) tensor of the given frames"""
+        preds = torch.from_numpy(self.runner(tensor.numpy()))
+        detections = non_max_suppression(preds, conf, iou)
+
+        results = []
+        for det, frame in zip(detections, frames):
+            det[:, :4] = scale_boxes(tensor.shape[2:], det[:, :4], frame.shape)
+            results.append(Results(frame, path=self.model_path, names=self.names, boxes=det))
+        return results
+
+
+class InferenceBackend(ABC):
+    """Loads detector weights for one inference runtime"""
+
+    name = 'torch'
+
+    def __init__(self, intra_op_threads=0, inter_op_threads=0):
+        """Initialize the backend with thread counts; 0 keeps the runtime default"""
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+
+    @abstractmethod
+    def load(self, model_path):
+        """Return a model exposing predict(source, conf, iou, imgsz) and names"""
+        pass
+
+
+class TorchBackend(InferenceBackend):
+    """Runs the .pt weights through ultralytics with PyTorch"""
+
+    name = 'torch'
+    threads_configured = False
+
+    def load(self, model_path):
+        self._configure_threads()
+        return YOLO(model_path)
+
+    def _configure_threads(self):
+        # Torch thread pools are process-wide and can only be sized once
+        if TorchBackend.threads_configured:
+            return
+        TorchBackend.threads_configured = True
+
+        try:
+            if self.intra_op_threads:
+                torch.set_num_threads(self.intra_op_threads)
+            if self.inter_op_threads:
+                torch.set_num_interop_threads(self.inter_op_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set torch thread counts: {str(e)}")
+
+
+class ExportedBackend(InferenceBackend):
+    """Base for backends that run an export of the .pt weights, cached by weight file hash"""
+
+    export_format = None
+
+    def load(self, model_path):
+        export_path, names = self.get_export(model_path)
+        return RuntimeModel(self.create_runner(export_path), names, model_path)
+
+    def get_export(self, model_path):
+        """Return the cached export for the weight file, exporting it on first use"""
+        cache_dir = settings.DETECTION_SETTINGS['MODEL_CACHE_DIR']
+        os.makedirs(cache_dir, exist_ok=True)
+
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        cache_key = f"{stem}-{file_hash(model_path)}-{self.export_format}"
+        export_path = os.path.join(cache_dir, cache_key)
+        names_path = os.path.join(cache_dir, f"{cache_key}.json")
+
+        if not (os.path.exists(export_path) and os.path.exists(names_path)):
+            self._export(model_path, export_path, names_path)
+
+        with open(names_path) as f:
+            names = {int(k): v for k, v in json.load(f).items()}
+
+        return export_path, names
+
+    def _export(self, model_path, export_path, names_path):
+        """
+        Export the weights into the cache. ultralytics writes the export next to the weights,
+        so each process exports a private copy in its own directory and moves the result into
+        place, and processes warming the same model at once never see each other's files.
+        """
+        logger.info(f"Exporting {model_path} to {self.export_format}")
+        work_dir = tempfile.mkdtemp(prefix='export-', dir=os.path.dirname(export_path))
+        try:
+            weights_path = os.path.join(work_dir, os.path.basename(model_path))
+            shutil.copy2(model_path, weights_path)
+            model = YOLO(weights_path)
+
+            # Dynamic axes let one export serve every batch size and image_size
+            exported = model.export(format=self.export_format, dynamic=True)
+
+            partial_names_path = os.path.join(work_dir, 'names.json')
+            with open(partial_names_path, 'w') as f:
+                json.dump({str(k): v for k, v in model.names.items()}, f)
+
+            try:
+                os.replace(exported, export_path)
+            except OSError:
+                # Another process moved its export of the same weights in first (directory exports)
+                if not os.path.exists(export_path):
+                    raise
+            os.replace(partial_names_path, names_path)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    @abstractmethod
+    def create_runner(self, export_path):
+        """Return a callable mapping a float32 NCHW array to raw model output"""
+        pass
+
+
+class OnnxRuntimeBackend(ExportedBackend):
+    """Runs an ONNX export of the weights with ONNX Runtime on CPU"""
+
+    name = 'onnxruntime'
+    export_format = 'onnx'
+
+    def create_runner(self, export_path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads:
+            options.inter_op_num_threads = self.inter_op_threads
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+
+        session = onnxruntime.InferenceSession(
+            export_path, options, providers=['CPUExecutionProvider']
+        )
+        input_name = session.get_inputs()[0].name
+
+        def run(images):
+            return session.run(None, {input_name: images})[0]
+
+        return run
+
+
+class OpenVINOBackend(ExportedBackend):
+    """Runs an OpenVINO IR export of the weights on CPU"""
+
+    name = 'openvino'
+    export_format = 'openvino'
+
+    def create_runner(self, export_path):
+        import openvino as ov
+
+        xml_files = glob.glob(os.path.join(export_path, '*.xml'))
+        if not xml_files:
+            raise FileNotFoundError(f"No OpenVINO model found in {export_path}")
+
+        config = {'PERFORMANCE_HINT': 'THROUGHPUT' if self.inter_op_threads else 'LATENCY'}
+        if self.intra_op_threads:
+            config['INFERENCE_NUM_THREADS'] = self.intra_op_threads
+        if self.inter_op_threads:
+            config['NUM_STREAMS'] = self.inter_op_threads
+
+        compiled_model = ov.Core().compile_model(xml_files[0], 'CPU', config)
+        output = compiled_model.output(0)
+
+        def run(images):
+            return np.asarray(compiled_model([images])[output])
+
+        return run
+
+
+def quantized_model_path(model_path):
+    """Return where the INT8 ONNX variant of a weight file is stored"""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(
+        settings.DETECTION_SETTINGS['MODEL_CACHE_DIR'],
+        f"{stem}-{file_hash(model_path)}-int8.onnx"
+    )
+
+
+class QuantizedOnnxBackend(OnnxRuntimeBackend):
+    """Runs the INT8 ONNX variant produced by the quantize_models command"""
+
+    name = 'onnxruntime-int8'
+
+    def get_export(self, model_path):
+        int8_path = quantized_model_path(model_path)
+        if not os.path.exists(int8_path):
+            raise FileNotFoundError(
+                f"No INT8 model for {model_path}; run 'manage.py quantize_models' first"
+            )
+
+        # Class names are shared with the FP32 export the INT8 model was built from
+        _, names = super().get_export(model_path)
+        return int8_path, names
+
+
+BACKENDS = {
+    'torch': TorchBackend,
+    'onnxruntime': OnnxRuntimeBackend,
+    'openvino': OpenVINOBackend,
+    'onnxruntime-int8': QuantizedOnnxBackend,
+}
+
+def get_backend(name=None):
+    """
+    Create the configured inference backend.
+    'auto' picks OpenVINO, then ONNX Runtime, then PyTorch, depending on what is installed.
+    """
+    name = name or settings.DETECTION_SETTINGS['INFERENCE_BACKEND']
+
+    if name == 'auto':
+        name = 'torch'
+        for candidate, module in (('openvino', 'openvino'), ('onnxruntime', 'onnxruntime')):
+            try:
+                __import__(module)
+                name = candidate
+                break
+            except ImportError:
+                continue
+
+    if name not in BACKENDS:
+        logger.error(f"Unknown inference backend: {name}")
+        raise ValueError(f"Unknown inference backend: {name}")
+
+    return BACKENDS[name](
+        intra_op_threads=settings.DETECTION_SETTINGS['INTRA_OP_THREADS'],
+        inter_op_threads=settings.DETECTION_SETTINGS['INTER_OP_THREADS'],
+    )
@@ -1,12 +1,17 @@
 from abc import ABC, abstractmethod
 import numpy as np
-from ultralytics import YOLO
+import torch
 import cv2
 from PIL import Image
 import os
+import time
+import threading
 from django.conf import settings
 import logging
 
+from .backends import get_backend
+from .detections import Detections
+
 logger = logging.getLogger('security_ai')
 
 class BaseDetector(ABC):
@@ -18,25 +23,59 @@ class BaseDetector(ABC):
         self.name = name
         self.model = None
         self.class_names = {}
+        # Detectors are shared across threads through the registry, and the ultralytics
+        # predictor keeps per-call state (args, batch), so predict calls take turns
+        self.predictor_lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        
+        # Set when the detector is owned by the shared ModelRegistry
+        self.registry = None
+        self.registry_key = None
+        
+        # Inference runtime; the configured DETECTION_SETTINGS backend when None
+        self.backend = None
         
     def load_model(self):
         """Load the YOLO model"""
-        if self.model is None:
-            # Check if model file exists
-            if not os.path.exists(self.model_path):
-                logger.error(f"Model file not found: {self.model_path}")
-                raise FileNotFoundError(f"Model file not found: {self.model_path}")
+        model = self.model
+        if model is not None:
+            if self.registry is not None:
+                self.registry.model_used(self)
+            return model
+        
+        load_time = None
+        with self.load_lock:
+            # Another thread may have loaded it while we waited
+            if self.model is None:
+                # Check if model file exists
+                if not os.path.exists(self.model_path):
+                    logger.error(f"Model file not found: {self.model_path}")
+                    raise FileNotFoundError(f"Model file not found: {self.model_path}")
+                
+                try:
+                    start_time = time.time()
+                    backend = self.backend or get_backend()
+                    self.model = backend.load(self.model_path)
+                    load_time = time.time() - start_time
+                    # Store class names from the model
+                    if hasattr(self.model, 'names'):
+                        self.class_names = self.model.names
+                except Exception as e:
+                    logger.error(f"Error loading model {self.model_path}: {str(e)}")
+                    raise
             
-            try:
-                self.model = YOLO(self.model_path)
-                # Store class names from the model
-                if hasattr(self.model, 'names'):
-                    self.class_names = self.model.names
-            except Exception as e:
-                logger.error(f"Error loading model {self.model_path}: {str(e)}")
-                raise
+            model = self.model
+        
+        # Report outside the load lock, since the registry may unload other detectors
+        if load_time is not None and self.registry is not None:
+            self.registry.model_loaded(self, load_time)
         
-        return self.model
+        return model
+    
+    def unload_model(self):
+        """Drop the loaded weights; they are loaded again on next use"""
+        # Callers that already hold a reference finish their prediction with it
+        self.model = None
     
     def predict_image(self, img, conf_threshold, iou_threshold, image_size):
         """Predict objects in an image using the detector's model"""
@@ -44,7 +83,8 @@ class BaseDetector(ABC):
         model = self.load_model()
         
         try:
-            results = model.predict(
+            results = self._predict(
+                model,
                 source=img,
                 conf=conf_threshold,
                 iou=iou_threshold,
@@ -69,7 +109,8 @@ class BaseDetector(ABC):
         
         try:
             # Run prediction on the frame
-            results = model.predict(
+            results = self._predict(
+                model,
                 source=frame,
                 conf=conf_threshold,
                 iou=iou_threshold,
@@ -87,6 +128,121 @@ class BaseDetector(ABC):
             logger.error(f"Error in predict_video_frame: {str(e)}")
             raise
     
+    def predict_batch(self, frames, conf_threshold, iou_threshold, image_size):
+        """
+        Process several video frames in a single forward pass.
+        Accepts a list of frames or a stacked (N, H, W, C) array and returns a
+        list of (annotated_frame, results) tuples in the same order as the input.
+        """
+        # A stacked array splits into one (H, W, C) frame per row
+        frames = list(frames)
+
+        if not frames:
+            return []
+        
+        # Ensure model is loaded
+        model = self.load_model()
+        
+        try:
+            results = self._predict(
+                model,
+                source=frames,
+                conf=conf_threshold,
+                iou=iou_threshold,
+                show_labels=True,
+                show_conf=True,
+                imgsz=image_size,
+            )
+            
+            # Keep the per-frame contract of predict_video_frame: a list of results per frame
+            return [(r.plot(), [r]) for r in results]
+        except Exception as e:
+            logger.error(f"Error in predict_batch: {str(e)}")
+            raise
+    
+    def detect(self, frame, conf_threshold, iou_threshold, image_size):
+        """
+        Run detection on a single frame without drawing anything.
+        Returns a Detections object with xyxy, conf and cls arrays.
+        """
+        return self.detect_batch([frame], conf_threshold, iou_threshold, image_size)[0]
+    
+    def detect_batch(self, frames, conf_threshold, iou_threshold, image_size):
+        """
+        Run detection on several frames in one forward pass without drawing anything.
+        Returns one Detections object per frame, in input order.
+        """
+        frames = list(frames)
+        
+        if not frames:
+            return []
+        
+        # Ensure model is loaded
+        model = self.load_model()
+        
+        try:
+            results = self._predict(
+                model,
+                source=frames,
+                conf=conf_threshold,
+                iou=iou_threshold,
+                imgsz=image_size,
+                verbose=False,
+            )
+            
+            return [Detections.from_result(r) for r in results]
+        except Exception as e:
+            logger.error(f"Error in detect_batch: {str(e)}")
+            raise
+    
+    def predict_preprocessed(self, tensor, frames, conf_threshold, iou_threshold, image_size):
+        """
+        Run the model on a tensor that was already letterboxed and normalized for image_size.
+        frames are the original images the tensor was built from; they are used to scale
+        boxes back and are not annotated. Returns one Results object per frame.
+        """
+        model = self.load_model()
+        
+        # Exported runtimes take the shared tensor directly
+        if hasattr(model, 'predict_tensor'):
+            try:
+                return model.predict_tensor(tensor, list(frames), conf_threshold, iou_threshold)
+            except Exception as e:
+                logger.error(f"Error in predict_preprocessed: {str(e)}")
+                raise
+        
+        try:
+            with self.predictor_lock:
+                # The first regular predict call sets up the backend, device and fused model
+                if model.predictor is None:
+                    model.predict(
+                        source=np.zeros((image_size, image_size, 3), dtype=np.uint8),
+                        imgsz=image_size,
+                        verbose=False,
+                    )
+                
+                predictor = model.predictor
+                predictor.args.conf = conf_threshold
+                predictor.args.iou = iou_threshold
+                predictor.batch = ([f"frame{i}" for i in range(len(frames))], frames, [""] * len(frames))
+                
+                with torch.inference_mode():
+                    im = predictor.preprocess(tensor)
+                    preds = predictor.inference(im)
+                    return predictor.postprocess(preds, im, list(frames))
+        except Exception as e:
+            logger.error(f"Error in predict_preprocessed: {str(e)}")
+            raise
+    
+    def _predict(self, model, **kwargs):
+        """Run model.predict, one call at a time on the shared ultralytics predictor"""
+        # Exported runtimes keep no per-call state and can run concurrently
+        if hasattr(model, 'predict_tensor'):
+            return model.predict(**kwargs)
+        
+        with self.predictor_lock:
+            return model.predict(**kwargs)
+    
     @abstractmethod
     def get_description(self):
         """Return a description of the detector"""
@@ -0,0 +1,78 @@
+import time
+import logging
+
+logger = logging.getLogger('security_ai')
+
+class FrameBatcher:
+    """Queues frames for a detector and runs them through detect_batch in groups"""
+
+    def __init__(self, detector, conf_threshold, iou_threshold, image_size, batch_size=4, max_wait=0.1):
+        """
+        Initialize the batcher for one detector and one set of prediction parameters.
+        A batch is run as soon as batch_size frames are queued, or when the oldest
+        queued frame has waited max_wait seconds. max_wait=None only closes full batches.
+        """
+        self.detector = detector
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.image_size = image_size
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max_wait
+
+        self.frames = []
+        self.contexts = []
+        self.oldest_time = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, frame, context=None):
+        """
+        Queue a frame. Returns a list of (context, detections) tuples for every
+        frame of the batch that ran, or an empty list if nothing ran yet.
+        """
+        if not self.frames:
+            self.oldest_time = time.time()
+
+        self.frames.append(frame)
+        self.contexts.append(context)
+
+        if self.is_due():
+            return self.flush()
+        return []
+
+    def is_due(self):
+        """Check whether the queued frames should be run now"""
+        if not self.frames:
+            return False
+        if len(self.frames) >= self.batch_size:
+            return True
+        if self.max_wait is None:
+            return False
+        return time.time() - self.oldest_time >= self.max_wait
+
+    def poll(self):
+        """Run the queued frames if the latency budget has been used up"""
+        if self.is_due():
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Run all queued frames in one forward pass and return their results"""
+        if not self.frames:
+            return []
+
+        frames, contexts = self.frames, self.contexts
+        self.frames, self.contexts = [], []
+        self.oldest_time = None
+
+        try:
+            detections = self.detector.detect_batch(
+                frames, self.conf_threshold, self.iou_threshold, self.image_size
+            )
+        except Exception as e:
+            # Hand the contexts back without detections so callers can fall back to the raw frames
+            logger.error(f"Error running batch of {len(frames)} frames: {str(e)}")
+            return [(context, None) for context in contexts]
+
+        return list(zip(contexts, detections))
@@ -0,0 +1,123 @@
+import cv2
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+# BGR palette used for box colors, indexed by class id
+PALETTE = np.array([
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255),
+    (49, 210, 207), (10, 249, 72), (23, 204, 146), (134, 219, 61),
+    (52, 147, 26), (187, 212, 0), (168, 153, 44), (255, 194, 0),
+    (147, 69, 52), (255, 115, 100), (236, 24, 0), (255, 56, 132),
+    (133, 0, 82), (255, 56, 203), (200, 149, 255), (199, 55, 255),
+], dtype=np.uint8)
+
+@dataclass
+class Detections:
+    """Detections of one frame as compact numpy arrays"""
+    xyxy: np.ndarray  # (N, 4) float32 boxes in original frame pixels
+    conf: np.ndarray  # (N,) float32 confidences
+    cls: np.ndarray   # (N,) int32 class ids
+    names: Dict[int, str] = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.conf)
+
+    @classmethod
+    def empty(cls, names=None):
+        """Create an empty set of detections"""
+        return cls(
+            xyxy=np.zeros((0, 4), dtype=np.float32),
+            conf=np.zeros((0,), dtype=np.float32),
+            cls=np.zeros((0,), dtype=np.int32),
+            names=names or {}
+        )
+
+    @classmethod
+    def from_result(cls, result):
+        """Build detections from an ultralytics Results object"""
+        if result.boxes is None or len(result.boxes) == 0:
+            return cls.empty(result.names)
+
+        boxes = result.boxes
+        return cls(
+            xyxy=boxes.xyxy.cpu().numpy().astype(np.float32),
+            conf=boxes.conf.cpu().numpy().astype(np.float32),
+            cls=boxes.cls.cpu().numpy().astype(np.int32),
+            names=result.names
+        )
+
+    def filter(self, threshold):
+        """Return the detections at or above a confidence threshold"""
+        keep = self.conf >= threshold
+        if keep.all():
+            return self
+        return Detections(self.xyxy[keep], self.conf[keep], self.cls[keep], self.names)
+
+    def scaled(self, scale):
+        """Return the detections with boxes scaled for a resized frame"""
+        return Detections(self.xyxy * scale, self.conf, self.cls, self.names)
+
+    def max_confidence(self, threshold=0.0) -> Optional[float]:
+        """Return the highest confidence at or above threshold, or None"""
+        if len(self) == 0:
+            return None
+
+        confidence = float(self.conf.max())
+        return confidence if confidence >= threshold else None
+
+    def to_dict(self):
+        """Serialize the detections into plain lists"""
+        return {
+            'boxes': np.round(self.xyxy, 1).tolist(),
+            'confidences': np.round(self.conf, 4).tolist(),
+            'classes': self.cls.tolist(),
+            'labels': [self.names.get(int(c), str(c)) for c in self.cls]
+        }
+
+
+def render_detections(frame, detections_by_key, line_width=None, copy=True):
+    """
+    Draw the boxes of one or more Detections onto a frame.
+    detections_by_key maps a detector key to its Detections. Box geometry, colors and
+    labels are computed for all detectors at once; the frame is returned untouched
+    (and uncopied) when there is nothing to draw.
+    """
+    items = [d for d in detections_by_key.values() if d is not None and len(d) > 0]
+    if not items:
+        return frame
+
+    canvas = frame.copy() if copy else frame
+    height, width = canvas.shape[:2]
+    line_width = line_width or max(round((height + width) / 2 * 0.003), 2)
+    font_scale = line_width / 3
+    font_thickness = max(line_width - 1, 1)
+
+    # Offset the palette per detector so classes of different models get distinct colors
+    xyxy = np.concatenate([d.xyxy for d in items])
+    color_ids = np.concatenate([d.cls + offset * 5 for offset, d in enumerate(items)])
+    labels = [
+        f"{d.names.get(int(c), str(c))} {score:.2f}"
+        for d in items for c, score in zip(d.cls, d.conf)
+    ]
+
+    boxes = np.round(xyxy).astype(np.int32)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width - 1)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height - 1)
+    box_colors = PALETTE[color_ids % len(PALETTE)].tolist()
+
+    for (x1, y1, x2, y2), color, label in zip(boxes.tolist(), box_colors, labels):
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), color, line_width, cv2.LINE_AA)
+
+        # Label background above the box, or inside it at the top edge
+        (text_width, text_height), _ = cv2.getTextSize(label, 0, font_scale, font_thickness)
+        outside = y1 - text_height - 3 >= 0
+        label_y2 = y1 - text_height - 3 if outside else y1 + text_height + 3
+        cv2.rectangle(canvas, (x1, y1), (x1 + text_width, label_y2), color, -1, cv2.LINE_AA)
+        cv2.putText(
+            canvas, label,
+            (x1, y1 - 2 if outside else y1 + text_height + 2),
+            0, font_scale, (255, 255, 255), font_thickness, cv2.LINE_AA
+        )
+
+    return canvas
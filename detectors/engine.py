@@ -0,0 +1,92 @@
+import numpy as np
+import torch
+import logging
+from ultralytics.data.augment import LetterBox
+
+from .detections import Detections, render_detections
+
+logger = logging.getLogger('security_ai')
+
+def preprocess_frames(frames, image_size):
+    """
+    Letterbox and normalize frames into a single (N, 3, S, S) RGB tensor in 0.0 - 1.0.
+    A fixed square shape is used so every model with the same image_size can share it.
+    """
+    letterbox = LetterBox(new_shape=(image_size, image_size), auto=False, stride=32)
+    images = np.stack([letterbox(image=frame) for frame in frames])
+
+    # BHWC BGR to BCHW RGB
+    images = np.ascontiguousarray(images[..., ::-1].transpose(0, 3, 1, 2))
+    return torch.from_numpy(images).float().div_(255)
+
+
+class MultiModelInferenceEngine:
+    """Runs several detectors over the same frames with shared preprocessing"""
+
+    def __init__(self, detectors):
+        """Initialize the engine with a mapping of detector key to detector"""
+        self.detectors = detectors
+
+    def detect(self, frame, detector_keys, conf_threshold, iou_threshold, image_size):
+        """
+        Run every detector in detector_keys on the frame.
+        image_size may be a single size or a mapping of detector key to size.
+        Returns {detector_key: Detections}. Detectors that fail are left out.
+        """
+        return self.detect_batch(
+            [frame], detector_keys, conf_threshold, iou_threshold, image_size
+        )[0]
+
+    def detect_batch(self, frames, detector_keys, conf_threshold, iou_threshold, image_size,
+                     frame_indices=None):
+        """
+        Run every detector in detector_keys on a batch of frames.
+        The frames are preprocessed once per distinct image_size and the tensor is shared
+        by all models using that size. frame_indices optionally maps a detector key to the
+        indexes of the frames it runs on (all frames by default).
+        Returns one {detector_key: Detections} per frame.
+        """
+        frames = list(frames)
+        detector_keys = [key for key in detector_keys if key in self.detectors]
+
+        # Group detectors by the input size they run at
+        size_groups = {}
+        for key in detector_keys:
+            size = image_size.get(key, 640) if isinstance(image_size, dict) else image_size
+            size_groups.setdefault(size, []).append(key)
+
+        detections_by_frame = [{} for _ in frames]
+
+        for size, keys in size_groups.items():
+            try:
+                tensor = preprocess_frames(frames, size)
+            except Exception as e:
+                logger.error(f"Preprocessing error (size {size}): {e}")
+                continue
+
+            for key in keys:
+                indices = frame_indices.get(key) if frame_indices else None
+                if indices is None or len(indices) == len(frames):
+                    indices = range(len(frames))
+                    key_tensor, key_frames = tensor, frames
+                elif not indices:
+                    continue
+                else:
+                    key_tensor, key_frames = tensor[list(indices)], [frames[i] for i in indices]
+
+                try:
+                    results = self.detectors[key].predict_preprocessed(
+                        key_tensor, key_frames, conf_threshold, iou_threshold, size
+                    )
+                except Exception as e:
+                    logger.error(f"Detect error:  ({key}): {e}")
+                    continue
+
+                for index, r in zip(indices, results):
+                    detections_by_frame[index][key] = Detections.from_result(r)
+
+        return detections_by_frame
+
+    def render(self, frame, detections_by_key):
+        """Draw the boxes of all detectors onto the frame in a single pass"""
+        return render_detections(frame, detections_by_key)
@@ -0,0 +1,121 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+from detectors.quantization import evaluate_quantized, load_frames, quantize_model
+from utils.model_manager import ModelManager
+
+
+class Command(BaseCommand):
+    help = (
+        "Build INT8 variants of the detector models with static post-training quantization "
+        "and compare them to FP32 on a held-out set of frames"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calibration-dir', required=True,
+                            help='Directory of sample frames used to calibrate activation ranges')
+        parser.add_argument('--eval-dir',
+                            help='Directory of held-out frames for the accuracy and latency report')
+        parser.add_argument('--detectors', default='fire_smoke,fall,violence,choking',
+                            help='Comma-separated detector keys to quantize')
+        parser.add_argument('--max-calibration-frames', type=int, default=200)
+        parser.add_argument('--per-tensor', action='store_true',
+                            help='Quantize weights per tensor instead of per channel')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild INT8 models that are already cached')
+        parser.add_argument('--report', help='Write the evaluation report to this JSON file')
+        parser.add_argument('--min-map', type=float, default=0.9,
+                            help='Lowest AP50 against FP32 detections for an INT8 model to pass')
+        parser.add_argument('--max-score-error', type=float, default=0.05,
+                            help='Highest mean confidence error on matched boxes for an INT8 model to pass')
+
+    def handle(self, *args, **options):
+        model_manager = ModelManager()
+        validation = model_manager.validate_models()
+        missing = {model['key'] for model in validation['missing_models']}
+
+        detector_keys = [key.strip() for key in options['detectors'].split(',') if key.strip()]
+        for key in detector_keys:
+            if key not in model_manager.detectors:
+                raise CommandError(f"Unknown detector: {key}")
+
+        calibration_frames = load_frames(options['calibration_dir'], options['max_calibration_frames'])
+        if not calibration_frames:
+            raise CommandError(f"No images found in {options['calibration_dir']}")
+
+        eval_frames = load_frames(options['eval_dir']) if options['eval_dir'] else []
+        if options['eval_dir'] and not eval_frames:
+            raise CommandError(f"No images found in {options['eval_dir']}")
+
+        report = {}
+        for key in detector_keys:
+            if key in missing:
+                self.stderr.write(self.style.WARNING(f"Skipping {key}: model file not found"))
+                continue
+
+            detector = model_manager.get_detector(key)
+            config = model_manager.get_detector_config(key)
+
+            self.stdout.write(f"Quantizing {key} ({detector.model_path}) at {config['image_size']}px...")
+            try:
+                int8_path = quantize_model(
+                    detector.model_path,
+                    calibration_frames,
+                    config['image_size'],
+                    per_channel=not options['per_tensor'],
+                    force=options['force'],
+                )
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Quantization failed for {key}: {str(e)}"))
+                continue
+
+            self.stdout.write(self.style.SUCCESS(f"  INT8 model: {int8_path}"))
+            report[key] = {'int8_path': int8_path}
+
+            if eval_frames:
+                metrics = evaluate_quantized(
+                    detector.model_path,
+                    eval_frames,
+                    config['conf_threshold'],
+                    config['iou_threshold'],
+                    config['image_size'],
+                )
+                report[key].update(metrics)
+                self._print_metrics(metrics)
+                
+                report[key]['parity'] = (
+                    metrics['map50'] >= options['min_map'] and metrics['score_mae'] <= options['max_score_error']
+                )
+                if not report[key]['parity']:
+                    self.stderr.write(self.style.ERROR(
+                        f"  INT8 {key} does not match FP32 (AP50 {metrics['map50']:.3f}, "
+                        f"score error {metrics['score_mae']:.4f}); do not enable it"
+                    ))
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        self.stdout.write(
+            "Enable a variant with DETECTION_MODEL_VARIANTS=<detector>=int8 "
+            "or ModelManager.set_model_variant(<detector>, 'int8')"
+        )
+
+    def _print_metrics(self, metrics):
+        fp32 = metrics['fp32_latency_ms']
+        int8 = metrics['int8_latency_ms']
+        self.stdout.write(
+            f"  Agreement with FP32 on {metrics['frames']} frames: "
+            f"precision {metrics['precision']:.3f}, recall {metrics['recall']:.3f}, F1 {metrics['f1']:.3f}, "
+            f"mean confidence delta {metrics['mean_confidence_delta']:+.4f}"
+        )
+        self.stdout.write(
+            f"  AP50 against FP32 {metrics['map50']:.3f}, matched-box score error "
+            f"mean {metrics['score_mae']:.4f} (max {metrics['score_max_error']:.4f})"
+        )
+        self.stdout.write(
+            f"  Latency: FP32 {fp32['mean']:.1f} ms (p95 {fp32['p95']:.1f}), "
+            f"INT8 {int8['mean']:.1f} ms (p95 {int8['p95']:.1f}), {metrics['speedup']:.2f}x; "
+            f"size {metrics['fp32_size_mb']} MB -> {metrics['int8_size_mb']} MB"
+        )
@@ -0,0 +1,53 @@
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from detectors.models import VideoProcessingJob
+from utils.video_processor import VideoProcessor
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume video processing jobs that were never started or whose worker stopped "
+        "sending heartbeats, continuing from their last finished segment"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('job_ids', nargs='*', type=int,
+                            help='Resume only these jobs, regardless of their state')
+        parser.add_argument('--stale-seconds', type=int,
+                            help='Seconds without a heartbeat after which a running job is resumed')
+        parser.add_argument('--include-failed', action='store_true',
+                            help='Also retry jobs that failed with an error')
+
+    def handle(self, *args, **options):
+        stale_seconds = options['stale_seconds'] or settings.DETECTION_SETTINGS['JOB_STALE_SECONDS']
+
+        if options['job_ids']:
+            jobs = list(VideoProcessingJob.objects.filter(id__in=options['job_ids']).exclude(status='completed'))
+        else:
+            statuses = ['pending', 'running'] + (['failed'] if options['include_failed'] else [])
+            jobs = [
+                job for job in VideoProcessingJob.objects.filter(status__in=statuses).order_by('created_at')
+                if job.status != 'running' or job.is_stale(stale_seconds)
+            ]
+
+        if not jobs:
+            self.stdout.write("No video processing jobs to resume")
+            return
+
+        processor = VideoProcessor()
+        for job in jobs:
+            # Take the job over from its task, so that task stops if it is still alive
+            if not job.hand_over(f"manual-{uuid.uuid4().hex}"):
+                self.stdout.write(f"Skipping job {job.id}: it changed since it was loaded")
+                continue
+
+            self.stdout.write(f"Resuming job {job.id} ({job.video_path}) at {job.progress}%...")
+            try:
+                output_path, alert = processor.run_job(job)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Job {job.id} failed: {e}"))
+                continue
+
+            self.stdout.write(self.style.SUCCESS(f"Job {job.id} complete: {output_path} (alert {alert.id})"))
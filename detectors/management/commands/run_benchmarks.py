@@ -0,0 +1,183 @@
+import os
+import json
+import tempfile
+import redis
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from utils import benchmarks
+from utils.model_manager import ModelManager
+from utils.video_processor import VideoProcessor
+
+SUITES = ('detectors', 'video', 'jpeg', 'redis')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the detection and streaming hot paths on synthetic and sample clips and "
+        "store the results as JSON, to compare commits on the same hardware"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suites', default=','.join(SUITES),
+                            help=f"Comma-separated suites to run ({', '.join(SUITES)})")
+        parser.add_argument('--detectors', default='fire_smoke,fall,violence,choking',
+                            help='Comma-separated detector keys to benchmark')
+        parser.add_argument('--image-sizes', default='',
+                            help='Comma-separated model input sizes; each detector\'s configured size by default')
+        parser.add_argument('--clip', action='append', default=[],
+                            help='Sample clip to benchmark process_video on, in addition to the synthetic clip')
+        parser.add_argument('--frames', type=int, default=100,
+                            help='Calls timed per detector and image size, and per JPEG quality')
+        parser.add_argument('--clip-frames', type=int, default=300, help='Length of the synthetic clip')
+        parser.add_argument('--output-mode', choices=['sidecar', 'annotated'],
+                            help='process_video output mode (VIDEO_OUTPUT_MODE by default)')
+        parser.add_argument('--redis-iterations', type=int, default=200)
+        parser.add_argument('--keep-outputs', action='store_true',
+                            help='Keep the alerts and videos created by the process_video benchmark')
+        parser.add_argument('--output',
+                            help='Results file (benchmarks/<commit>_<timestamp>.json by default)')
+        parser.add_argument('--compare', help='Earlier results file to report changes against')
+
+    def handle(self, *args, **options):
+        suites = [suite.strip() for suite in options['suites'].split(',') if suite.strip()]
+        for suite in suites:
+            if suite not in SUITES:
+                raise CommandError(f"Unknown benchmark suite: {suite}")
+
+        environment = benchmarks.environment_info()
+        results = {}
+        width = settings.GSTREAMER_SETTINGS['DEFAULT_WIDTH']
+        height = settings.GSTREAMER_SETTINGS['DEFAULT_HEIGHT']
+        # A second of distinct frames, cycled through for the timed iterations
+        frames = benchmarks.synthetic_frames(30, width, height)
+
+        if 'detectors' in suites or 'video' in suites:
+            model_manager = ModelManager()
+            missing = {model['key'] for model in model_manager.validate_models()['missing_models']}
+            detector_keys = [key.strip() for key in options['detectors'].split(',') if key.strip()]
+            for key in detector_keys:
+                if key not in model_manager.detectors:
+                    raise CommandError(f"Unknown detector: {key}")
+                if key in missing:
+                    self.stderr.write(self.style.WARNING(f"Skipping {key}: model file not found"))
+            detector_keys = [key for key in detector_keys if key not in missing]
+
+        if 'detectors' in suites:
+            results['predict_video_frame'] = self._bench_detectors(model_manager, detector_keys, frames, options)
+
+        if 'video' in suites:
+            results['process_video'] = self._bench_process_video(model_manager, detector_keys, options)
+
+        if 'jpeg' in suites:
+            results['jpeg_encode'] = [
+                benchmarks.bench_jpeg_encode(frames, quality, options['frames'])
+                for quality in sorted({settings.GSTREAMER_SETTINGS['JPEG_QUALITY'], 50, 95})
+            ]
+            for result in results['jpeg_encode']:
+                self.stdout.write(
+                    f"JPEG q{result['quality']} {width}x{height}: encode {self._latency(result['encode_ms'])}, "
+                    f"base64 {result['base64_ms']['mean']} ms, {result['mean_bytes'] // 1024} KB"
+                )
+
+        if 'redis' in suites:
+            results['redis_frame_cache'] = self._bench_redis(frames[0], options)
+
+        report = {'environment': environment, 'results': results}
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmarks',
+            f"{environment['commit'] or 'unknown'}_{environment['timestamp'][:19].replace(':', '')}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if options['compare']:
+            self._print_comparison(options['compare'], report)
+
+    def _bench_detectors(self, model_manager, detector_keys, frames, options):
+        image_sizes = [int(size) for size in options['image_sizes'].split(',') if size.strip()]
+        results = {}
+
+        for key in detector_keys:
+            detector = model_manager.get_detector(key)
+            config = model_manager.get_detector_config(key)
+            results[key] = []
+
+            for image_size in image_sizes or [config['image_size']]:
+                result = benchmarks.bench_predict_video_frame(
+                    detector, frames, config['conf_threshold'], config['iou_threshold'], image_size,
+                    iterations=options['frames']
+                )
+                results[key].append(result)
+                self.stdout.write(f"predict_video_frame {key} @ {image_size}px: {self._latency(result['latency_ms'])}")
+
+        return results
+
+    def _bench_process_video(self, model_manager, detector_keys, options):
+        processor = VideoProcessor(model_manager)
+        results = {}
+
+        with tempfile.TemporaryDirectory() as directory:
+            clips = [benchmarks.write_synthetic_clip(
+                os.path.join(directory, 'synthetic.mp4'), options['clip_frames'],
+                settings.GSTREAMER_SETTINGS['DEFAULT_WIDTH'], settings.GSTREAMER_SETTINGS['DEFAULT_HEIGHT']
+            )]
+            for clip in options['clip']:
+                if not os.path.exists(clip):
+                    raise CommandError(f"Clip not found: {clip}")
+                clips.append(clip)
+
+            for key in detector_keys:
+                config = model_manager.get_detector_config(key)
+                results[key] = []
+                for clip in clips:
+                    result = benchmarks.bench_process_video(
+                        processor, clip, key, config,
+                        output_mode=options['output_mode'], keep_outputs=options['keep_outputs']
+                    )
+                    results[key].append(result)
+                    bottleneck = result['pipeline']['bottleneck'] if result['pipeline'] else 'n/a'
+                    self.stdout.write(
+                        f"process_video {key} on {result['video']} ({result['frames']} frames, "
+                        f"{result['output_mode']}): {result['fps']} FPS, bottleneck {bottleneck}"
+                    )
+
+        return results
+
+    def _bench_redis(self, frame, options):
+        redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+        frame_data = benchmarks.encode_frame(frame, settings.GSTREAMER_SETTINGS['JPEG_QUALITY'])
+        metadata = {'timestamp': 0.0, 'frame_count': 1, 'detection_count': 0, 'detections': []}
+
+        try:
+            result = benchmarks.bench_redis_frame_cache(
+                redis_client, frame_data, metadata, options['redis_iterations']
+            )
+        except redis.RedisError as e:
+            self.stderr.write(self.style.WARNING(f"Skipping Redis benchmark: {str(e)}"))
+            return None
+
+        self.stdout.write(
+            f"Redis frame cache ({result['payload_bytes'] // 1024} KB): "
+            f"write {self._latency(result['write_ms'])}, read {self._latency(result['read_ms'])}"
+        )
+        return result
+
+    def _print_comparison(self, path, report):
+        with open(path) as f:
+            previous = json.load(f)
+
+        self.stdout.write(f"Changes since {previous['environment'].get('commit')} ({path}):")
+        if previous['environment'].get('processor') != report['environment'].get('processor'):
+            self.stdout.write(self.style.WARNING("  Results were measured on different hardware"))
+
+        for name, before, after, change in benchmarks.compare_results(previous['results'], report['results']):
+            # Higher is better for frame rates, lower for latencies
+            worse = change < 0 if name.endswith('fps') else change > 0
+            style = self.style.ERROR if worse and abs(change) >= 10 else self.style.SUCCESS
+            self.stdout.write(style(f"  {name}: {before} -> {after} ({change:+.1f}%)"))
+
+    def _latency(self, stats):
+        return f"mean {stats['mean']} ms, p50 {stats['p50']}, p95 {stats['p95']}, p99 {stats['p99']}"
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('alerts', '0003_alert_previews'),
+        ('cameras', '0002_camera_adaptive_sampling'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_path', models.CharField(max_length=500)),
+                ('detector_key', models.CharField(max_length=50)),
+                ('conf_threshold', models.FloatField()),
+                ('iou_threshold', models.FloatField()),
+                ('image_size', models.IntegerField()),
+                ('batch_size', models.IntegerField(blank=True, null=True)),
+                ('output_mode', models.CharField(choices=[('sidecar', 'Sidecar detections'), ('annotated', 'Annotated video')], default='sidecar', max_length=20)),
+                ('workers', models.IntegerField(default=1)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('base_name', models.CharField(blank=True, max_length=200)),
+                ('total_frames', models.IntegerField(default=0)),
+                ('processed_frames', models.IntegerField(default=0)),
+                ('fps', models.FloatField(default=0.0)),
+                ('width', models.IntegerField(default=0)),
+                ('height', models.IntegerField(default=0)),
+                ('segments', models.JSONField(default=list)),
+                ('completed_segments', models.JSONField(default=list)),
+                ('stats', models.JSONField(default=dict)),
+                ('output_path', models.CharField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('attempt_started_at', models.DateTimeField(blank=True, null=True)),
+                ('attempt_start_frames', models.IntegerField(default=0)),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('alert', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='video_jobs', to='alerts.alert')),
+                ('camera', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='video_jobs', to='cameras.camera')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='video_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Video Processing Job',
+                'verbose_name_plural': 'Video Processing Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
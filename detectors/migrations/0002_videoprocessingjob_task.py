@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('detectors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoprocessingjob',
+            name='task_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='videoprocessingjob',
+            name='queue',
+            field=models.CharField(choices=[('incidents', 'Live incidents'), ('backfill', 'Backfill')], default='backfill', max_length=20),
+        ),
+    ]
@@ -0,0 +1,149 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from alerts.models import Alert
+from cameras.models import Camera
+
+User = get_user_model()
+
+
+class JobTakenOver(Exception):
+    """The job was handed to another task while this one was running it"""
+
+
+class VideoProcessingJob(models.Model):
+    """
+    Offline processing of a video file, split into keyframe-aligned segments.
+    The result of every finished segment is checkpointed, so a job interrupted by a
+    crashed or restarted worker continues with the segments that are still missing.
+    """
+
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    QUEUE_CHOICES = (
+        ('incidents', 'Live incidents'),
+        ('backfill', 'Backfill'),
+    )
+
+    OUTPUT_MODE_CHOICES = (
+        ('sidecar', 'Sidecar detections'),
+        ('annotated', 'Annotated video'),
+    )
+
+    # Input and detection settings
+    video_path = models.CharField(max_length=500)
+    detector_key = models.CharField(max_length=50)
+    conf_threshold = models.FloatField()
+    iou_threshold = models.FloatField()
+    image_size = models.IntegerField()
+    batch_size = models.IntegerField(blank=True, null=True)
+    output_mode = models.CharField(max_length=20, choices=OUTPUT_MODE_CHOICES, default='sidecar')
+    workers = models.IntegerField(default=1)
+
+    # Celery task running the job, and the queue it was sent to
+    task_id = models.CharField(max_length=255, blank=True)
+    queue = models.CharField(max_length=20, choices=QUEUE_CHOICES, default='backfill')
+
+    # Foreign keys
+    camera = models.ForeignKey(
+        Camera, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='video_jobs'
+    )
+    alert = models.ForeignKey(
+        Alert, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='video_jobs'
+    )
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='video_jobs'
+    )
+
+    # Progress
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    base_name = models.CharField(max_length=200, blank=True)
+    total_frames = models.IntegerField(default=0)
+    processed_frames = models.IntegerField(default=0)
+    fps = models.FloatField(default=0.0)
+    width = models.IntegerField(default=0)
+    height = models.IntegerField(default=0)
+    segments = models.JSONField(default=list)  # planned [start_frame, end_frame] ranges
+    completed_segments = models.JSONField(default=list)  # indices of checkpointed segments
+    stats = models.JSONField(default=dict)  # detection and sampling statistics so far
+    output_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True, null=True)
+
+    # Attempts; the frame rate of the current attempt gives the ETA
+    attempts = models.IntegerField(default=0)
+    attempt_started_at = models.DateTimeField(blank=True, null=True)
+    attempt_start_frames = models.IntegerField(default=0)
+    heartbeat = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Video Processing Job'
+        verbose_name_plural = 'Video Processing Jobs'
+
+    def __str__(self):
+        return f"{self.detector_key} job {self.id} ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of frames checkpointed so far."""
+        if self.status == 'completed':
+            return 100.0
+        if not self.total_frames:
+            return 0.0
+        return round(min(100.0, self.processed_frames * 100.0 / self.total_frames), 1)
+
+    @property
+    def eta_seconds(self):
+        """Estimated seconds left, from the rate of the current attempt; None until it is known."""
+        if self.status != 'running' or not self.attempt_started_at:
+            return None
+
+        done = self.processed_frames - self.attempt_start_frames
+        elapsed = (timezone.now() - self.attempt_started_at).total_seconds()
+        if done <= 0 or elapsed <= 0:
+            return None
+
+        return round((self.total_frames - self.processed_frames) * elapsed / done, 1)
+
+    def is_stale(self, timeout):
+        """Check if a running job has sent no heartbeat for timeout seconds, i.e. its worker is gone."""
+        last_seen = self.heartbeat or self.attempt_started_at or self.updated_at
+        return self.status == 'running' and (timezone.now() - last_seen).total_seconds() > timeout
+
+    def hand_over(self, task_id):
+        """
+        Make task_id the owner of the job, unless it was completed, handed over or sent a
+        heartbeat since it was loaded. The job is pending until the task claims it.
+        Returns whether the job was handed over.
+        """
+        now = timezone.now()
+        handed_over = VideoProcessingJob.objects.filter(
+            id=self.id, task_id=self.task_id, heartbeat=self.heartbeat
+        ).exclude(status='completed').update(
+            task_id=task_id, queue=self.queue, status='pending', heartbeat=now, updated_at=now
+        )
+
+        if handed_over:
+            self.task_id = task_id
+            self.status = 'pending'
+            self.heartbeat = self.updated_at = now
+        return bool(handed_over)
+
+    def save_owned(self, update_fields):
+        """Save the fields only while the job still belongs to the task that loaded it"""
+        values = {field: getattr(self, field) for field in update_fields if field != 'updated_at'}
+        values['updated_at'] = self.updated_at = timezone.now()
+
+        if not VideoProcessingJob.objects.filter(id=self.id, task_id=self.task_id).update(**values):
+            raise JobTakenOver(f"Video job {self.id} was taken over by another task")
@@ -0,0 +1,287 @@
+import os
+import re
+import glob
+import time
+import logging
+import numpy as np
+import cv2
+
+from .backends import OnnxRuntimeBackend, RuntimeModel, quantized_model_path
+from .detections import Detections
+from .engine import preprocess_frames
+
+try:
+    from onnxruntime.quantization import CalibrationDataReader
+    ONNX_QUANTIZATION_AVAILABLE = True
+except ImportError:
+    CalibrationDataReader = object
+    ONNX_QUANTIZATION_AVAILABLE = False
+
+logger = logging.getLogger('security_ai')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def load_frames(directory, limit=None):
+    """Read the images of a directory as BGR frames, in file name order"""
+    paths = sorted(
+        path for path in glob.glob(os.path.join(directory, '*'))
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if limit:
+        paths = paths[:limit]
+
+    frames = []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            logger.warning(f"Skipping unreadable image: {path}")
+            continue
+        frames.append(frame)
+
+    return frames
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """
+    Feeds sample frames to ONNX Runtime static quantization, preprocessed exactly as
+    they are at inference time so the calibrated activation ranges match production.
+    """
+
+    def __init__(self, frames, image_size, input_name):
+        self.frames = frames
+        self.image_size = image_size
+        self.input_name = input_name
+        self.index = 0
+
+    def get_next(self):
+        if self.index >= len(self.frames):
+            return None
+
+        frame = self.frames[self.index]
+        self.index += 1
+        tensor = preprocess_frames([frame], self.image_size)
+        return {self.input_name: tensor.numpy()}
+
+    def rewind(self):
+        self.index = 0
+
+
+def head_node_names(onnx_path):
+    """
+    Names of the detection head nodes to keep in float: everything in the last module
+    (Detect) except its box and class convolutions, i.e. the DFL, box decoding, sigmoid
+    and the final Concat. That Concat joins box coordinates (0 - image_size) with class
+    scores (0 - 1); one uint8 scale for both leaves the scores with a handful of levels.
+    """
+    import onnx
+
+    graph = onnx.load(onnx_path).graph
+    module_indexes = [
+        int(match.group(1)) for match in (re.match(r'/model\.(\d+)/', node.name) for node in graph.node) if match
+    ]
+    if not module_indexes:
+        logger.warning(f"No YOLO module names in {onnx_path}; quantizing the whole graph")
+        return []
+
+    head = f"/model.{max(module_indexes)}/"
+    return [
+        node.name for node in graph.node
+        if node.name.startswith(head) and (node.op_type != 'Conv' or '/dfl/' in node.name)
+    ]
+
+
+def quantize_model(model_path, calibration_frames, image_size, per_channel=True, force=False):
+    """
+    Produce the INT8 ONNX variant of a detector's weights with static post-training
+    quantization, calibrated on the given frames. Returns the path of the INT8 model.
+    """
+    if not ONNX_QUANTIZATION_AVAILABLE:
+        raise ImportError("onnxruntime is required to quantize models")
+
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    int8_path = quantized_model_path(model_path)
+    if os.path.exists(int8_path) and not force:
+        logger.info(f"Using cached INT8 model {int8_path}")
+        return int8_path
+
+    fp32_path, _ = OnnxRuntimeBackend().get_export(model_path)
+    input_name = onnxruntime.InferenceSession(
+        fp32_path, providers=['CPUExecutionProvider']
+    ).get_inputs()[0].name
+
+    reader = FrameCalibrationReader(calibration_frames, image_size, input_name)
+    excluded = head_node_names(fp32_path)
+
+    start_time = time.time()
+    quantize_static(
+        fp32_path,
+        int8_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=excluded,
+    )
+    logger.info(
+        f"Quantized {model_path} on {len(calibration_frames)} frames "
+        f"in {time.time() - start_time:.1f}s ({len(excluded)} head nodes kept in float)"
+    )
+
+    return int8_path
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of two (N, 4) and (M, 4) xyxy box arrays"""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def match_pairs(reference, candidate, iou_threshold=0.5):
+    """
+    Greedily match candidate boxes, most confident first, to reference boxes of the same
+    class. Returns a list of (reference index, candidate index).
+    """
+    if len(reference) == 0 or len(candidate) == 0:
+        return []
+
+    ious = box_iou(reference.xyxy, candidate.xyxy)
+    ious[reference.cls[:, None] != candidate.cls[None, :]] = 0
+
+    pairs = []
+    for candidate_index in np.argsort(-candidate.conf):
+        reference_index = int(ious[:, candidate_index].argmax())
+        if ious[reference_index, candidate_index] >= iou_threshold:
+            pairs.append((reference_index, int(candidate_index)))
+            ious[reference_index, :] = 0
+
+    return pairs
+
+
+def match_detections(reference, candidate, iou_threshold=0.5):
+    """
+    Greedily match candidate boxes to reference boxes of the same class.
+    Returns (matched, reference_count, candidate_count).
+    """
+    return len(match_pairs(reference, candidate, iou_threshold)), len(reference), len(candidate)
+
+
+def average_precision(references, candidates, iou_threshold=0.5):
+    """
+    AP at an IoU threshold of the candidate detections of a set of frames, taking the
+    reference detections as ground truth (all-point interpolation).
+    """
+    reference_total = sum(len(reference) for reference in references)
+    if reference_total == 0:
+        return 1.0
+
+    scores, hits = [], []
+    for reference, candidate in zip(references, candidates):
+        matched = {candidate_index for _, candidate_index in match_pairs(reference, candidate, iou_threshold)}
+        scores.extend(candidate.conf.tolist())
+        hits.extend(index in matched for index in range(len(candidate)))
+
+    if not scores:
+        return 0.0
+
+    order = np.argsort(-np.asarray(scores))
+    true_positives = np.cumsum(np.asarray(hits, dtype=np.float64)[order])
+    recall = true_positives / reference_total
+    precision = true_positives / np.arange(1, len(order) + 1)
+
+    # Precision envelope, integrated over the recall steps
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    recall_steps = np.diff(np.concatenate([[0.0], recall]))
+    return float(np.sum(precision * recall_steps))
+
+
+def _run_timed(model, frames, conf_threshold, iou_threshold, image_size):
+    detections = []
+    latencies = []
+
+    for frame in frames:
+        start_time = time.perf_counter()
+        results = model.predict(frame, conf=conf_threshold, iou=iou_threshold, imgsz=image_size)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        detections.append(Detections.from_result(results[0]))
+
+    return detections, np.array(latencies)
+
+
+def evaluate_quantized(model_path, frames, conf_threshold, iou_threshold, image_size, warmup=3):
+    """
+    Compare the INT8 model against the FP32 ONNX model on held-out frames.
+    Without labels, the FP32 detections serve as reference: precision and recall are the
+    share of INT8 and FP32 boxes that find a same-class match at IoU 0.5.
+    """
+    backend = OnnxRuntimeBackend()
+    fp32_path, names = backend.get_export(model_path)
+    int8_path = quantized_model_path(model_path)
+
+    models = {
+        'fp32': RuntimeModel(backend.create_runner(fp32_path), names, model_path),
+        'int8': RuntimeModel(backend.create_runner(int8_path), names, model_path),
+    }
+
+    outputs = {}
+    for variant, model in models.items():
+        for frame in frames[:warmup]:
+            model.predict(frame, conf=conf_threshold, iou=iou_threshold, imgsz=image_size)
+        outputs[variant] = _run_timed(model, frames, conf_threshold, iou_threshold, image_size)
+
+    fp32_detections, fp32_latency = outputs['fp32']
+    int8_detections, int8_latency = outputs['int8']
+
+    matched = reference_total = candidate_total = 0
+    confidence_deltas = []
+    score_errors = []
+    for reference, candidate in zip(fp32_detections, int8_detections):
+        pairs = match_pairs(reference, candidate)
+        matched += len(pairs)
+        reference_total += len(reference)
+        candidate_total += len(candidate)
+        score_errors.extend(
+            abs(float(candidate.conf[candidate_index]) - float(reference.conf[reference_index]))
+            for reference_index, candidate_index in pairs
+        )
+
+        reference_conf = reference.max_confidence() or 0.0
+        candidate_conf = candidate.max_confidence() or 0.0
+        confidence_deltas.append(candidate_conf - reference_conf)
+
+    precision = matched / candidate_total if candidate_total else 1.0
+    recall = matched / reference_total if reference_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    return {
+        'frames': len(frames),
+        'fp32_detections': reference_total,
+        'int8_detections': candidate_total,
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(f1, 4),
+        'mean_confidence_delta': round(float(np.mean(confidence_deltas)), 4) if confidence_deltas else 0.0,
+        # Score parity on boxes both models found, and AP50 of INT8 against FP32 boxes
+        'score_mae': round(float(np.mean(score_errors)), 4) if score_errors else 0.0,
+        'score_max_error': round(float(np.max(score_errors)), 4) if score_errors else 0.0,
+        'map50': round(average_precision(fp32_detections, int8_detections), 4),
+        'fp32_latency_ms': {
+            'mean': round(float(fp32_latency.mean()), 2),
+            'p95': round(float(np.percentile(fp32_latency, 95)), 2),
+        },
+        'int8_latency_ms': {
+            'mean': round(float(int8_latency.mean()), 2),
+            'p95': round(float(np.percentile(int8_latency, 95)), 2),
+        },
+        'speedup': round(float(fp32_latency.mean() / int8_latency.mean()), 2),
+        'fp32_size_mb': round(os.path.getsize(fp32_path) / (1024 * 1024), 1),
+        'int8_size_mb': round(os.path.getsize(int8_path) / (1024 * 1024), 1),
+    }
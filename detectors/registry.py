@@ -0,0 +1,272 @@
+import os
+import time
+import numpy as np
+import threading
+import logging
+from collections import OrderedDict
+from django.conf import settings
+
+from .backends import get_backend
+from .fire_smoke_detector import FireSmokeDetector
+from .fall_detector import FallDetector
+from .violence_detector import ViolenceDetector
+from .choking_detector import ChokingDetector
+
+logger = logging.getLogger('security_ai')
+
+DETECTOR_CLASSES = {
+    'fire_smoke': FireSmokeDetector,
+    'fall': FallDetector,
+    'violence': ViolenceDetector,
+    'choking': ChokingDetector,
+}
+
+# Model variant name to the backend that runs it; None uses the configured backend
+MODEL_VARIANTS = {
+    'fp32': None,
+    'int8': 'onnxruntime-int8',
+}
+
+class ModelRegistry:
+    """
+    Process-wide registry of detectors.
+    Every entry point shares the same detector instances, weights are loaded lazily on
+    first use, and the least recently used models are unloaded once the estimated
+    memory of all loaded models goes over the configured limit.
+    """
+
+    def __init__(self, memory_limit_mb=None):
+        """Initialize the registry; a memory limit of 0 means no limit"""
+        if memory_limit_mb is None:
+            memory_limit_mb = settings.DETECTION_SETTINGS['MODEL_MEMORY_LIMIT_MB']
+
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.lock = threading.RLock()
+        self.detectors = {}
+        self.variants = {}
+
+        # Loaded models in least to most recently used order, mapped to their estimated size
+        self.loaded_models = OrderedDict()
+
+        self.metrics = {
+            'loads': 0,
+            'evictions': 0,
+            'hits': 0,
+            'load_time': 0.0,
+        }
+
+        # Startup warm-up progress; 'disabled' counts as ready
+        self.warmup_status = 'disabled'
+        self.warmup_models = {}
+
+    def get_detector(self, detector_key):
+        """Get the shared detector for a key, creating it (without loading weights) on first access"""
+        with self.lock:
+            if detector_key not in self.detectors:
+                if detector_key not in DETECTOR_CLASSES:
+                    logger.error(f"Unknown detector: {detector_key}")
+                    raise ValueError(f"Unknown detector: {detector_key}")
+
+                detector = DETECTOR_CLASSES[detector_key]()
+                detector.registry = self
+                detector.registry_key = detector_key
+                self.detectors[detector_key] = detector
+
+                variant = settings.DETECTION_SETTINGS['MODEL_VARIANTS'].get(detector_key, 'fp32')
+                self._apply_variant(detector, variant)
+
+            return self.detectors[detector_key]
+
+    def get_detectors(self, detector_keys=None):
+        """Get a mapping of key to shared detector for the given keys, or for all detectors"""
+        keys = detector_keys if detector_keys is not None else DETECTOR_CLASSES.keys()
+        return {key: self.get_detector(key) for key in keys}
+
+    def set_variant(self, detector_key, variant):
+        """Switch a detector to the fp32 or int8 variant of its model, reloading it on next use"""
+        if variant not in MODEL_VARIANTS:
+            logger.error(f"Unknown model variant: {variant}")
+            raise ValueError(f"Unknown model variant: {variant}")
+
+        with self.lock:
+            detector = self.get_detector(detector_key)
+            if self.variants.get(detector_key) == variant:
+                return detector
+
+            self._apply_variant(detector, variant)
+            if detector_key in self.loaded_models:
+                del self.loaded_models[detector_key]
+            detector.unload_model()
+
+            logger.info(f"Switched model {detector_key} to the {variant} variant")
+            return detector
+
+    def get_variant(self, detector_key):
+        """Return the model variant a detector runs"""
+        with self.lock:
+            self.get_detector(detector_key)
+            return self.variants[detector_key]
+
+    def model_loaded(self, detector, load_time):
+        """Record a freshly loaded model and evict others if over the memory limit"""
+        size = self._estimate_model_size(detector)
+
+        with self.lock:
+            self.loaded_models[detector.registry_key] = size
+            self.loaded_models.move_to_end(detector.registry_key)
+            self.metrics['loads'] += 1
+            self.metrics['load_time'] += load_time
+
+            logger.info(
+                f"Loaded model {detector.registry_key} "
+                f"({size / (1024 * 1024):.1f} MB) in {load_time:.2f}s"
+            )
+
+            self._evict_if_needed(keep=detector.registry_key)
+
+    def model_used(self, detector):
+        """Mark a loaded model as most recently used"""
+        with self.lock:
+            if detector.registry_key in self.loaded_models:
+                self.loaded_models.move_to_end(detector.registry_key)
+                self.metrics['hits'] += 1
+
+    def unload(self, detector_key):
+        """Unload the weights of a detector; they are reloaded on its next use"""
+        with self.lock:
+            detector = self.detectors.get(detector_key)
+            if detector is None or detector_key not in self.loaded_models:
+                return False
+
+            del self.loaded_models[detector_key]
+            detector.unload_model()
+            self.metrics['evictions'] += 1
+
+            logger.info(f"Evicted model {detector_key}")
+            return True
+
+    def memory_usage(self):
+        """Return the estimated memory used by loaded models in bytes"""
+        with self.lock:
+            return sum(self.loaded_models.values())
+
+    def get_metrics(self):
+        """Return load/evict counters and the currently loaded models"""
+        with self.lock:
+            return {
+                **self.metrics,
+                'loaded_models': list(self.loaded_models.keys()),
+                'variants': dict(self.variants),
+                'memory_used_mb': round(self.memory_usage() / (1024 * 1024), 1),
+                'memory_limit_mb': round(self.memory_limit / (1024 * 1024), 1),
+            }
+
+    def warm_up(self, image_sizes, iterations=None):
+        """
+        Load the given detectors and run a few dummy inferences at their image sizes,
+        so the first real frame does not pay for weight loading and allocator warm-up.
+        image_sizes maps detector key to the input size it runs at.
+        Returns True if every detector warmed up.
+        """
+        if iterations is None:
+            iterations = settings.DETECTION_SETTINGS['WARMUP_ITERATIONS']
+
+        with self.lock:
+            self.warmup_status = 'warming'
+            self.warmup_models = {key: {'status': 'pending'} for key in image_sizes}
+
+        all_ready = True
+
+        for detector_key, image_size in image_sizes.items():
+            start_time = time.time()
+            try:
+                detector = self.get_detector(detector_key)
+                dummy_frame = np.zeros((image_size, image_size, 3), dtype=np.uint8)
+
+                for _ in range(max(1, iterations)):
+                    detector.detect(dummy_frame, 0.25, 0.45, image_size)
+
+                state = {
+                    'status': 'ready',
+                    'image_size': image_size,
+                    'warmup_time': round(time.time() - start_time, 2)
+                }
+                logger.info(f"Warmed up model {detector_key} at {image_size}px in {state['warmup_time']}s")
+            except Exception as e:
+                all_ready = False
+                state = {'status': 'failed', 'image_size': image_size, 'error': str(e)}
+                logger.error(f"Warm-up failed for model {detector_key}: {str(e)}")
+
+            with self.lock:
+                self.warmup_models[detector_key] = state
+
+        with self.lock:
+            self.warmup_status = 'ready' if all_ready else 'failed'
+
+        return all_ready
+
+    def start_warm_up(self, image_sizes, iterations=None):
+        """Run warm_up in a background thread; the registry reports not ready until it finishes"""
+        with self.lock:
+            self.warmup_status = 'warming'
+
+        warmup_thread = threading.Thread(target=self.warm_up, args=(image_sizes, iterations))
+        warmup_thread.daemon = True
+        warmup_thread.start()
+        return warmup_thread
+
+    def is_ready(self):
+        """Check whether this process has finished warming up its models"""
+        with self.lock:
+            return self.warmup_status in ('disabled', 'ready')
+
+    def get_warmup_status(self):
+        """Return the overall warm-up status and the state of each model"""
+        with self.lock:
+            return {
+                'status': self.warmup_status,
+                'ready': self.warmup_status in ('disabled', 'ready'),
+                'models': {key: dict(state) for key, state in self.warmup_models.items()}
+            }
+
+    def _apply_variant(self, detector, variant):
+        backend_name = MODEL_VARIANTS.get(variant)
+        detector.backend = get_backend(backend_name) if backend_name else None
+        self.variants[detector.registry_key] = variant
+
+    def _evict_if_needed(self, keep=None):
+        if not self.memory_limit:
+            return
+
+        while self.memory_usage() > self.memory_limit:
+            candidates = [key for key in self.loaded_models if key != keep]
+            if not candidates:
+                logger.warning(
+                    f"Model {keep} alone exceeds the model memory limit "
+                    f"of {self.memory_limit / (1024 * 1024):.0f} MB"
+                )
+                return
+
+            # The first entry is the least recently used
+            self.unload(candidates[0])
+
+    def _estimate_model_size(self, detector):
+        """Estimate the memory of a loaded model from its parameters, falling back to the weight file size"""
+        try:
+            module = getattr(detector.model, 'model', None)
+            if hasattr(module, 'parameters'):
+                size = sum(p.numel() * p.element_size() for p in module.parameters())
+                size += sum(b.numel() * b.element_size() for b in module.buffers())
+                if size:
+                    return size
+        except Exception as e:
+            logger.warning(f"Could not estimate size of model {detector.registry_key}: {str(e)}")
+
+        try:
+            return os.path.getsize(detector.model_path)
+        except OSError:
+            return 0
+
+
+# Shared by every ModelManager, stream manager and video processor in this process
+model_registry = ModelRegistry()
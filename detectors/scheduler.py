@@ -0,0 +1,294 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from django.conf import settings
+
+from .engine import MultiModelInferenceEngine
+
+logger = logging.getLogger('security_ai')
+
+@dataclass
+class InferenceRequest:
+    """A frame waiting for one detector"""
+    source_id: str
+    detector_key: str
+    frame: Any
+    conf_threshold: float
+    iou_threshold: float
+    image_size: int
+    callback: Callable
+    context: Any = None
+    submitted_at: float = field(default_factory=time.time)
+
+    @property
+    def batch_key(self):
+        """Requests with the same key can share a forward pass"""
+        return (self.image_size, self.iou_threshold)
+
+
+class InferenceScheduler:
+    """
+    Runs detector inference on a fixed pool of worker threads, off the capture threads.
+    Each detector has a bounded queue holding at most one pending frame per source: a newer
+    frame from the same source replaces the stale one in place (latest-frame-wins), and the
+    oldest source is dropped when the queue is full.
+
+    Pending frames of all sources that share a detector, image_size and iou_threshold are run
+    as one dynamic batch. A batch runs once it holds max_batch_size frames, a frame from every
+    source feeding it, or its oldest frame has waited max_delay seconds. The frames other idle
+    detectors have pending at the same input shape join it, so each frame is letterboxed and
+    normalized once for all models (see MultiModelInferenceEngine). Results are scattered
+    back to each request's callback on the worker thread as
+    callback(context, detector_key, detections), with detections None when inference failed.
+    """
+
+    def __init__(self, detectors, num_workers=None, queue_size=None, max_batch_size=None, max_delay=None):
+        """Initialize the scheduler with a mapping of detector key to detector"""
+        self.detectors = detectors
+        self.engine = MultiModelInferenceEngine(detectors)
+        self.num_workers = (
+            num_workers or settings.DETECTION_SETTINGS['SCHEDULER_WORKERS'] or os.cpu_count() or 1
+        )
+        self.queue_size = queue_size or settings.DETECTION_SETTINGS['SCHEDULER_QUEUE_SIZE']
+        self.max_batch_size = max(1, max_batch_size or settings.DETECTION_SETTINGS['STREAM_BATCH_SIZE'])
+        self.max_delay = (
+            max_delay if max_delay is not None else settings.DETECTION_SETTINGS['BATCH_MAX_WAIT']
+        )
+
+        self.condition = threading.Condition()
+        self.queues = {key: OrderedDict() for key in detectors}
+        # Batch key of every source feeding each detector, to know when a batch cannot grow
+        self.sources = {key: {} for key in detectors}
+        # A model instance is not re-entrant, so each detector runs on one worker at a time
+        self.busy = set()
+        self.next_index = 0
+        self.workers = []
+        self.running = False
+
+        self.metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'dropped': 0,
+            'batches': 0,
+            'preprocess_passes': 0,
+            'queue_time': 0.0,
+            'inference_time': 0.0,
+        }
+
+    def start(self):
+        """Start the worker threads"""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+
+            for index in range(self.num_workers):
+                worker = threading.Thread(target=self._run_worker, name=f"inference-{index}")
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+
+        logger.info(f"Inference scheduler started with {self.num_workers} workers")
+
+    def stop(self):
+        """Stop the workers; pending requests are discarded"""
+        with self.condition:
+            self.running = False
+            for queue in self.queues.values():
+                queue.clear()
+            for sources in self.sources.values():
+                sources.clear()
+            self.condition.notify_all()
+
+        self.workers = []
+
+    def submit(self, source_id, detector_key, frame, conf_threshold, iou_threshold, image_size,
+               callback, context=None):
+        """
+        Queue a frame for a detector without waiting for it to run.
+        Returns False when an older frame was dropped to make room.
+        """
+        if detector_key not in self.detectors:
+            logger.error(f"Unknown detector: {detector_key}")
+            raise ValueError(f"Unknown detector: {detector_key}")
+
+        if not self.running:
+            self.start()
+
+        request = InferenceRequest(
+            source_id, detector_key, frame, conf_threshold, iou_threshold, image_size,
+            callback, context
+        )
+
+        dropped = False
+        with self.condition:
+            queue = self.queues[detector_key]
+
+            if source_id in queue:
+                # Replacing keeps the source's place in line and its batching deadline
+                request.submitted_at = queue[source_id].submitted_at
+                dropped = True
+            elif len(queue) >= self.queue_size:
+                queue.popitem(last=False)
+                dropped = True
+
+            queue[source_id] = request
+            self.sources[detector_key][source_id] = request.batch_key
+            self.metrics['submitted'] += 1
+            if dropped:
+                self.metrics['dropped'] += 1
+
+            self.condition.notify()
+
+        return not dropped
+
+    def cancel(self, source_id):
+        """Discard every pending frame of a source"""
+        with self.condition:
+            for queue in self.queues.values():
+                queue.pop(source_id, None)
+            for sources in self.sources.values():
+                sources.pop(source_id, None)
+
+    def get_metrics(self):
+        """Return request counters, average timings and current queue depths"""
+        with self.condition:
+            finished = (self.metrics['completed'] + self.metrics['failed']) or 1
+            return {
+                'workers': self.num_workers,
+                'submitted': self.metrics['submitted'],
+                'completed': self.metrics['completed'],
+                'failed': self.metrics['failed'],
+                'dropped': self.metrics['dropped'],
+                'batches': self.metrics['batches'],
+                'preprocess_passes': self.metrics['preprocess_passes'],
+                'avg_batch_size': round(finished / (self.metrics['batches'] or 1), 2),
+                'avg_queue_ms': round(self.metrics['queue_time'] / finished * 1000, 2),
+                'avg_inference_ms': round(self.metrics['inference_time'] / finished * 1000, 2),
+                'queue_depths': {key: len(queue) for key, queue in self.queues.items()},
+            }
+
+    def _next_batch(self):
+        """Take the next batch that is ready to run; returns (batch, seconds until one may be ready)"""
+        now = time.time()
+        wait = None
+
+        # Round-robin over detectors so one busy model cannot starve the others
+        keys = list(self.queues.keys())
+        for offset in range(len(keys)):
+            key = keys[(self.next_index + offset) % len(keys)]
+            queue = self.queues[key]
+            if key in self.busy or not queue:
+                continue
+
+            # Batch the oldest pending request with the others sharing its input shape
+            oldest = next(iter(queue.values()))
+            batch = [r for r in queue.values() if r.batch_key == oldest.batch_key][:self.max_batch_size]
+            sources = sum(1 for batch_key in self.sources[key].values() if batch_key == oldest.batch_key)
+
+            remaining = oldest.submitted_at + self.max_delay - now
+            if len(batch) < min(self.max_batch_size, sources) and remaining > 0:
+                wait = remaining if wait is None else min(wait, remaining)
+                continue
+
+            for request in batch:
+                del queue[request.source_id]
+            self.busy.add(key)
+
+            # Idle detectors with frames pending at the same input shape share the preprocessing.
+            # Frames already in the batch come free; new ones only while the batch, which is
+            # preprocessed as one tensor, stays within max_batch_size frames
+            frame_ids = {id(request.frame) for request in batch}
+            for other_key, other_queue in self.queues.items():
+                if other_key in self.busy:
+                    continue
+                shared = []
+                for request in other_queue.values():
+                    if request.batch_key != oldest.batch_key:
+                        continue
+                    if id(request.frame) not in frame_ids:
+                        if len(frame_ids) >= self.max_batch_size:
+                            continue
+                        frame_ids.add(id(request.frame))
+                    shared.append(request)
+                for request in shared:
+                    del other_queue[request.source_id]
+                if shared:
+                    self.busy.add(other_key)
+                    batch.extend(shared)
+
+            self.next_index = (self.next_index + offset + 1) % len(keys)
+            return batch, None
+
+        return None, wait
+
+    def _run_worker(self):
+        while True:
+            with self.condition:
+                batch = None
+                while self.running:
+                    batch, wait = self._next_batch()
+                    if batch is not None:
+                        break
+                    self.condition.wait(wait)
+
+                if batch is None:
+                    return
+
+            image_size, iou_threshold = batch[0].batch_key
+            detector_keys = list(dict.fromkeys(request.detector_key for request in batch))
+
+            # A frame submitted to several detectors is preprocessed once for all of them
+            frames = []
+            positions = {}
+            frame_indices = {key: [] for key in detector_keys}
+            for request in batch:
+                position = positions.get(id(request.frame))
+                if position is None:
+                    position = positions[id(request.frame)] = len(frames)
+                    frames.append(request.frame)
+                frame_indices[request.detector_key].append(position)
+
+            started_at = time.time()
+            results = [None] * len(batch)
+            try:
+                # Run at the lowest threshold in the batch and filter per request afterwards;
+                # a detector that failed has no entry in the outputs
+                outputs = self.engine.detect_batch(
+                    frames,
+                    detector_keys,
+                    min(request.conf_threshold for request in batch),
+                    iou_threshold,
+                    image_size,
+                    frame_indices
+                )
+                for index, request in enumerate(batch):
+                    detections = outputs[positions[id(request.frame)]].get(request.detector_key)
+                    if detections is not None:
+                        results[index] = detections.filter(request.conf_threshold)
+            except Exception as e:
+                logger.error(f"Scheduled inference error ({', '.join(detector_keys)}, {len(frames)} frames): {e}")
+            finally:
+                finished_at = time.time()
+                failed = sum(1 for detections in results if detections is None)
+                with self.condition:
+                    self.busy.difference_update(detector_keys)
+                    self.metrics['batches'] += len(detector_keys)
+                    self.metrics['preprocess_passes'] += 1
+                    self.metrics['completed'] += len(batch) - failed
+                    self.metrics['failed'] += failed
+                    self.metrics['queue_time'] += sum(started_at - r.submitted_at for r in batch)
+                    self.metrics['inference_time'] += (finished_at - started_at) * len(batch)
+                    # The detectors are free again; wake workers for their queues
+                    self.condition.notify_all()
+
+            for request, detections in zip(batch, results):
+                try:
+                    request.callback(request.context, request.detector_key, detections)
+                except Exception as e:
+                    logger.error(f"Inference callback error ({request.detector_key}): {e}")
@@ -0,0 +1,45 @@
+from rest_framework import serializers
+from django.conf import settings
+from .models import VideoProcessingJob
+
+class VideoProcessingJobSerializer(serializers.ModelSerializer):
+    """Serializer for VideoProcessingJob model, with progress and ETA."""
+    
+    progress = serializers.FloatField(read_only=True)
+    eta_seconds = serializers.FloatField(read_only=True, allow_null=True)
+    segment_count = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = VideoProcessingJob
+        exclude = ('segments', 'completed_segments', 'base_name')
+        read_only_fields = ('created_at', 'updated_at')
+    
+    def get_segment_count(self, obj):
+        return {'total': len(obj.segments), 'completed': len(obj.completed_segments)}
+
+
+class VideoAnalysisSerializer(serializers.Serializer):
+    """Serializer for queueing the analysis of an uploaded video."""
+    
+    PRIORITY_CHOICES = (
+        ('incident', 'Live incident'),
+        ('backfill', 'Backfill'),
+    )
+    
+    video = serializers.FileField()
+    detector_key = serializers.ChoiceField(choices=list(settings.MODEL_PATHS))
+    conf_threshold = serializers.FloatField(required=False, min_value=0.0, max_value=1.0)
+    iou_threshold = serializers.FloatField(required=False, min_value=0.0, max_value=1.0)
+    image_size = serializers.IntegerField(required=False, min_value=32)
+    camera_id = serializers.IntegerField(required=False)
+    output_mode = serializers.ChoiceField(choices=VideoProcessingJob.OUTPUT_MODE_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=PRIORITY_CHOICES, default='backfill')
+
+
+class CameraClipAnalysisSerializer(serializers.Serializer):
+    """Serializer for queueing the recording and analysis of a camera clip."""
+    
+    camera_id = serializers.IntegerField()
+    detector_key = serializers.ChoiceField(choices=list(settings.MODEL_PATHS))
+    duration = serializers.IntegerField(default=60, min_value=1, max_value=3600)
+    frame_limit = serializers.IntegerField(default=300, min_value=1)
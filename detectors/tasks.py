@@ -0,0 +1,103 @@
+import logging
+from datetime import timedelta
+from celery import shared_task
+from celery.utils import uuid
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobTakenOver, VideoProcessingJob
+from utils.video_processor import VideoProcessor
+
+logger = logging.getLogger('security_ai')
+
+# Queue for clips of live incidents, processed ahead of bulk backfills
+INCIDENT_QUEUE = 'incidents'
+BACKFILL_QUEUE = 'backfill'
+
+
+def enqueue_video_job(job, queue=None):
+    """
+    Send a video processing job to its queue and remember the task id.
+    Returns None without sending a task when the job changed since it was loaded, e.g.
+    because it was requeued concurrently or its task is still alive.
+    """
+    job.queue = queue or job.queue
+
+    # The new task owns the job before it is sent, so it can never start unclaimed; the
+    # handover also counts as a sign of life, so the job is not requeued while it waits
+    task_id = uuid()
+    if not job.hand_over(task_id):
+        logger.info(f"Video job {job.id} changed since it was loaded; not requeueing it")
+        return None
+
+    return process_video_job.apply_async(args=(job.id,), queue=job.queue, task_id=task_id)
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_video_job(self, job_id):
+    """
+    Run a video processing job.
+    The task is acknowledged only once it finishes, so if its worker dies it is delivered
+    again and the job resumes from its last checkpoint.
+    A task whose job has since been handed to another task (requeued as stale or resumed)
+    leaves it to that task.
+    """
+    # Claim the job in one statement, so two tasks can never both start it. A redelivered
+    # copy of this task (after a worker crash or the broker's visibility timeout) only takes
+    # over once the job's heartbeat has gone stale, never from a worker still running it.
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.DETECTION_SETTINGS['JOB_STALE_SECONDS'])
+    claimed = VideoProcessingJob.objects.filter(id=job_id, task_id=self.request.id).filter(
+        Q(status='pending') | Q(status='running', heartbeat__lt=stale_before)
+    ).update(status='running', heartbeat=now, updated_at=now)
+
+    job = VideoProcessingJob.objects.get(id=job_id)
+    if job.status == 'completed':
+        logger.info(f"Video job {job.id} is already complete")
+        return {'job_id': job.id, 'output_path': job.output_path, 'alert_id': job.alert_id}
+    if not claimed:
+        logger.info(
+            f"Video job {job.id} is {job.status} under task {job.task_id}; task {self.request.id} is exiting"
+        )
+        return {'job_id': job.id, 'output_path': None, 'alert_id': None}
+
+    try:
+        output_path, alert = VideoProcessor().run_job(job)
+    except JobTakenOver as e:
+        logger.warning(str(e))
+        return {'job_id': job.id, 'output_path': None, 'alert_id': None}
+    return {'job_id': job.id, 'output_path': output_path, 'alert_id': alert.id}
+
+
+@shared_task(acks_late=True)
+def process_camera_stream(camera_id, detector_key, duration=60, frame_limit=300):
+    """Record and analyze a clip from a camera"""
+    output_path, alert = VideoProcessor().process_camera_stream(
+        camera_id, detector_key, duration=duration, frame_limit=frame_limit
+    )
+    return {'camera_id': camera_id, 'output_path': output_path, 'alert_id': alert.id}
+
+
+@shared_task
+def render_annotated_video(alert_id):
+    """Render an alert's detections onto its video for the annotated-video endpoint"""
+    from alerts.models import Alert
+
+    alert = Alert.objects.get(id=alert_id)
+    output_path = VideoProcessor().render_annotated_video(alert)
+    return {'alert_id': alert_id, 'output_path': output_path}
+
+
+@shared_task
+def resume_stale_video_jobs():
+    """Requeue running jobs that stopped sending heartbeats without their task being redelivered"""
+    stale_seconds = settings.DETECTION_SETTINGS['JOB_STALE_SECONDS']
+    resumed = []
+
+    for job in VideoProcessingJob.objects.filter(status='running'):
+        if job.is_stale(stale_seconds) and enqueue_video_job(job):
+            logger.warning(f"Requeued stale video job {job.id} at {job.progress}%")
+            resumed.append(job.id)
+
+    return resumed
@@ -0,0 +1,11 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import AnalysisTaskViewSet, VideoProcessingJobViewSet
+
+router = DefaultRouter()
+router.register(r'jobs', VideoProcessingJobViewSet, basename='video-job')
+router.register(r'tasks', AnalysisTaskViewSet, basename='analysis-task')
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
@@ -0,0 +1,224 @@
+from rest_framework import viewsets, status, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.conf import settings
+from django.db.models import Q
+from celery.result import AsyncResult
+import os
+import uuid
+import logging
+
+from .models import VideoProcessingJob
+from .serializers import VideoProcessingJobSerializer, VideoAnalysisSerializer, CameraClipAnalysisSerializer
+from .tasks import BACKFILL_QUEUE, INCIDENT_QUEUE, enqueue_video_job, process_camera_stream
+from cameras.models import Camera
+from utils.model_manager import ModelManager
+from utils.video_processor import VideoProcessor
+
+logger = logging.getLogger('security_ai')
+
+def get_user_camera(user, camera_id):
+    """Return a camera the user may use, or None."""
+    cameras = Camera.objects.all() if user.is_admin() else Camera.objects.filter(user=user)
+    return cameras.filter(id=camera_id).first()
+
+
+class VideoProcessingJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for queueing video analysis and following the progress of processing jobs."""
+    
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = VideoProcessingJobSerializer
+    
+    def get_queryset(self):
+        """Return all jobs for admins, or the jobs a user started or that use their cameras."""
+        user = self.request.user
+        if user.is_admin():
+            queryset = VideoProcessingJob.objects.all()
+        else:
+            queryset = VideoProcessingJob.objects.filter(Q(created_by=user) | Q(camera__user=user))
+        
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
+        """List jobs with pagination."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+            response.data = {
+                'success': True,
+                'data': response.data,
+                'message': 'Jobs retrieved successfully.',
+                'errors': []
+            }
+            return response
+        
+        serializer = self.get_serializer(queryset, many=True)
+        return Response({
+            'success': True,
+            'data': serializer.data,
+            'message': 'Jobs retrieved successfully.',
+            'errors': []
+        })
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a job with its progress and ETA."""
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        
+        return Response({
+            'success': True,
+            'data': serializer.data,
+            'message': 'Job retrieved successfully.',
+            'errors': []
+        })
+    
+    def create(self, request, *args, **kwargs):
+        """Upload a video and queue it for analysis."""
+        serializer = VideoAnalysisSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        camera_id = data.get('camera_id')
+        if camera_id and get_user_camera(request.user, camera_id) is None:
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'Camera not found.',
+                'errors': [f'Camera with ID {camera_id} not found.']
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            video_path = self._save_upload(data['video'])
+            config = ModelManager().get_detector_config(data['detector_key'])
+            
+            job = VideoProcessor().create_job(
+                video_path,
+                data['detector_key'],
+                data.get('conf_threshold', config['conf_threshold']),
+                data.get('iou_threshold', config['iou_threshold']),
+                data.get('image_size', config['image_size']),
+                camera_id=camera_id,
+                output_mode=data.get('output_mode'),
+                user=request.user
+            )
+            enqueue_video_job(job, INCIDENT_QUEUE if data['priority'] == 'incident' else BACKFILL_QUEUE)
+            
+            return Response({
+                'success': True,
+                'data': VideoProcessingJobSerializer(job).data,
+                'message': 'Video queued for analysis.',
+                'errors': []
+            }, status=status.HTTP_202_ACCEPTED)
+            
+        except Exception as e:
+            logger.error(f"Error queueing video analysis: {str(e)}")
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'Error queueing video analysis.',
+                'errors': [str(e)]
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        """Queue a failed or abandoned job again; it continues from its last checkpoint."""
+        job = self.get_object()
+        
+        if job.status == 'completed' or (job.status == 'running' and not job.is_stale(
+                settings.DETECTION_SETTINGS['JOB_STALE_SECONDS'])):
+            return Response({
+                'success': False,
+                'data': VideoProcessingJobSerializer(job).data,
+                'message': f'Job is {job.status} and cannot be resumed.',
+                'errors': ['Only pending, failed or stale jobs can be resumed.']
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if enqueue_video_job(job) is None:
+            job.refresh_from_db()
+            return Response({
+                'success': False,
+                'data': VideoProcessingJobSerializer(job).data,
+                'message': 'Job changed while it was being queued.',
+                'errors': ['The job was requeued or completed by another request.']
+            }, status=status.HTTP_409_CONFLICT)
+        
+        return Response({
+            'success': True,
+            'data': VideoProcessingJobSerializer(job).data,
+            'message': f'Job queued to resume at {job.progress}%.',
+            'errors': []
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    def _save_upload(self, upload):
+        upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploads', 'videos')
+        os.makedirs(upload_dir, exist_ok=True)
+        
+        video_path = os.path.join(upload_dir, f"{uuid.uuid4().hex[:8]}_{os.path.basename(upload.name)}")
+        with open(video_path, 'wb') as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+        return video_path
+
+
+class AnalysisTaskViewSet(viewsets.ViewSet):
+    """ViewSet for queueing camera clip analysis and checking the status of analysis tasks."""
+    
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def retrieve(self, request, pk=None):
+        """Get the state and, once finished, the result of an analysis task."""
+        result = AsyncResult(pk)
+        
+        data = {
+            'task_id': pk,
+            'state': result.state,
+            'ready': result.ready(),
+            'result': None,
+            'error': None,
+        }
+        if result.successful():
+            data['result'] = result.result
+        elif result.failed():
+            data['error'] = str(result.result)
+        
+        return Response({
+            'success': True,
+            'data': data,
+            'message': f'Task is {result.state.lower()}.',
+            'errors': []
+        })
+    
+    @action(detail=False, methods=['post'], url_path='camera-clip')
+    def camera_clip(self, request):
+        """Queue recording and analysis of a clip from a camera on the incident queue."""
+        serializer = CameraClipAnalysisSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        if get_user_camera(request.user, data['camera_id']) is None:
+            return Response({
+                'success': False,
+                'data': {},
+                'message': 'Camera not found.',
+                'errors': [f"Camera with ID {data['camera_id']} not found."]
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        result = process_camera_stream.apply_async(
+            args=(data['camera_id'], data['detector_key']),
+            kwargs={'duration': data['duration'], 'frame_limit': data['frame_limit']},
+            queue=INCIDENT_QUEUE
+        )
+        
+        return Response({
+            'success': True,
+            'data': {'task_id': result.id, 'state': result.state},
+            'message': 'Camera clip queued for analysis.',
+            'errors': []
+        }, status=status.HTTP_202_ACCEPTED)
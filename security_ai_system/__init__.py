@@ -1,4 +1,9 @@
 # Security AI System
 # A comprehensive security monitoring system with AI-powered detection
 
-__version__ = '1.0.0'
\ No newline at end of file
+__version__ = '1.0.0'
+
+# Load the Celery app when Django starts so shared tasks use it
+from .celery import app as celery_app
+
+__all__ = ('celery_app',)
@@ -17,19 +17,8 @@ app.autodiscover_tasks()
 
 # Define periodic tasks
 app.conf.beat_schedule = {
-    'update-camera-statuses': {
-        'task': 'api.tasks.update_camera_statuses',
-        'schedule': 300.0,  # Every 5 minutes
+    'resume-stale-video-jobs': {
+        'task': 'detectors.tasks.resume_stale_video_jobs',
+        'schedule': 600.0,  # Every 10 minutes
     },
-    'perform-system-check': {
-        'task': 'api.tasks.perform_system_check',
-        'schedule': 3600.0,  # Every hour
-    },
-    'send-daily-email-digest': {
-        'task': 'api.tasks.send_email_digest',
-        'schedule': 86400.0,  # Every day
-        'args': (),
-        'kwargs': {},
-        'options': {'expires': 3600},
-    },
-}
\ No newline at end of file
+}
@@ -82,6 +82,28 @@ REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
 
+# Celery: live-incident clips and bulk backfills run on separate queues, so each gets its
+# own workers and concurrency (see docker-compose.yml)
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/1')
+CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', f'redis://{REDIS_HOST}:{REDIS_PORT}/2')
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_RESULT_SERIALIZER = 'json'
+CELERY_RESULT_EXTENDED = True
+CELERY_RESULT_EXPIRES = 7 * 24 * 3600
+CELERY_TASK_TRACK_STARTED = True
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_ROUTES = {
+    'detectors.tasks.process_camera_stream': {'queue': 'incidents'},
+    'detectors.tasks.process_video_job': {'queue': 'backfill'},
+}
+# Analysis tasks run for minutes; workers take one at a time and a task is redelivered
+# if its worker dies (the visibility timeout must exceed the longest job)
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'visibility_timeout': int(os.environ.get('CELERY_VISIBILITY_TIMEOUT', 6 * 3600)),
+}
+
 GSTREAMER_SETTINGS = {
     'DEFAULT_WIDTH': 1280,
     'DEFAULT_HEIGHT': 720,
@@ -108,6 +130,92 @@ STREAMING_SETTINGS = {
     'SESSION_TIMEOUT': 300,
     'CLEANUP_INTERVAL': 60,
     'MONITORING_INTERVAL': 30,
+    # Live frames bypass the channel layer: 'redis' hands them to consumers in the producing
+    # process through an in-memory ring and to other processes and nodes through a capped
+    # Redis Stream per camera, 'local' only serves consumers in the producing process
+    'FRAME_BUS': os.environ.get('STREAMING_FRAME_BUS', 'redis'),
+    # Frames kept per camera in the in-process ring; a consumer further behind skips to the newest
+    'FRAME_RING_SIZE': int(os.environ.get('STREAMING_FRAME_RING_SIZE', 4)),
+    # Approximate length cap of each camera's Redis Stream
+    'FRAME_STREAM_MAXLEN': int(os.environ.get('STREAMING_FRAME_STREAM_MAXLEN', 30)),
+    # Seconds between the pings that measure each viewer's round trip time
+    'PING_INTERVAL': float(os.environ.get('STREAMING_PING_INTERVAL', 2.0)),
+    # Client backlog (round trip above the fastest seen, in seconds) that steps a viewer down a
+    # quality tier, and below which RECOVER_PINGS round trips in a row step it back up
+    'DEGRADE_DELAY': float(os.environ.get('STREAMING_DEGRADE_DELAY', 0.5)),
+    'RECOVER_DELAY': float(os.environ.get('STREAMING_RECOVER_DELAY', 0.1)),
+    'RECOVER_PINGS': int(os.environ.get('STREAMING_RECOVER_PINGS', 5)),
+    # Seconds a ping may stay unanswered before frames to the viewer are dropped until it answers
+    'STALL_SECONDS': float(os.environ.get('STREAMING_STALL_SECONDS', 3.0)),
+}
+
+DETECTION_SETTINGS = {
+    # Frames per forward pass for offline video processing
+    'VIDEO_BATCH_SIZE': int(os.environ.get('DETECTION_VIDEO_BATCH_SIZE', 8)),
+    # Processed upload output: 'sidecar' keeps the original video and stores boxes in a detections
+    # file rendered on demand, 'annotated' re-encodes the video with boxes drawn in
+    'VIDEO_OUTPUT_MODE': os.environ.get('DETECTION_VIDEO_OUTPUT_MODE', 'sidecar'),
+    # Worker processes for parallel processing of long uploads (0 = one per CPU core)
+    'VIDEO_WORKERS': int(os.environ.get('DETECTION_VIDEO_WORKERS', 0)),
+    # Frames per checkpointed segment of a video processing job (0 = one segment per worker)
+    'CHECKPOINT_FRAMES': int(os.environ.get('DETECTION_CHECKPOINT_FRAMES', 1500)),
+    # Seconds without a heartbeat after which a running job is considered abandoned, and
+    # seconds between the heartbeats a running job writes (well below the stale timeout)
+    'JOB_STALE_SECONDS': int(os.environ.get('DETECTION_JOB_STALE_SECONDS', 900)),
+    'JOB_HEARTBEAT_SECONDS': int(os.environ.get('DETECTION_JOB_HEARTBEAT_SECONDS', 60)),
+    # Smallest segment worth a separate worker process, in frames
+    'MIN_SEGMENT_FRAMES': int(os.environ.get('DETECTION_MIN_SEGMENT_FRAMES', 1500)),
+    # Seconds / detections between writes of a processing alert's confidence and severity
+    'ALERT_FLUSH_INTERVAL': float(os.environ.get('DETECTION_ALERT_FLUSH_INTERVAL', 5.0)),
+    'ALERT_FLUSH_FRAMES': int(os.environ.get('DETECTION_ALERT_FLUSH_FRAMES', 250)),
+    # Best frames kept during processing for the alert thumbnail and previews, at least
+    # PREVIEW_MIN_GAP frames apart
+    'PREVIEW_FRAMES': int(os.environ.get('DETECTION_PREVIEW_FRAMES', 9)),
+    'PREVIEW_MIN_GAP': int(os.environ.get('DETECTION_PREVIEW_MIN_GAP', 30)),
+    # Also save a contact sheet / animated GIF of the kept frames with each alert
+    'CONTACT_SHEET': os.environ.get('DETECTION_CONTACT_SHEET', 'True') == 'True',
+    'ANIMATED_PREVIEW': os.environ.get('DETECTION_ANIMATED_PREVIEW', 'False') == 'True',
+    # Video decoder: opencv, pyav (FFmpeg with threaded decoding) or auto (pyav if installed)
+    'VIDEO_DECODER': os.environ.get('DETECTION_VIDEO_DECODER', 'auto'),
+    'DECODE_THREADS': int(os.environ.get('DETECTION_DECODE_THREADS', 0)),
+    # Videos are sampled and detected on frames of no more than this multiple of the model
+    # input size (0 = full resolution); full-resolution frames are only made for writing.
+    # Sidecar-mode videos skip non-reference frames when sampling every Nth frame or
+    # sparser (0 = never skip)
+    'DECODE_SCALE': float(os.environ.get('DETECTION_DECODE_SCALE', 2.0)),
+    'SKIP_NONREF_STRIDE': int(os.environ.get('DETECTION_SKIP_NONREF_STRIDE', 3)),
+    # Frames buffered between the decode, inference and encode stages of offline processing
+    'PIPELINE_QUEUE_SIZE': int(os.environ.get('DETECTION_PIPELINE_QUEUE_SIZE', 32)),
+    # Maximum frames per forward pass when batching live streams across cameras (1 disables batching)
+    'STREAM_BATCH_SIZE': int(os.environ.get('DETECTION_STREAM_BATCH_SIZE', 8)),
+    # Maximum seconds a queued frame may wait for its batch to fill
+    'BATCH_MAX_WAIT': float(os.environ.get('DETECTION_BATCH_MAX_WAIT', 0.1)),
+    # Memory cap for loaded models per process in MB; least recently used models are evicted (0 = no cap)
+    'MODEL_MEMORY_LIMIT_MB': int(os.environ.get('DETECTION_MODEL_MEMORY_LIMIT_MB', 0)),
+    # Live stream inference workers (0 = one per CPU core) and pending frames per detector
+    'SCHEDULER_WORKERS': int(os.environ.get('DETECTION_SCHEDULER_WORKERS', 0)),
+    'SCHEDULER_QUEUE_SIZE': int(os.environ.get('DETECTION_SCHEDULER_QUEUE_SIZE', 32)),
+    # Seconds a live stream keeps drawing a model's last detections while waiting for new ones
+    'STALE_DETECTION_AGE': float(os.environ.get('DETECTION_STALE_DETECTION_AGE', 1.0)),
+    # Load and warm up models when a web or Celery worker starts
+    'PRELOAD_MODELS': os.environ.get('DETECTION_PRELOAD_MODELS', 'True') == 'True',
+    'PRELOAD_DETECTORS': os.environ.get('DETECTION_PRELOAD_DETECTORS', 'fire_smoke,fall,violence,choking').split(','),
+    # Dummy inferences per model during warm-up
+    'WARMUP_ITERATIONS': int(os.environ.get('DETECTION_WARMUP_ITERATIONS', 3)),
+    # Inference runtime: torch, onnxruntime, openvino or auto (best installed CPU runtime)
+    'INFERENCE_BACKEND': os.environ.get('DETECTION_INFERENCE_BACKEND', 'torch'),
+    # Runtime thread pools (0 = runtime default)
+    'INTRA_OP_THREADS': int(os.environ.get('DETECTION_INTRA_OP_THREADS', 0)),
+    'INTER_OP_THREADS': int(os.environ.get('DETECTION_INTER_OP_THREADS', 0)),
+    # Exported ONNX/OpenVINO models, keyed by the hash of their .pt weights
+    'MODEL_CACHE_DIR': os.path.join(BASE_DIR, 'models', 'cache'),
+    # Model variant per detector, e.g. "fire_smoke=int8"; unlisted detectors use fp32.
+    # INT8 variants are produced by the quantize_models management command
+    'MODEL_VARIANTS': dict(
+        item.split('=', 1)
+        for item in os.environ.get('DETECTION_MODEL_VARIANTS', '').split(',')
+        if '=' in item
+    ),
 }
 
 # Database
@@ -28,6 +28,7 @@ urlpatterns = [
     path('api/auth/', include('accounts.urls')),
     path('api/cameras/', include('cameras.urls')),
     path('api/alerts/', include('alerts.urls')),
+    path('api/detectors/', include('detectors.urls')),
     path('api/faces/', include('faces.urls')),
     path('api/notifications/', include('notifications.urls')),
     path('api/admin/', include('admin_panel.urls')),
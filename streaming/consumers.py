@@ -1,9 +1,13 @@
 # streaming/consumers.py
 import json
+import asyncio
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
+from utils.adaptive_quality import AdaptiveQuality
+from utils.frame_bus import frame_bus
+from utils.frame_protocol import BINARY_SUBPROTOCOL, PROTOCOLS, negotiate_protocol, pack_frame
 
 logger = logging.getLogger('security_ai')
 
@@ -22,32 +26,62 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        # Clients offering the binary subprotocol get frames as binary messages
+        self.protocol, subprotocol = negotiate_protocol(self.scope)
+        await self.accept(subprotocol=subprotocol)
+        
+        # Frames and their detections come from the frame bus; the group carries alerts and errors.
+        # A slow client is sent the newest frame at a lower frame rate, or paused while stalled
+        self.rate = AdaptiveQuality()
+        self.frames = frame_bus.subscribe(self.group_name, latest=True)
+        self.frame_task = asyncio.ensure_future(self.forward_frames())
         logger.info(f"WebSocket connected: {self.group_name} (User: {self.user.email})")
         
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': 'Connected stream!',
-            'group_name': self.group_name
+            'group_name': self.group_name,
+            'protocol': self.protocol,
+            'protocols': list(PROTOCOLS),
+            'binary_subprotocol': BINARY_SUBPROTOCOL
         }))
 
     async def disconnect(self, close_code):
+        if getattr(self, 'frame_task', None):
+            self.frame_task.cancel()
+            self.frames.close()
+        
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
         logger.info(f"WebSocket disconnected: {self.group_name}")
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
+        # Only control messages come from clients, always as JSON text
+        if text_data is None:
+            logger.warning("Received binary message from client")
+            return
+        
         try:
             text_data_json = json.loads(text_data)
             message_type = text_data_json.get('type', '')
             
-            if message_type == 'ping':
+            if message_type == 'set_protocol':
+                protocol = text_data_json.get('protocol')
+                if protocol in PROTOCOLS:
+                    self.protocol = protocol
+                await self.send(text_data=json.dumps({
+                    'type': 'protocol_changed',
+                    'protocol': self.protocol
+                }))
+            elif message_type == 'ping':
                 await self.send(text_data=json.dumps({
                     'type': 'pong',
                     'timestamp': text_data_json.get('timestamp')
                 }))
+            elif message_type == 'pong':
+                await self.apply_quality(self.rate.on_pong(text_data_json.get('id')))
             elif message_type == 'request_frame':
                 pass
             else:
@@ -58,32 +92,60 @@ class CameraStreamConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Message processing error: {e}")
 
-    async def send_frame(self, event):
+    async def apply_quality(self, quality):
+        # Frames are encoded once for all viewers, so only the frame rate follows the tier
+        if quality is None:
+            return
+        
+        await self.send(text_data=json.dumps({
+            'type': 'quality_changed',
+            'quality': quality,
+            'fps': self.rate.fps,
+            'automatic': True,
+            'connection': self.rate.get_stats()
+        }))
+
+    async def forward_frames(self):
+        async for metadata, data in self.frames:
+            # Pings queue behind the frames, so their round trips measure the client's backlog
+            ping = self.rate.next_ping()
+            if ping:
+                await self.send(text_data=json.dumps(ping))
+            await self.apply_quality(self.rate.check_stall())
+            
+            if self.rate.allow_frame():
+                await self.send_video_frame(metadata, data)
+
+    async def send_video_frame(self, metadata, data):
+        # Frames arrive as JPEG bytes and base64 text encoded once by the streamer, sent as-is
         try:
-            frame = event['frame']
-            metadata = event.get('metadata', {})
+            if self.protocol == 'binary':
+                detections = metadata.get('detections', [])
+                await self.send(bytes_data=pack_frame(
+                    metadata.get('camera_id', 0),
+                    metadata.get('frame_count', 0),
+                    metadata.get('timestamp'),
+                    len(detections),
+                    data['jpeg']
+                ))
+                # The header only counts detections; their details follow as a control message
+                if detections:
+                    await self.send(text_data=json.dumps({
+                        'type': 'detections',
+                        'frame_count': metadata.get('frame_count'),
+                        'detections': detections
+                    }))
+                return
             
             await self.send(text_data=json.dumps({
                 'type': 'video_frame',
-                'frame': frame,
+                'frame': data['base64'],
                 'metadata': metadata
             }))
             
         except Exception as e:
             logger.error(f"Frame transform error: {e}")
 
-    async def send_detection(self, event):
-        try:
-            detection = event['detection']
-            
-            await self.send(text_data=json.dumps({
-                'type': 'detection_result',
-                'detection': detection
-            }))
-            
-        except Exception as e:
-            logger.error(f"Detect result error: {e}")
-
     async def send_alert(self, event):
         try:
             alert = event['alert']
@@ -6,18 +6,24 @@ from gi.repository import Gst, GstApp, GLib
 
 import cv2
 import redis
+import numpy as np
 import json
 import time
-import base64
 import threading
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from django.conf import settings
 from django.utils import timezone
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from cameras.models import Camera
-from detectors import FireSmokeDetector, FallDetector, ViolenceDetector, ChokingDetector
+from detectors import model_registry
+from detectors.engine import MultiModelInferenceEngine
+from detectors.scheduler import InferenceScheduler
+from utils.frame_bus import frame_bus
+from utils.frame_encoder import EncodedFrame
+from utils.frame_sampler import AdaptiveFrameSampler
+from utils.video_sources import VideoFrame, open_stream
 Gst.init(None)
 
 logger = logging.getLogger('security_ai')
@@ -30,16 +36,18 @@ class IntegratedStreamManager:
             db=settings.REDIS_DB,
             decode_responses=True
         )
-        self.channel_layer = get_channel_layer()
+        # Cached frames are raw JPEG bytes
+        self.redis_binary = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
         self.active_streams = {}
         self.stream_locks = {}
         self.background_tasks_running = False
-        self.detectors = {
-            'fire_smoke': FireSmokeDetector(),
-            'fall': FallDetector(),
-            'violence': ViolenceDetector(),
-            'choking': ChokingDetector()
-        }
+        self.detectors = model_registry.get_detectors()
+        # Every camera's frames are detected on one shared worker pool
+        self.scheduler = InferenceScheduler(self.detectors)
     
     def start_camera_stream(self, camera_id: int, use_gstreamer: bool = True) -> Dict:
         try:
@@ -49,9 +57,9 @@ class IntegratedStreamManager:
             session_id = f"camera_{camera_id}_{int(time.time())}"
             group_name = f"stream_{session_id}"
             if use_gstreamer and self._can_use_gstreamer(camera):
-                streamer = GStreamerAIStreamer(camera, session_id, group_name, self.detectors)
+                streamer = GStreamerAIStreamer(camera, session_id, group_name, self.detectors, self.scheduler)
             else:
-                streamer = OpenCVAIStreamer(camera, session_id, group_name, self.detectors)
+                streamer = OpenCVAIStreamer(camera, session_id, group_name, self.detectors, self.scheduler)
             if streamer.start():
                 self.active_streams[camera_id] = streamer
                 self.stream_locks[camera_id] = threading.Lock()
@@ -90,6 +98,7 @@ class IntegratedStreamManager:
                 with self.stream_locks.get(camera_id, threading.Lock()):
                     streamer = self.active_streams.pop(camera_id)
                     streamer.stop()
+                    frame_bus.discard(streamer.group_name)
                     self._cleanup_session(streamer.session_id)
                     
                     if camera_id in self.stream_locks:
@@ -232,11 +241,14 @@ class IntegratedStreamManager:
 
 
 class BaseAIStreamer:
-    def __init__(self, camera, session_id: str, group_name: str, detectors: Dict):
+    def __init__(self, camera, session_id: str, group_name: str, detectors: Dict,
+                 scheduler: InferenceScheduler):
         self.camera = camera
         self.session_id = session_id
         self.group_name = group_name
         self.detectors = detectors
+        self.engine = MultiModelInferenceEngine(detectors)
+        self.scheduler = scheduler
         self.channel_layer = get_channel_layer()
         self.redis_client = redis.Redis(
             host=settings.REDIS_HOST,
@@ -248,6 +260,17 @@ class BaseAIStreamer:
         self.frame_count = 0
         self.detection_count = 0
         self.last_frame_time = 0
+        
+        # Latest result of each model as (Detections, received_at), drawn on every outgoing frame,
+        # and the results not yet turned into detection events and alerts
+        self.results_lock = threading.Lock()
+        self.latest_detections = {}
+        self.pending_results = []
+        self.stale_detection_age = settings.DETECTION_SETTINGS['STALE_DETECTION_AGE']
+        
+        # Skips inference on static frames and speeds up when motion appears
+        self.sampler = AdaptiveFrameSampler.from_camera(camera)
+        
         self.metrics = {
             'fps': 0,
             'frame_count': 0,
@@ -255,62 +278,87 @@ class BaseAIStreamer:
             'start_time': time.time()
         }
     
-    def process_detection(self, frame):
-        try:
-            if not self.camera.detection_enabled:
-                return frame, []
-            
-            detections = []
-            annotated_frame = frame.copy()
-            
-            detection_types = []
-            if self.camera.fire_smoke_detection:
-                detection_types.append('fire_smoke')
-            if self.camera.fall_detection:
-                detection_types.append('fall')
-            if self.camera.violence_detection:
-                detection_types.append('violence')
-            if self.camera.choking_detection:
-                detection_types.append('choking')
-            
-            for detection_type in detection_types:
-                if detection_type in self.detectors:
-                    detector = self.detectors[detection_type]
-                    
-                    try:
-                        processed_frame, results = detector.predict_video_frame(
-                            frame,
-                            self.camera.confidence_threshold,
-                            self.camera.iou_threshold,
-                            self.camera.image_size
-                        )
-                        
-                        for r in results:
-                            if r.boxes is not None and len(r.boxes) > 0:
-                                confidences = r.boxes.conf.tolist()
-                                if confidences and max(confidences) >= self.camera.confidence_threshold:
-                                    detection = {
-                                        'type': detection_type,
-                                        'confidence': max(confidences),
-                                        'timestamp': time.time(),
-                                        'camera_id': self.camera.id
-                                    }
-                                    detections.append(detection)
-                                    self.detection_count += 1
-                                    
-                                    if max(confidences) >= 0.8:
-                                        self._create_alert(detection_type, max(confidences))
-                        
-                        annotated_frame = processed_frame
-                        
-                    except Exception as e:
-                        logger.error(f"Detect error:  ({detection_type}): {e}")
-            
-            return annotated_frame, detections
-            
-        except Exception as e:
-            logger.error(f"AI detect processing error: {e}")
-            return frame, []
+    def submit_detection(self, frame, context=None):
+        """Hand a frame to the inference scheduler for every enabled detector without waiting"""
+        if not self.camera.detection_enabled:
+            return
+        
+        if not self.sampler.should_sample(frame):
+            return
+        
+        for detection_type in self._get_detection_types():
+            self.scheduler.submit(
+                self.session_id,
+                detection_type,
+                frame,
+                self.camera.confidence_threshold,
+                self.camera.iou_threshold,
+                self.camera.image_size,
+                self._on_detection,
+                context
+            )
+    
+    def _on_detection(self, context, detection_type: str, frame_detections):
+        # Runs on a scheduler worker thread; alerts need the database, so they are left to
+        # the streamer's own thread (render_latest) instead of holding up inference
+        if not self.is_streaming or frame_detections is None:
+            return
+        
+        with self.results_lock:
+            self.latest_detections[detection_type] = (frame_detections, time.time())
+            self.pending_results.append((detection_type, frame_detections))
+    
+    def render_latest(self, frame) -> Tuple:
+        """
+        Draw the most recent detections of each enabled model onto the frame.
+        Returns (annotated_frame, detections reported since the previous call).
+        """
+        now = time.time()
+        detection_types = self._get_detection_types() if self.camera.detection_enabled else []
+        
+        with self.results_lock:
+            current = {
+                detection_type: frame_detections
+                for detection_type, (frame_detections, received_at) in self.latest_detections.items()
+                if detection_type in detection_types and now - received_at <= self.stale_detection_age
+            }
+            pending, self.pending_results = self.pending_results, []
+        
+        detections = []
+        for detection_type, frame_detections in pending:
+            detections.extend(self._collect_detections(detection_type, frame_detections))
+        
+        return self.engine.render(frame, current), detections
+    
+    def _get_detection_types(self) -> List[str]:
+        detection_types = []
+        if self.camera.fire_smoke_detection:
+            detection_types.append('fire_smoke')
+        if self.camera.fall_detection:
+            detection_types.append('fall')
+        if self.camera.violence_detection:
+            detection_types.append('violence')
+        if self.camera.choking_detection:
+            detection_types.append('choking')
+        return detection_types
+    
+    def _collect_detections(self, detection_type: str, frame_detections) -> List[Dict]:
+        confidence = frame_detections.max_confidence(self.camera.confidence_threshold)
+        if confidence is None:
+            return []
+        
+        detection = {
+            'type': detection_type,
+            'confidence': confidence,
+            'timestamp': time.time(),
+            'camera_id': self.camera.id
+        }
+        self.detection_count += 1
+        
+        if confidence >= 0.8:
+            self._create_alert(detection_type, confidence)
+        
+        return [detection]
     
     def _create_alert(self, alert_type: str, confidence: float):
         try:
@@ -324,7 +372,7 @@ class BaseAIStreamer:
             ).first()
             
             if not recent_alert:
-                Alert.objects.create(
+                alert = Alert.objects.create(
                     title=f"{alert_type.replace('_', ' ').title()} detect",
                     description=f"AI detected {alert_type} with {confidence:.2f}.",
                     alert_type=alert_type,
@@ -335,23 +383,50 @@ class BaseAIStreamer:
                 )
                 logger.info(f"Alert: {alert_type} (Thresould: {confidence:.2f})")
                 
+                self.send_event('send_alert', 'alert', {
+                    'id': alert.id,
+                    'title': alert.title,
+                    'alert_type': alert.alert_type,
+                    'severity': alert.severity,
+                    'confidence': alert.confidence,
+                    'camera_id': self.camera.id,
+                    'detection_time': alert.detection_time.isoformat() if alert.detection_time else None
+                })
+                
         except Exception as e:
             logger.error(f"Alert error: {e}")
     
-    def send_frame_to_websocket(self, frame_data: str, metadata: Dict):
+    def send_event(self, handler: str, key: str, payload: Dict):
+        """Send an alert or error event to the viewers through the channel layer group"""
         try:
             async_to_sync(self.channel_layer.group_send)(
                 self.group_name,
-                {
-                    'type': 'send_frame',
-                    'frame': frame_data,
-                    'metadata': metadata
-                }
+                {'type': handler, key: payload}
             )
+        except Exception as e:
+            logger.error(f"Event send error: {e}")
+    
+    def encode_frame(self, frame) -> EncodedFrame:
+        """Encode an annotated frame once for the cache and every viewer"""
+        return EncodedFrame(frame, self.frame_count)
+    
+    def send_frame_to_websocket(self, encoded: EncodedFrame, metadata: Dict):
+        """
+        Publish the frame on the frame bus for the viewers as JPEG bytes for binary clients
+        and base64 text for JSON clients, each encoded once whatever the number of viewers.
+        Detections travel with the frame in its metadata, while the channel layer group
+        carries alerts and errors (send_event).
+        """
+        quality = settings.GSTREAMER_SETTINGS['JPEG_QUALITY']
+        try:
+            frame_bus.publish(self.group_name, metadata, {
+                'jpeg': encoded.jpeg(quality=quality),
+                'base64': encoded.base64(quality=quality)
+            })
         except Exception as e:
             logger.error(f"WebSocket transform error: {e}")
     
-    def cache_frame_to_redis(self, frame_data: str, metadata: Dict):
+    def cache_frame_to_redis(self, frame_data: bytes, metadata: Dict):
         try:
             self.redis_client.setex(
                 f"frame:{self.session_id}",
@@ -378,13 +453,15 @@ class BaseAIStreamer:
         self.metrics['frame_count'] = self.frame_count
         self.metrics['detection_count'] = self.detection_count
         self.metrics['uptime'] = uptime
+        self.metrics['sampling'] = self.sampler.get_stats()
         
         return self.metrics.copy()
 
 
 class GStreamerAIStreamer(BaseAIStreamer):
-    def __init__(self, camera, session_id: str, group_name: str, detectors: Dict):
-        super().__init__(camera, session_id, group_name, detectors)
+    def __init__(self, camera, session_id: str, group_name: str, detectors: Dict,
+                 scheduler: InferenceScheduler):
+        super().__init__(camera, session_id, group_name, detectors, scheduler)
         self.pipeline = None
         self.appsink = None
         self.loop = None
@@ -409,6 +486,7 @@ class GStreamerAIStreamer(BaseAIStreamer):
     def stop(self):
         try:
             self.is_streaming = False
+            self.scheduler.cancel(self.session_id)
             
             if self.pipeline:
                 self.pipeline.set_state(Gst.State.NULL)
@@ -421,15 +499,19 @@ class GStreamerAIStreamer(BaseAIStreamer):
     
     def _create_pipeline(self) -> bool:
         try:
+            # Scale before converting, so color conversion only runs at the working size,
+            # and hand frames over in BGR; the height follows the camera's aspect ratio
+            width = settings.GSTREAMER_SETTINGS['DEFAULT_WIDTH']
             if self.camera.stream_url.startswith('rtsp://'):
                 pipeline_str = f"""
                     rtspsrc location={self.camera.stream_url} latency=0 buffer-mode=0 !
                     rtph264depay !
                     h264parse !
                     avdec_h264 !
-                    videoconvert !
                     videoscale !
-                    video/x-raw,format=RGB,width=1280,height=720 !
+                    video/x-raw,width={width},pixel-aspect-ratio=1/1 !
+                    videoconvert !
+                    video/x-raw,format=BGR !
                     appsink name=sink emit-signals=true max-buffers=1 drop=true
                 """
             else:  # HTTP MJPEG
@@ -437,9 +519,10 @@ class GStreamerAIStreamer(BaseAIStreamer):
                     souphttpsrc location={self.camera.stream_url} !
                     multipartdemux !
                     jpegdec !
-                    videoconvert !
                     videoscale !
-                    video/x-raw,format=RGB,width=1280,height=720 !
+                    video/x-raw,width={width},pixel-aspect-ratio=1/1 !
+                    videoconvert !
+                    video/x-raw,format=BGR !
                     appsink name=sink emit-signals=true max-buffers=1 drop=true
                 """
             
@@ -460,6 +543,7 @@ class GStreamerAIStreamer(BaseAIStreamer):
             self.loop.run()
         except Exception as e:
             logger.error(f"Pipeline excecution error: {e}")
+            self.send_event('send_error', 'error', {'camera_id': self.camera.id, 'message': str(e)})
     
     def _on_new_sample(self, appsink):
         try:
@@ -473,72 +557,70 @@ class GStreamerAIStreamer(BaseAIStreamer):
                 
                 success, map_info = buffer.map(Gst.MapFlags.READ)
                 if success:
-                    frame_data = self._process_gstreamer_frame(map_info.data, caps)
-                    if frame_data:
+                    processed_frame, detections = self._process_gstreamer_frame(map_info.data, caps)
+                    buffer.unmap(map_info)
+                    
+                    if processed_frame is not None:
                         current_time = time.time()
                         self.frame_count += 1
+                        encoded = self.encode_frame(processed_frame)
                         
                         metadata = {
+                            'camera_id': self.camera.id,
                             'timestamp': current_time,
                             'frame_count': self.frame_count,
                             'detection_count': self.detection_count,
-                            'session_id': self.session_id
+                            'session_id': self.session_id,
+                            'detections': detections
                         }
                         
-                        self.cache_frame_to_redis(frame_data, metadata)
-                        self.send_frame_to_websocket(frame_data, metadata)
-                    
-                    buffer.unmap(map_info)
+                        self.cache_frame_to_redis(
+                            encoded.jpeg(quality=settings.GSTREAMER_SETTINGS['JPEG_QUALITY']), metadata
+                        )
+                        self.send_frame_to_websocket(encoded, metadata)
             
         except Exception as e:
             logger.error(f"Sample processing error: {e}")
         
         return Gst.FlowReturn.OK
     
-    def _process_gstreamer_frame(self, raw_data, caps) -> Optional[str]:
+    def _process_gstreamer_frame(self, raw_data, caps) -> Tuple[Optional[np.ndarray], List[Dict]]:
         try:
-            import numpy as np
-            import cv2
-            
             structure = caps.get_structure(0)
             width = structure.get_int('width')[1]
             height = structure.get_int('height')[1]
             
-            frame_array = np.frombuffer(raw_data, dtype=np.uint8)
-            frame = frame_array.reshape((height, width, 3))
+            # Rows are padded to 4 bytes; copy out of the GStreamer buffer so the frame outlives the sample
+            rows = np.frombuffer(raw_data, dtype=np.uint8).reshape((height, -1))
+            frame = VideoFrame(rows[:, :width * 3].reshape((height, width, 3)).copy())
             
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            
-            processed_frame, detections = self.process_detection(frame_bgr)
-            
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), settings.GSTREAMER_SETTINGS['JPEG_QUALITY']]
-            success, buffer = cv2.imencode('.jpg', processed_frame, encode_param)
-            
-            if success:
-                return base64.b64encode(buffer).decode('utf-8')
+            # Inference runs on the scheduler; this thread only draws the latest results
+            self.submit_detection(frame.image)
+            return self.render_latest(frame.image)
             
         except Exception as e:
             logger.error(f"Frame processing error: {e}")
         
-        return None
+        return None, []
 
 
 class OpenCVAIStreamer(BaseAIStreamer):
     
-    def __init__(self, camera, session_id: str, group_name: str, detectors: Dict):
-        super().__init__(camera, session_id, group_name, detectors)
+    def __init__(self, camera, session_id: str, group_name: str, detectors: Dict,
+                 scheduler: InferenceScheduler):
+        super().__init__(camera, session_id, group_name, detectors, scheduler)
         self.cap = None
         self.thread = None
     
     def start(self) -> bool:
         try:
-            self.cap = cv2.VideoCapture(self.camera.stream_url)
+            # Frames are decoded straight to the streaming width where the decoder allows
+            self.cap = open_stream(self.camera.stream_url, max_dim=settings.GSTREAMER_SETTINGS['DEFAULT_WIDTH'])
             
             if not self.cap.isOpened():
                 logger.error(f"Camera connection failed: {self.camera.stream_url}")
                 return False
             
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             self.cap.set(cv2.CAP_PROP_FPS, settings.GSTREAMER_SETTINGS['DEFAULT_FPS'])
             
             self.is_streaming = True
@@ -556,6 +638,7 @@ class OpenCVAIStreamer(BaseAIStreamer):
     def stop(self):
         try:
             self.is_streaming = False
+            self.scheduler.cancel(self.session_id)
             
             if self.cap:
                 self.cap.release()
@@ -568,8 +651,8 @@ class OpenCVAIStreamer(BaseAIStreamer):
         
         while self.is_streaming and self.cap.isOpened():
             try:
-                ret, frame = self.cap.read()
-                if not ret:
+                frame = self.cap.read_frame()
+                if frame is None:
                     logger.warning("Frame reading failed!")
                     continue
                 
@@ -580,22 +663,15 @@ class OpenCVAIStreamer(BaseAIStreamer):
                 self.last_frame_time = current_time
                 self.frame_count += 1
                 
-                height, width = frame.shape[:2]
-                if width > settings.GSTREAMER_SETTINGS['DEFAULT_WIDTH']:
-                    scale = settings.GSTREAMER_SETTINGS['DEFAULT_WIDTH'] / width
-                    new_width = int(width * scale)
-                    new_height = int(height * scale)
-                    frame = cv2.resize(frame, (new_width, new_height))
-                
-                processed_frame, detections = self.process_detection(frame)
+                # Inference runs on the scheduler; capture only draws the latest results
+                self.submit_detection(frame.image, current_time)
+                processed_frame, detections = self.render_latest(frame.image)
+                encoded = self.encode_frame(processed_frame)
+                frame_data = encoded.jpeg(quality=settings.GSTREAMER_SETTINGS['JPEG_QUALITY'])
                 
-                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), settings.GSTREAMER_SETTINGS['JPEG_QUALITY']]
-                success, buffer = cv2.imencode('.jpg', processed_frame, encode_param)
-                
-                if success:
-                    frame_data = base64.b64encode(buffer).decode('utf-8')
-                    
+                if frame_data:
                     metadata = {
+                        'camera_id': self.camera.id,
                         'timestamp': current_time,
                         'frame_count': self.frame_count,
                         'detection_count': self.detection_count,
@@ -605,7 +681,7 @@ class OpenCVAIStreamer(BaseAIStreamer):
                     
                     self.cache_frame_to_redis(frame_data, metadata)
                     
-                    self.send_frame_to_websocket(frame_data, metadata)
+                    self.send_frame_to_websocket(encoded, metadata)
                 
                 time.sleep(0.01)
                 
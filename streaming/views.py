@@ -1,5 +1,6 @@
 # streaming/views.py
 import json
+import base64
 import logging
 import time
 from rest_framework import viewsets, permissions, status
@@ -11,6 +12,7 @@ from django.views.decorators.http import require_http_methods
 from django.conf import settings
 
 from .stream_manager import stream_manager
+from detectors import model_registry
 from cameras.models import Camera
 from utils.permissions import IsOwnerOrAdmin
 
@@ -20,8 +22,9 @@ class StreamingViewSet(viewsets.GenericViewSet):
     
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def health(self, request):
+        # Open to load balancers; answers 503 until this worker's models are warm
         try:
             redis_status = 'healthy'
             try:
@@ -30,25 +33,32 @@ class StreamingViewSet(viewsets.GenericViewSet):
                 redis_status = f'unhealthy: {str(e)}'
             
             active_streams_count = len(stream_manager.active_streams)
+            models_status = model_registry.get_warmup_status()
             
             system_status = {
                 'redis': redis_status,
                 'active_streams': active_streams_count,
                 'max_concurrent_streams': settings.STREAMING_SETTINGS['MAX_CONCURRENT_STREAMS'],
-                'background_tasks': stream_manager.background_tasks_running
+                'background_tasks': stream_manager.background_tasks_running,
+                'models': models_status
             }
             
-            overall_status = 'healthy' if redis_status == 'healthy' else 'degraded'
+            if not models_status['ready']:
+                overall_status = 'warming_up' if models_status['status'] == 'warming' else 'unhealthy'
+            else:
+                overall_status = 'healthy' if redis_status == 'healthy' else 'degraded'
+            
+            # Anonymous probes only get the overall status; details can hold internal errors
+            data = {'status': overall_status}
+            if request.user.is_authenticated:
+                data['details'] = system_status
             
             return Response({
                 'success': True,
-                'data': {
-                    'status': overall_status,
-                    'details': system_status
-                },
+                'data': data,
                 'message': 'Streaming system health check completed.',
                 'errors': []
-            })
+            }, status=status.HTTP_200_OK if models_status['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE)
             
         except Exception as e:
             logger.error(f"Health check error: {e}")
@@ -56,7 +66,7 @@ class StreamingViewSet(viewsets.GenericViewSet):
                 'success': False,
                 'data': {},
                 'message': 'Health check failed.',
-                'errors': [str(e)]
+                'errors': [str(e)] if request.user.is_authenticated else []
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=False, methods=['get'])
@@ -180,6 +190,8 @@ class StreamingViewSet(viewsets.GenericViewSet):
                     'total_frames_processed': total_frames,
                     'total_detections': total_detections
                 },
+                'models': model_registry.get_metrics(),
+                'inference': stream_manager.scheduler.get_metrics(),
                 'individual_streams': stream_metrics
             }
             
@@ -393,14 +405,15 @@ def get_cached_frame(request):
                 'errors': ['session_id parameter is required']
             }, status=400)
         
-        frame_data = stream_manager.redis_client.get(f"frame:{session_id}")
+        frame_data = stream_manager.redis_binary.get(f"frame:{session_id}")
         metadata = stream_manager.redis_client.get(f"frame_meta:{session_id}")
         
         if frame_data and metadata:
             return JsonResponse({
                 'success': True,
                 'data': {
-                    'frame': frame_data,
+                    # Frames are cached as raw JPEG; base64 is only made for this JSON response
+                    'frame': base64.b64encode(frame_data).decode('utf-8'),
                     'metadata': json.loads(metadata)
                 },
                 'message': 'Cached frame retrieved successfully.',
@@ -0,0 +1,173 @@
+import time
+import logging
+from django.conf import settings
+
+logger = logging.getLogger('security_ai')
+
+# Frame rate, longest side (None = as decoded) and JPEG quality of each stream quality
+QUALITY_PRESETS = {
+    'low': {'fps': 10, 'max_width': 640, 'jpeg_quality': 60},
+    'medium': {'fps': 15, 'max_width': 960, 'jpeg_quality': 75},
+    'high': {'fps': 30, 'max_width': None, 'jpeg_quality': 85},
+}
+
+# Qualities from lowest to highest, the steps a slow viewer is moved along
+QUALITY_TIERS = ('low', 'medium', 'high')
+
+class AdaptiveQuality:
+    """
+    Adapts one viewer's stream to its connection.
+    The server pings the client every PING_INTERVAL seconds and the client echoes the id
+    in a pong. Pings queue behind the frames already sent to the client, so a round trip
+    above the fastest one seen is the time the client's backlog takes to drain. A backlog
+    over DEGRADE_DELAY steps the viewer down a quality tier (fewer, smaller frames), and
+    RECOVER_PINGS round trips in a row without one step it back up, never above the quality
+    the viewer asked for. While a ping stays unanswered for STALL_SECONDS the client is
+    stalled and frames are dropped instead of being buffered for it.
+    Clients that never answer a ping are not adapted.
+    """
+
+    def __init__(self, quality='high', pace_frames=True):
+        """
+        pace_frames spaces frames by the current tier's fps; leave it off when the producer
+        already sends each viewer frames at its quality's rate.
+        """
+        streaming = settings.STREAMING_SETTINGS
+        self.ping_interval = streaming['PING_INTERVAL']
+        self.degrade_delay = streaming['DEGRADE_DELAY']
+        self.recover_delay = streaming['RECOVER_DELAY']
+        self.recover_pings = streaming['RECOVER_PINGS']
+        self.stall_seconds = streaming['STALL_SECONDS']
+        self.pace_frames = pace_frames
+
+        self.requested = quality if quality in QUALITY_TIERS else 'high'
+        self.quality = self.requested
+        self.changed_at = 0.0
+        self.next_frame_due = 0.0
+
+        self.ping_id = 0
+        self.pending_ping = None  # (id, sent at)
+        self.pending_degraded = False
+        self.last_ping_time = 0.0
+        self.responsive = False
+        self.rtt = None
+        self.min_rtt = None
+        self.good_pings = 0
+
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    @property
+    def fps(self):
+        return QUALITY_PRESETS[self.quality]['fps']
+
+    def request(self, quality):
+        """The viewer chose a quality: start there and never adapt above it"""
+        if quality in QUALITY_TIERS:
+            self.requested = self.quality = quality
+            self.good_pings = 0
+
+    def next_ping(self, now=None):
+        """Return the ping message to send now, if one is due"""
+        now = now or time.time()
+        if self.pending_ping is not None:
+            # Clients that never answer get a fresh ping now and then
+            if self.responsive or now - self.pending_ping[1] < self.stall_seconds:
+                return None
+        elif now - self.last_ping_time < self.ping_interval:
+            return None
+
+        self.ping_id += 1
+        self.pending_ping = (self.ping_id, now)
+        self.pending_degraded = False
+        self.last_ping_time = now
+        return {'type': 'ping', 'id': self.ping_id, 'timestamp': now}
+
+    def on_pong(self, ping_id, now=None):
+        """Record a pong; returns the new quality when the viewer changes tier, else None"""
+        now = now or time.time()
+        if self.pending_ping is None or ping_id != self.pending_ping[0]:
+            return None
+
+        sent_at = self.pending_ping[1]
+        degraded = self.pending_degraded
+        self.pending_ping = None
+        self.responsive = True
+
+        sample = now - sent_at
+        self.rtt = sample if self.rtt is None else 0.75 * self.rtt + 0.25 * sample
+        self.min_rtt = sample if self.min_rtt is None else min(self.min_rtt, sample)
+        backlog = sample - self.min_rtt
+
+        # A ping sent before the last change measured the backlog of the old tier
+        if sent_at < self.changed_at or degraded:
+            return None
+
+        if backlog > self.degrade_delay:
+            return self._step(-1, now, f"backlog {backlog:.2f}s")
+
+        if backlog < self.recover_delay:
+            self.good_pings += 1
+            if self.good_pings >= self.recover_pings:
+                return self._step(1, now, f"{self.good_pings} pings without backlog")
+        else:
+            self.good_pings = 0
+        return None
+
+    def check_stall(self, now=None):
+        """
+        Step down once for a ping still unanswered after DEGRADE_DELAY, without waiting
+        for its pong. Returns the new quality when the viewer changes tier, else None.
+        """
+        now = now or time.time()
+        if not self.responsive or self.pending_ping is None or self.pending_degraded:
+            return None
+
+        age = now - self.pending_ping[1] - (self.min_rtt or 0.0)
+        if age <= self.degrade_delay:
+            return None
+
+        self.pending_degraded = True
+        return self._step(-1, now, f"ping unanswered for {age:.2f}s")
+
+    def allow_frame(self, now=None):
+        """Whether to send a frame now; frames for stalled clients or ahead of the tier's fps are dropped"""
+        now = now or time.time()
+        if self.responsive and self.pending_ping is not None and now - self.pending_ping[1] > self.stall_seconds:
+            self.frames_dropped += 1
+            return False
+
+        if self.pace_frames:
+            # Frames arrive with jitter; accept one up to a quarter interval early
+            interval = 1.0 / self.fps
+            if now < self.next_frame_due - interval / 4:
+                self.frames_dropped += 1
+                return False
+            next_due = self.next_frame_due + interval
+            self.next_frame_due = next_due if next_due > now else now + interval
+
+        self.frames_sent += 1
+        return True
+
+    def get_stats(self):
+        return {
+            'quality': self.quality,
+            'requested_quality': self.requested,
+            'fps': self.fps,
+            'rtt_ms': round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            'min_rtt_ms': round(self.min_rtt * 1000, 1) if self.min_rtt is not None else None,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+        }
+
+    def _step(self, direction, now, reason):
+        index = QUALITY_TIERS.index(self.quality) + direction
+        ceiling = QUALITY_TIERS.index(self.requested)
+        self.good_pings = 0
+        if index < 0 or index > ceiling:
+            return None
+
+        previous, self.quality = self.quality, QUALITY_TIERS[index]
+        self.changed_at = now
+        logger.info(f"Stream quality {previous} -> {self.quality} ({reason})")
+        return self.quality
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import base64
+import platform
+import subprocess
+import logging
+import numpy as np
+import cv2
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('security_ai')
+
+def latency_stats(samples_ms):
+    """Summarize latency samples in milliseconds"""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if samples.size == 0:
+        return {'count': 0}
+
+    return {
+        'count': int(samples.size),
+        'mean': round(float(samples.mean()), 3),
+        'min': round(float(samples.min()), 3),
+        'p50': round(float(np.percentile(samples, 50)), 3),
+        'p90': round(float(np.percentile(samples, 90)), 3),
+        'p95': round(float(np.percentile(samples, 95)), 3),
+        'p99': round(float(np.percentile(samples, 99)), 3),
+        'max': round(float(samples.max()), 3),
+    }
+
+
+def time_calls(func, iterations, warmup=0):
+    """Call func warmup + iterations times and return the latencies of the timed calls in ms"""
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+
+def synthetic_frames(count, width=1280, height=720, seed=0):
+    """
+    Deterministic BGR frames: a noisy textured background with a bright block moving
+    across it, so motion sampling and encoding see realistic change between frames.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(background, (7, 7), 0)
+    block = max(16, min(width, height) // 6)
+
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        x = int((width - block) * (index % 60) / 59) if count > 1 else 0
+        y = (height - block) // 2
+        cv2.rectangle(frame, (x, y), (x + block, y + block), (30, 120, 250), -1)
+        frames.append(frame)
+    return frames
+
+
+def write_synthetic_clip(path, frame_count=300, width=1280, height=720, fps=30, seed=0):
+    """Write a synthetic clip for the end-to-end benchmarks and return its path"""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    try:
+        for frame in synthetic_frames(frame_count, width, height, seed):
+            out.write(frame)
+    finally:
+        out.release()
+    return path
+
+
+def bench_predict_video_frame(detector, frames, conf_threshold, iou_threshold, image_size, iterations=100,
+                              warmup=3):
+    """Latency of BaseDetector.predict_video_frame, cycling through the given frames"""
+    detector.load_model()
+    for frame in frames[:warmup]:
+        detector.predict_video_frame(frame, conf_threshold, iou_threshold, image_size)
+
+    latencies = []
+    for index in range(iterations):
+        frame = frames[index % len(frames)]
+        start_time = time.perf_counter()
+        detector.predict_video_frame(frame, conf_threshold, iou_threshold, image_size)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    return {
+        'image_size': image_size,
+        'frame_size': [frames[0].shape[1], frames[0].shape[0]] if frames else None,
+        'latency_ms': latency_stats(latencies),
+        'fps': round(1000 / float(np.mean(latencies)), 2) if latencies else 0.0,
+    }
+
+
+def bench_process_video(processor, video_path, detector_key, config, output_mode=None, keep_outputs=False):
+    """
+    Frames per second of VideoProcessor.process_video end to end, including planning,
+    checkpoints and alert previews. The alert and job are deleted afterwards unless
+    keep_outputs is set.
+    """
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    start_time = time.perf_counter()
+    output_path, alert = processor.process_video(
+        video_path, detector_key, config['conf_threshold'], config['iou_threshold'],
+        config['image_size'], output_mode=output_mode
+    )
+    elapsed = time.perf_counter() - start_time
+
+    stats = processor.last_run_stats
+    result = {
+        'video': os.path.basename(video_path),
+        'output_mode': output_mode or settings.DETECTION_SETTINGS['VIDEO_OUTPUT_MODE'],
+        'image_size': config['image_size'],
+        'frames': frame_count,
+        'elapsed_seconds': round(elapsed, 3),
+        'fps': round(frame_count / elapsed, 2) if elapsed else 0.0,
+        'pipeline': stats.get('pipeline'),
+        'sampling': stats.get('sampling'),
+    }
+
+    if not keep_outputs:
+        _delete_alert(alert, output_path)
+    return result
+
+
+def encode_frame(frame, quality):
+    """Encode a frame the way the streamers cache and send it: raw JPEG bytes"""
+    success, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    return buffer.tobytes()
+
+
+def bench_jpeg_encode(frames, quality, iterations=100):
+    """Cost of encoding a frame for the streamers: JPEG encode plus base64 for JSON WebSocket clients"""
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    encode_ms, base64_ms, sizes = [], [], []
+
+    for index in range(iterations):
+        frame = frames[index % len(frames)]
+        start_time = time.perf_counter()
+        success, buffer = cv2.imencode('.jpg', frame, encode_param)
+        encoded_time = time.perf_counter()
+        base64.b64encode(buffer).decode('utf-8')
+        base64_ms.append((time.perf_counter() - encoded_time) * 1000)
+        encode_ms.append((encoded_time - start_time) * 1000)
+        sizes.append(len(buffer))
+
+    return {
+        'quality': quality,
+        'frame_size': [frames[0].shape[1], frames[0].shape[0]] if frames else None,
+        'encode_ms': latency_stats(encode_ms),
+        'base64_ms': latency_stats(base64_ms),
+        'mean_bytes': int(np.mean(sizes)) if sizes else 0,
+    }
+
+
+def bench_redis_frame_cache(redis_client, frame_data, metadata, iterations=200):
+    """
+    Round trips of the streamers' Redis frame cache: writing a frame and its metadata
+    the way cache_frame_to_redis does, then reading both back like the frame API.
+    """
+    session_id = f"benchmark_{os.getpid()}"
+    ttl = settings.STREAMING_SETTINGS['FRAME_CACHE_TTL']
+    metadata_json = json.dumps(metadata)
+
+    def write():
+        redis_client.setex(f"frame:{session_id}", ttl, frame_data)
+        redis_client.setex(f"frame_meta:{session_id}", ttl, metadata_json)
+
+    def read():
+        redis_client.get(f"frame:{session_id}")
+        redis_client.get(f"frame_meta:{session_id}")
+
+    try:
+        write_ms = time_calls(write, iterations, warmup=5)
+        read_ms = time_calls(read, iterations, warmup=5)
+    finally:
+        redis_client.delete(f"frame:{session_id}", f"frame_meta:{session_id}")
+
+    return {
+        'payload_bytes': len(frame_data),
+        'write_ms': latency_stats(write_ms),
+        'read_ms': latency_stats(read_ms),
+    }
+
+
+def environment_info():
+    """Hardware and software the results were measured on, and the commit measured"""
+    info = {
+        'timestamp': timezone.now().isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'inference_backend': settings.DETECTION_SETTINGS.get('INFERENCE_BACKEND'),
+    }
+
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['cuda'] = torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+    except ImportError:
+        pass
+
+    return info
+
+
+def compare_results(previous, current, path=''):
+    """
+    Compare two result trees and return (metric path, previous, current, % change) for
+    every latency mean/p95 and fps present in both.
+    """
+    if isinstance(current, list) and isinstance(previous, list):
+        # Lists hold one result per image size, clip or quality, in a fixed order
+        current = {str(index): value for index, value in enumerate(current)}
+        previous = {str(index): value for index, value in enumerate(previous)}
+    if not isinstance(current, dict) or not isinstance(previous, dict):
+        return []
+
+    changes = []
+    for key, value in current.items():
+        if key not in previous:
+            continue
+
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, (dict, list)):
+            changes.extend(compare_results(previous[key], value, name))
+        elif key in ('mean', 'p95', 'fps') and isinstance(value, (int, float)) and previous[key]:
+            changes.append((name, previous[key], value, round((value - previous[key]) / previous[key] * 100, 1)))
+    return changes
+
+
+def _delete_alert(alert, output_path):
+    for field in (alert.video_file, alert.thumbnail, alert.contact_sheet, alert.preview, alert.detections_file):
+        if field:
+            field.delete(save=False)
+    if output_path and os.path.exists(output_path):
+        os.remove(output_path)
+
+    alert.video_jobs.all().delete()
+    alert.delete()
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
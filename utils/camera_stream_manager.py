@@ -1,7 +1,6 @@
 # utils/camera_stream_manager.py
 
 import os
-import cv2
 import json
 import redis
 import asyncio
@@ -15,7 +14,6 @@ from dataclasses import dataclass, asdict
 from django.conf import settings
 from django.core.cache import cache
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 import gi
 
 # GStreamer initialization
@@ -23,6 +21,11 @@ gi.require_version('Gst', '1.0')
 gi.require_version('GstApp', '1.0')
 from gi.repository import Gst, GstApp, GLib
 
+from utils.adaptive_quality import QUALITY_PRESETS
+from utils.frame_bus import frame_bus
+from utils.frame_encoder import EncodedFrame, rendition_name
+from utils.frame_protocol import PROTOCOLS, pack_frame
+
 # Initialize GStreamer
 Gst.init(None)
 
@@ -54,6 +57,16 @@ class StreamMetadata:
     total_frames: int = 0
     dropped_frames: int = 0
 
+@dataclass
+class StreamSubscriber:
+    """A session receiving frames from a camera's capture hub"""
+    session_id: str
+    quality: str
+    fps: int
+    protocol: str = 'json'  # json or binary, see utils.frame_protocol
+    next_due: float = 0.0
+    frames_sent: int = 0
+
 class RedisStreamManager:
     """Redis-based stream management with advanced features"""
     
@@ -160,65 +173,76 @@ class RedisStreamManager:
         session_key = f"stream:session:{session_id}"
         self.redis_client.delete(session_key)
         
-        # Clean up frame cache
-        self.cleanup_frame_cache(session.camera_id, session_id)
-        
         return True
     
-    def cache_frame(self, camera_id: str, session_id: str, frame: np.ndarray, frame_number: int):
-        """Cache frame in Redis with compression"""
+    def update_session_quality(self, session_id: str, quality: str):
+        """Record a session's new quality and frame rate"""
+        session_key = f"stream:session:{session_id}"
+        self.redis_client.hset(session_key, mapping={
+            'quality': quality,
+            'fps': self._get_fps_for_quality(quality)
+        })
+    
+    def cache_frame(self, camera_id: str, encoded: EncodedFrame):
+        """
+        Cache the JPEG renditions encoded for a camera frame in Redis, as they are.
+        All sessions of the camera share them.
+        """
         try:
-            # Encode frame as JPEG for compression
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 85]
-            _, buffer = cv2.imencode('.jpg', frame, encode_param)
+            renditions = encoded.renditions()
+            if not renditions:
+                return
             
             # Store in Redis
-            frame_key = f"stream:frame:{camera_id}:{session_id}:{frame_number}"
-            self.redis_binary.setex(frame_key, self.frame_cache_ttl, buffer.tobytes())
-            
-            # Update latest frame pointer
-            latest_key = f"stream:latest:{camera_id}:{session_id}"
-            self.redis_client.setex(latest_key, self.frame_cache_ttl, frame_number)
+            pipe = self.redis_binary.pipeline(transaction=False)
+            for name, data in renditions.items():
+                frame_key = f"stream:frame:{camera_id}:{encoded.frame_number}:{name}"
+                pipe.setex(frame_key, self.frame_cache_ttl, data)
+            pipe.execute()
+            
+            # Update latest frame pointers, one per rendition
+            latest_key = f"stream:latest:{camera_id}"
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(latest_key, mapping={name: encoded.frame_number for name in renditions})
+            pipe.expire(latest_key, self.frame_cache_ttl)
+            pipe.execute()
             
         except Exception as e:
             logger.error(f"Error caching frame: {str(e)}")
     
-    def get_cached_frame(self, camera_id: str, session_id: str, frame_number: int = None) -> Optional[np.ndarray]:
-        """Get cached frame from Redis"""
+    def get_cached_jpeg(self, camera_id: str, rendition: str = None, frame_number: int = None) -> Optional[bytes]:
+        """
+        Get the JPEG bytes of a cached frame without decoding them. Without a rendition,
+        or when it is not cached, the highest-quality rendition cached is returned.
+        """
         try:
-            if frame_number is None:
-                # Get latest frame
-                latest_key = f"stream:latest:{camera_id}:{session_id}"
-                frame_number = self.redis_client.get(latest_key)
-                if not frame_number:
-                    return None
-                frame_number = int(frame_number)
+            latest = self.redis_client.hgetall(f"stream:latest:{camera_id}")
+            if not latest:
+                return None
             
-            frame_key = f"stream:frame:{camera_id}:{session_id}:{frame_number}"
-            buffer = self.redis_binary.get(frame_key)
+            if rendition not in latest:
+                rendition = max(latest, key=lambda name: int(name.rsplit('_q', 1)[1]))
             
-            if not buffer:
-                return None
-                
-            # Decode frame
-            nparr = np.frombuffer(buffer, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            if frame_number is None:
+                # Get latest frame
+                frame_number = int(latest[rendition])
             
-            return frame
+            frame_key = f"stream:frame:{camera_id}:{frame_number}:{rendition}"
+            return self.redis_binary.get(frame_key)
             
         except Exception as e:
             logger.error(f"Error getting cached frame: {str(e)}")
             return None
     
-    def cleanup_frame_cache(self, camera_id: str, session_id: str):
-        """Clean up frame cache for a session"""
-        pattern = f"stream:frame:{camera_id}:{session_id}:*"
+    def cleanup_frame_cache(self, camera_id: str):
+        """Clean up the frame cache of a camera"""
+        pattern = f"stream:frame:{camera_id}:*"
         keys = self.redis_binary.keys(pattern)
         if keys:
             self.redis_binary.delete(*keys)
         
         # Clean up latest frame pointer
-        latest_key = f"stream:latest:{camera_id}:{session_id}"
+        latest_key = f"stream:latest:{camera_id}"
         self.redis_client.delete(latest_key)
     
     def store_metadata(self, camera_id: str, metadata: StreamMetadata):
@@ -269,19 +293,14 @@ class RedisStreamManager:
     
     def _get_fps_for_quality(self, quality: str) -> int:
         """Get FPS based on quality setting"""
-        fps_map = {
-            'low': 10,
-            'medium': 15,
-            'high': 30
-        }
-        return fps_map.get(quality, 15)
+        return QUALITY_PRESETS.get(quality, QUALITY_PRESETS['medium'])['fps']
 
 class GStreamerPipeline:
     """GStreamer pipeline for hardware-accelerated video processing"""
     
-    def __init__(self, camera_url: str, session: StreamSession):
+    def __init__(self, camera_url: str, fps: int):
         self.camera_url = camera_url
-        self.session = session
+        self.fps = fps
         self.pipeline = None
         self.appsink = None
         self.is_running = False
@@ -332,7 +351,7 @@ class GStreamerPipeline:
                     "nvdec ! nvvidconv ! "
                     "video/x-raw,format=BGRx ! "
                     "videorate ! videoconvert ! "
-                    f"video/x-raw,framerate={self.session.fps}/1 ! "
+                    f"video/x-raw,framerate={self.fps}/1 ! "
                     "appsink name=sink emit-signals=true sync=false max-buffers=2 drop=true"
                 )
             else:
@@ -341,7 +360,7 @@ class GStreamerPipeline:
                     f"{source} ! "
                     "decodebin ! videoconvert ! "
                     "videorate ! "
-                    f"video/x-raw,framerate={self.session.fps}/1 ! "
+                    f"video/x-raw,framerate={self.fps}/1 ! "
                     "appsink name=sink emit-signals=true sync=false max-buffers=2 drop=true"
                 )
             
@@ -440,13 +459,179 @@ class GStreamerPipeline:
             logger.error(f"Error processing frame: {str(e)}")
             return Gst.FlowReturn.ERROR
 
+class CameraCaptureHub:
+    """
+    One capture pipeline per camera, shared by every session viewing it.
+    Frames are decoded once, at the highest preset frame rate, and each session receives
+    them at its own quality and fps. A frame is resized and encoded once per rendition
+    among the sessions due for it (see EncodedFrame), so more viewers of a camera add
+    sends, not decodes or encodes.
+    Frames are published on the frame bus as one message per frame, holding each payload
+    once and which of them every due session receives.
+    """
+    
+    def __init__(self, camera_id: str, camera_url: str, redis_manager: RedisStreamManager):
+        self.camera_id = camera_id
+        self.camera_url = camera_url
+        self.redis_manager = redis_manager
+        self.stream_key = f"camera_{camera_id}"
+        self.fps = max(preset['fps'] for preset in QUALITY_PRESETS.values())
+        
+        self.pipeline = GStreamerPipeline(camera_url, self.fps)
+        self.pipeline.set_frame_callback(self._handle_new_frame)
+        
+        self.subscribers: Dict[str, StreamSubscriber] = {}
+        self.lock = threading.Lock()
+        self.frame_number = 0
+        self.started_at = time.time()
+        self.last_metadata_time = 0.0
+    
+    def start(self) -> bool:
+        return self.pipeline.start()
+    
+    def stop(self):
+        self.pipeline.stop()
+        self.redis_manager.cleanup_frame_cache(self.camera_id)
+        frame_bus.discard(self.stream_key)
+    
+    def subscribe(self, session: StreamSession, protocol: str = 'json') -> int:
+        """Add a session; returns the number of subscribed sessions"""
+        with self.lock:
+            self.subscribers[session.session_id] = StreamSubscriber(
+                session_id=session.session_id,
+                quality=session.quality,
+                fps=session.fps,
+                protocol=protocol
+            )
+            return len(self.subscribers)
+    
+    def unsubscribe(self, session_id: str) -> int:
+        """Remove a session; returns the number of sessions still subscribed"""
+        with self.lock:
+            self.subscribers.pop(session_id, None)
+            return len(self.subscribers)
+    
+    def set_quality(self, session_id: str, quality: str) -> bool:
+        with self.lock:
+            subscriber = self.subscribers.get(session_id)
+            if subscriber is None:
+                return False
+            subscriber.quality = quality
+            subscriber.fps = QUALITY_PRESETS[quality]['fps']
+            return True
+    
+    def set_protocol(self, session_id: str, protocol: str) -> bool:
+        with self.lock:
+            subscriber = self.subscribers.get(session_id)
+            if subscriber is None:
+                return False
+            subscriber.protocol = protocol
+            return True
+    
+    def _due_subscribers(self, now: float) -> List[StreamSubscriber]:
+        """Sessions whose next frame is due, spacing each session's frames by its fps"""
+        # Frames arrive with jitter; accept one up to half a source frame early
+        tolerance = 0.5 / self.fps
+        due = []
+        
+        with self.lock:
+            for subscriber in self.subscribers.values():
+                if now < subscriber.next_due - tolerance:
+                    continue
+                
+                interval = 1.0 / subscriber.fps
+                next_due = subscriber.next_due + interval
+                # Restart the schedule after a stall instead of sending a burst
+                subscriber.next_due = next_due if next_due > now else now + interval
+                subscriber.frames_sent += 1
+                due.append(subscriber)
+        
+        return due
+    
+    def _handle_new_frame(self, frame: np.ndarray):
+        """Handle new frame from pipeline"""
+        try:
+            self.frame_number += 1
+            now = time.time()
+            
+            due = self._due_subscribers(now)
+            if not due:
+                return
+            
+            # Each rendition is encoded once, however many sessions receive it, and
+            # wrapped once per protocol: base64 for JSON clients, a binary header for the rest
+            encoded = EncodedFrame(frame, self.frame_number, now)
+            payloads = {}
+            sessions = {}
+            for subscriber in due:
+                name = f"{subscriber.protocol}:{subscriber.quality}"
+                if name not in payloads:
+                    preset = QUALITY_PRESETS[subscriber.quality]
+                    if subscriber.protocol == 'binary':
+                        jpeg = encoded.jpeg(preset['max_width'], preset['jpeg_quality'])
+                        payloads[name] = pack_frame(self.camera_id, self.frame_number, now, 0, jpeg)
+                    else:
+                        payloads[name] = encoded.base64(preset['max_width'], preset['jpeg_quality'])
+                sessions[subscriber.session_id] = name
+            # The GStreamer buffer is only valid during this callback
+            encoded.release()
+            
+            # The renditions just encoded are cached as-is for the frame endpoint
+            self.redis_manager.cache_frame(self.camera_id, encoded)
+            
+            frame_bus.publish(self.stream_key, {
+                'camera_id': self.camera_id,
+                'frame_number': self.frame_number,
+                'timestamp': now,
+                'sessions': sessions
+            }, payloads)
+            
+            # Metadata describes the camera, so it is refreshed once a second, not per session or frame
+            if now - self.last_metadata_time >= 1.0:
+                self.last_metadata_time = now
+                elapsed = now - self.started_at
+                metadata = StreamMetadata(
+                    camera_id=self.camera_id,
+                    width=frame.shape[1],
+                    height=frame.shape[0],
+                    fps=int(round(self.frame_number / elapsed)) if elapsed > 0 else self.fps,
+                    codec='h264',
+                    bitrate=0,  # This should be calculated
+                    last_frame_time=datetime.now(),
+                    total_frames=self.frame_number
+                )
+                self.redis_manager.store_metadata(self.camera_id, metadata)
+                
+                for subscriber in due:
+                    self.redis_manager.update_session_activity(subscriber.session_id)
+            
+        except Exception as e:
+            logger.error(f"Error handling new frame: {str(e)}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'decoded_frames': self.frame_number,
+                'subscribers': [
+                    {
+                        'session_id': subscriber.session_id,
+                        'quality': subscriber.quality,
+                        'fps': subscriber.fps,
+                        'protocol': subscriber.protocol,
+                        'frames_sent': subscriber.frames_sent
+                    }
+                    for subscriber in self.subscribers.values()
+                ]
+            }
+
 class CameraStreamManager:
     """Main camera streaming manager with Redis and GStreamer"""
     
     def __init__(self):
         self.redis_manager = RedisStreamManager()
-        self.active_pipelines: Dict[str, GStreamerPipeline] = {}
-        self.frame_counters: Dict[str, int] = {}
+        # One capture hub per camera, shared by all of its sessions
+        self.hubs: Dict[str, CameraCaptureHub] = {}
+        self.hubs_lock = threading.Lock()
         self.channel_layer = get_channel_layer()
         
         # Start cleanup thread
@@ -454,36 +639,39 @@ class CameraStreamManager:
         self.cleanup_thread.start()
         
     def start_stream(self, camera_id: str, user_id: str, session_id: str, 
-                    camera_url: str, quality: str = 'medium') -> bool:
-        """Start streaming for a camera"""
+                    camera_url: str, quality: str = 'medium', protocol: str = 'json') -> bool:
+        """
+        Start streaming a camera to a session. The session subscribes to the camera's
+        capture hub, which is started for the first session of the camera.
+        Frames are published on the frame bus under camera_<camera_id>, as JSON or binary
+        messages depending on protocol.
+        """
         try:
+            if quality not in QUALITY_PRESETS:
+                quality = 'medium'
+            
             # Create session
             session = self.redis_manager.create_session(camera_id, user_id, session_id, quality)
             
-            # Check if pipeline already exists for this camera
-            pipeline_key = f"{camera_id}_{session_id}"
-            
-            if pipeline_key not in self.active_pipelines:
-                # Create new pipeline
-                pipeline = GStreamerPipeline(camera_url, session)
-                
-                # Set frame callback
-                pipeline.set_frame_callback(
-                    lambda frame: self._handle_new_frame(camera_id, session_id, frame)
-                )
-                
-                # Start pipeline
-                if not pipeline.start():
-                    return False
-                
-                self.active_pipelines[pipeline_key] = pipeline
-                self.frame_counters[pipeline_key] = 0
+            with self.hubs_lock:
+                hub = self.hubs.get(camera_id)
+                if hub is None:
+                    hub = CameraCaptureHub(camera_id, camera_url, self.redis_manager)
+                    
+                    # Start pipeline
+                    if not hub.start():
+                        self.redis_manager.end_session(session_id)
+                        return False
+                    
+                    self.hubs[camera_id] = hub
+                    logger.info(f"Started capture for camera {camera_id}")
                 
-                logger.info(f"Started stream for camera {camera_id}, session {session_id}")
+                viewers = hub.subscribe(session, protocol if protocol in PROTOCOLS else 'json')
             
             # Increment client count
             self.redis_manager.increment_client_count(session_id)
             
+            logger.info(f"Started stream for camera {camera_id}, session {session_id} ({viewers} viewers)")
             return True
             
         except Exception as e:
@@ -491,21 +679,19 @@ class CameraStreamManager:
             return False
     
     def stop_stream(self, camera_id: str, session_id: str) -> bool:
-        """Stop streaming for a camera session"""
+        """Stop streaming for a camera session; the capture stops with the camera's last session"""
         try:
-            pipeline_key = f"{camera_id}_{session_id}"
-            
             # Decrement client count
             client_count = self.redis_manager.decrement_client_count(session_id)
             
-            # If no more clients, stop pipeline
+            # If no more clients, leave the hub
             if client_count <= 0:
-                if pipeline_key in self.active_pipelines:
-                    self.active_pipelines[pipeline_key].stop()
-                    del self.active_pipelines[pipeline_key]
-                    
-                if pipeline_key in self.frame_counters:
-                    del self.frame_counters[pipeline_key]
+                with self.hubs_lock:
+                    hub = self.hubs.get(camera_id)
+                    if hub is not None and hub.unsubscribe(session_id) == 0:
+                        hub.stop()
+                        del self.hubs[camera_id]
+                        logger.info(f"Stopped capture for camera {camera_id}")
                 
                 # End session
                 self.redis_manager.end_session(session_id)
@@ -518,75 +704,43 @@ class CameraStreamManager:
             logger.error(f"Error stopping stream: {str(e)}")
             return False
     
+    def change_quality(self, camera_id: str, session_id: str, quality: str) -> bool:
+        """Switch a session to another quality without touching the shared capture"""
+        if quality not in QUALITY_PRESETS:
+            return False
+        
+        hub = self.hubs.get(camera_id)
+        if hub is None or not hub.set_quality(session_id, quality):
+            return False
+        
+        self.redis_manager.update_session_quality(session_id, quality)
+        return True
+    
+    def set_protocol(self, camera_id: str, session_id: str, protocol: str) -> bool:
+        """Switch the frame protocol of a running session"""
+        if protocol not in PROTOCOLS:
+            return False
+        
+        hub = self.hubs.get(camera_id)
+        return hub is not None and hub.set_protocol(session_id, protocol)
+    
     def get_stream_frame(self, camera_id: str, session_id: str) -> Optional[bytes]:
-        """Get latest frame as JPEG bytes"""
+        """Get latest frame as JPEG bytes, in the session's rendition when it is cached"""
         try:
-            frame = self.redis_manager.get_cached_frame(camera_id, session_id)
-            if frame is None:
-                return None
-            
-            # Encode as JPEG
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 85]
-            _, buffer = cv2.imencode('.jpg', frame, encode_param)
+            rendition = None
+            session = self.redis_manager.get_session(session_id)
+            metadata = self.redis_manager.get_metadata(camera_id)
+            if session and metadata:
+                preset = QUALITY_PRESETS.get(session.quality, QUALITY_PRESETS['medium'])
+                rendition = rendition_name(metadata.width, preset['max_width'], preset['jpeg_quality'])
             
-            return buffer.tobytes()
+            # Served as cached, without decoding and re-encoding
+            return self.redis_manager.get_cached_jpeg(camera_id, rendition)
             
         except Exception as e:
             logger.error(f"Error getting stream frame: {str(e)}")
             return None
     
-    def _handle_new_frame(self, camera_id: str, session_id: str, frame: np.ndarray):
-        """Handle new frame from pipeline"""
-        try:
-            pipeline_key = f"{camera_id}_{session_id}"
-            
-            # Increment frame counter
-            self.frame_counters[pipeline_key] = self.frame_counters.get(pipeline_key, 0) + 1
-            frame_number = self.frame_counters[pipeline_key]
-            
-            # Cache frame
-            self.redis_manager.cache_frame(camera_id, session_id, frame, frame_number)
-            
-            # Update session activity
-            self.redis_manager.update_session_activity(session_id)
-            
-            # Send frame via WebSocket
-            if self.channel_layer:
-                group_name = f"camera_{camera_id}"
-                
-                # Encode frame as base64 for WebSocket transmission
-                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
-                _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                frame_b64 = buffer.tobytes()
-                
-                async_to_sync(self.channel_layer.group_send)(
-                    group_name,
-                    {
-                        'type': 'stream_frame',
-                        'camera_id': camera_id,
-                        'session_id': session_id,
-                        'frame': frame_b64,
-                        'frame_number': frame_number,
-                        'timestamp': time.time()
-                    }
-                )
-            
-            # Update metadata
-            metadata = StreamMetadata(
-                camera_id=camera_id,
-                width=frame.shape[1],
-                height=frame.shape[0],
-                fps=15,  # This should be calculated
-                codec='h264',
-                bitrate=0,  # This should be calculated
-                last_frame_time=datetime.now(),
-                total_frames=frame_number
-            )
-            self.redis_manager.store_metadata(camera_id, metadata)
-            
-        except Exception as e:
-            logger.error(f"Error handling new frame: {str(e)}")
-    
     def _cleanup_worker(self):
         """Background worker for cleanup tasks"""
         while True:
@@ -607,11 +761,14 @@ class CameraStreamManager:
             sessions = self.redis_manager.get_camera_sessions(camera_id)
             metadata = self.redis_manager.get_metadata(camera_id)
             
+            hub = self.hubs.get(camera_id)
+            
             stats = {
                 'camera_id': camera_id,
                 'active_sessions': len(sessions),
                 'sessions': sessions,
-                'metadata': asdict(metadata) if metadata else None
+                'metadata': asdict(metadata) if metadata else None,
+                'capture': hub.get_stats() if hub else None
             }
             
             return stats
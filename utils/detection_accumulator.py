@@ -0,0 +1,121 @@
+import time
+import logging
+from django.conf import settings
+
+from alerts.models import Alert
+
+logger = logging.getLogger('security_ai')
+
+class DetectionAccumulator:
+    """
+    Running statistics of the detections found while processing a video or stream.
+    Keeps the count, max and mean confidence, a confidence histogram and the best frame
+    in memory, and writes the alert's confidence and severity to the database only every
+    flush_interval seconds or flush_frames detections, and once more at the end.
+    Writes are plain UPDATE queries, so they do not run the alert save signals.
+    """
+
+    def __init__(self, alert=None, flush_interval=None, flush_frames=None, bins=10):
+        """
+        Initialize the accumulator.
+        Without an alert nothing is written, e.g. for segments merged into a parent later.
+        """
+        self.alert = alert
+        self.flush_interval = (
+            settings.DETECTION_SETTINGS['ALERT_FLUSH_INTERVAL'] if flush_interval is None else flush_interval
+        )
+        self.flush_frames = (
+            settings.DETECTION_SETTINGS['ALERT_FLUSH_FRAMES'] if flush_frames is None else flush_frames
+        )
+
+        self.count = 0
+        self.total = 0.0
+        self.max_confidence = 0.0
+        self.best_frame = None
+        self.histogram = [0] * bins
+
+        self.flushes = 0
+        self.pending = 0
+        self.last_flush = time.time()
+        self.flushed_confidence = alert.confidence if alert is not None else 0.0
+
+    def __getstate__(self):
+        # Segment accumulators are sent back from worker processes without their alert
+        state = self.__dict__.copy()
+        state['alert'] = None
+        return state
+
+    @staticmethod
+    def severity_for(confidence):
+        """Map a detection confidence to an alert severity"""
+        if confidence >= 0.9:
+            return 'critical'
+        elif confidence >= 0.7:
+            return 'high'
+        elif confidence >= 0.5:
+            return 'medium'
+        return 'low'
+
+    @property
+    def mean_confidence(self):
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def severity(self):
+        return self.severity_for(self.max_confidence)
+
+    def add(self, frame_number, confidence):
+        """Record a frame with a detection and flush if an interval has passed"""
+        self.count += 1
+        self.total += confidence
+        self.histogram[min(int(confidence * len(self.histogram)), len(self.histogram) - 1)] += 1
+
+        if self.best_frame is None or confidence > self.max_confidence:
+            self.max_confidence = confidence
+            self.best_frame = frame_number
+
+        self.pending += 1
+        if self.pending >= self.flush_frames or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def merge(self, other):
+        """Add the statistics of another accumulator, e.g. one from a segment of the same video"""
+        self.count += other.count
+        self.total += other.total
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+
+        if other.best_frame is not None and (self.best_frame is None or other.max_confidence > self.max_confidence):
+            self.max_confidence = other.max_confidence
+            self.best_frame = other.best_frame
+
+        self.pending += other.count
+
+    def flush(self):
+        """Write the alert confidence and severity if the max confidence has risen since the last write"""
+        self.pending = 0
+        self.last_flush = time.time()
+
+        if self.alert is None or self.max_confidence <= self.flushed_confidence:
+            return
+
+        self.alert.confidence = self.max_confidence
+        self.alert.severity = self.severity
+        try:
+            Alert.objects.filter(pk=self.alert.pk).update(
+                confidence=self.alert.confidence, severity=self.alert.severity
+            )
+            self.flushed_confidence = self.max_confidence
+            self.flushes += 1
+        except Exception as e:
+            logger.error(f"Error updating confidence of alert {self.alert.pk}: {str(e)}")
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'max_confidence': round(self.max_confidence, 4),
+            'mean_confidence': round(self.mean_confidence, 4),
+            'severity': self.severity,
+            'best_frame': self.best_frame,
+            'histogram': self.histogram,
+            'flushes': self.flushes,
+        }
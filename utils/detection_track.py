@@ -0,0 +1,93 @@
+import gzip
+import json
+import numpy as np
+
+from detectors.detections import Detections
+
+class DetectionTrack:
+    """
+    Per-frame detections of a processed video, stored as a gzipped JSON sidecar file.
+    Only frames with at least one box are kept; overlays are drawn from the track by the
+    client or on demand instead of being burned into a re-encoded copy of the video.
+    """
+
+    VERSION = 1
+
+    def __init__(self, detector_key, fps, width, height, frame_count=0, names=None):
+        self.detector_key = detector_key
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.frame_count = frame_count
+        self.names = names or {}
+        self.frames = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, frame_number, detections):
+        """Record the detections of a frame; empty and failed frames are skipped"""
+        if detections is None or len(detections) == 0:
+            return
+
+        self.names = self.names or detections.names
+        self.frames[frame_number] = detections
+
+    def get(self, frame_number):
+        """Return the detections of a frame, or None if nothing was detected in it"""
+        return self.frames.get(frame_number)
+
+    def merge(self, other):
+        """Add the frames of another track, e.g. one produced for a segment of the same video"""
+        self.names = self.names or other.names
+        self.frames.update(other.frames)
+
+    def to_dict(self):
+        """Serialize the track into plain lists, keyed by frame number"""
+        return {
+            'version': self.VERSION,
+            'detector': self.detector_key,
+            'fps': self.fps,
+            'width': self.width,
+            'height': self.height,
+            'frame_count': self.frame_count,
+            'names': {str(k): v for k, v in self.names.items()},
+            'frames': {
+                str(frame_number): {
+                    'boxes': np.round(detections.xyxy, 1).tolist(),
+                    'confidences': np.round(detections.conf, 4).tolist(),
+                    'classes': detections.cls.tolist(),
+                }
+                for frame_number, detections in sorted(self.frames.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a track serialized with to_dict"""
+        names = {int(k): v for k, v in data.get('names', {}).items()}
+        track = cls(
+            data['detector'], data['fps'], data['width'], data['height'],
+            frame_count=data.get('frame_count', 0), names=names
+        )
+
+        for frame_number, frame in data.get('frames', {}).items():
+            track.frames[int(frame_number)] = Detections(
+                xyxy=np.array(frame['boxes'], dtype=np.float32).reshape(-1, 4),
+                conf=np.array(frame['confidences'], dtype=np.float32),
+                cls=np.array(frame['classes'], dtype=np.int32),
+                names=names
+            )
+
+        return track
+
+    def save(self, path):
+        """Write the track as gzipped JSON"""
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Read a track written by save"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
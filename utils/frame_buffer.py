@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+import logging
+from PIL import Image
+
+from detectors import render_detections
+
+logger = logging.getLogger('security_ai')
+
+class TopFrameBuffer:
+    """
+    Keeps the highest-confidence frames seen while processing a video, so thumbnails and
+    previews can be made without decoding the file a second time.
+    At most size frames are held, downscaled to max_dim. Frames closer than min_gap to a
+    kept frame replace it only if they score higher, so the kept frames spread out over
+    the video instead of all coming from the same few seconds.
+    """
+
+    def __init__(self, size=9, max_dim=640, min_gap=0):
+        self.size = max(1, size)
+        self.max_dim = max_dim
+        self.min_gap = min_gap
+        # (confidence, frame_number, frame, detections), unordered
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getstate__(self):
+        # Frames are JPEG-compressed when the buffer is sent between processes or checkpointed
+        state = self.__dict__.copy()
+        state['entries'] = [
+            (confidence, frame_number, cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes(), detections)
+            for confidence, frame_number, frame, detections in self.entries
+        ]
+        return state
+
+    def __setstate__(self, state):
+        state['entries'] = [
+            (confidence, frame_number, cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR), detections)
+            for confidence, frame_number, data, detections in state['entries']
+        ]
+        self.__dict__.update(state)
+
+    def add(self, frame_number, frame, confidence, detections=None):
+        """Offer a frame; it is copied only if it makes it into the buffer"""
+        nearby = [
+            entry for entry in self.entries
+            if abs(entry[1] - frame_number) < self.min_gap
+        ]
+        if nearby:
+            best_nearby = max(nearby, key=lambda entry: entry[0])
+            if confidence <= best_nearby[0]:
+                return False
+            for entry in nearby:
+                self.entries.remove(entry)
+        elif len(self.entries) >= self.size:
+            worst = min(self.entries, key=lambda entry: entry[0])
+            if confidence <= worst[0]:
+                return False
+            self.entries.remove(worst)
+
+        small, detections = self._downscale(frame, detections)
+        self.entries.append((confidence, frame_number, small, detections))
+        return True
+
+    def merge(self, other):
+        """Offer the frames of another buffer, e.g. one filled by a segment of the same video"""
+        for confidence, frame_number, frame, detections in other.entries:
+            self.add(frame_number, frame, confidence, detections)
+
+    def best(self):
+        """Return (frame_number, frame, detections) of the highest-confidence frame, or None"""
+        if not self.entries:
+            return None
+        confidence, frame_number, frame, detections = max(self.entries, key=lambda entry: entry[0])
+        return frame_number, frame, detections
+
+    def by_confidence(self):
+        return sorted(self.entries, key=lambda entry: -entry[0])
+
+    def by_time(self):
+        return sorted(self.entries, key=lambda entry: entry[1])
+
+    def _downscale(self, frame, detections):
+        height, width = frame.shape[:2]
+        scale = self.max_dim / max(height, width)
+        if scale >= 1:
+            return frame.copy(), detections
+
+        small = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        if detections is not None:
+            detections = detections.scaled(scale)
+        return small, detections
+
+
+def make_thumbnail(frame, max_dim=400):
+    """Resize a frame so that its longest side is max_dim"""
+    height, width = frame.shape[:2]
+    if height > width:
+        new_height = max_dim
+        new_width = int(width * (max_dim / height))
+    else:
+        new_width = max_dim
+        new_height = int(height * (max_dim / width))
+
+    return cv2.resize(frame, (new_width, new_height))
+
+
+def make_contact_sheet(entries, detector_key, columns=3, tile_width=320):
+    """Tile the buffered frames, in the given order and with their boxes drawn, into one image"""
+    tiles = []
+    for confidence, frame_number, frame, detections in entries:
+        tile = render_detections(frame, {detector_key: detections})
+        height, width = tile.shape[:2]
+        tile = cv2.resize(tile, (tile_width, int(height * tile_width / width)))
+        cv2.putText(
+            tile, f"#{frame_number} {confidence:.2f}", (6, 20),
+            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA
+        )
+        tiles.append(tile)
+
+    tile_height = max(tile.shape[0] for tile in tiles)
+    rows = (len(tiles) + columns - 1) // columns
+    sheet = np.zeros((rows * tile_height, min(columns, len(tiles)) * tile_width, 3), dtype=np.uint8)
+    for index, tile in enumerate(tiles):
+        row, column = divmod(index, columns)
+        sheet[row * tile_height:row * tile_height + tile.shape[0], column * tile_width:(column + 1) * tile_width] = tile
+
+    return sheet
+
+
+def save_animated_preview(entries, detector_key, path, max_dim=320, frame_duration=500):
+    """Write the buffered frames, in the given order and with their boxes drawn, as an animated GIF"""
+    images = []
+    for confidence, frame_number, frame, detections in entries:
+        frame = make_thumbnail(render_detections(frame, {detector_key: detections}), max_dim)
+        images.append(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+
+    images[0].save(path, save_all=True, append_images=images[1:], duration=frame_duration, loop=0)
+    return path
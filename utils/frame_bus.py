@@ -0,0 +1,336 @@
+import json
+import time
+import uuid
+import asyncio
+import threading
+import logging
+import redis
+from django.conf import settings
+
+logger = logging.getLogger('security_ai')
+
+# Seconds a process stays registered as a viewer of a stream after its relay last refreshed
+# it, and seconds a publisher trusts its last look at a stream's viewers
+VIEWER_TTL = 10.0
+VIEWER_CHECK_INTERVAL = 1.0
+
+class FrameRing:
+    """
+    The most recent frames of one stream in this process, as (metadata, data) messages.
+    Producer threads publish into it and consumers on the event loop are woken through
+    asyncio; a message is shared by every consumer, never copied or serialized.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self.slots = [None] * self.capacity
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.waiters = set()
+
+    def publish(self, message):
+        with self.lock:
+            self.sequence += 1
+            self.slots[self.sequence % self.capacity] = message
+            waiters = list(self.waiters)
+
+        for waiter in waiters:
+            loop, event = waiter
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The consumer's event loop has closed
+                self.remove_waiter(waiter)
+
+    def add_waiter(self, waiter):
+        with self.lock:
+            self.waiters.add(waiter)
+            return self.sequence
+
+    def remove_waiter(self, waiter):
+        with self.lock:
+            self.waiters.discard(waiter)
+
+    def read(self, position, latest=False):
+        """
+        Return (sequence, message) of the next frame after position, or None when there is
+        none yet. A reader that has fallen further behind than the ring holds skips to the
+        newest frame, so a slow viewer falls behind by at most capacity frames; with latest
+        it always gets the newest frame.
+        """
+        with self.lock:
+            if self.sequence <= position:
+                return None
+            behind = self.sequence - position
+            sequence = position + 1 if behind <= self.capacity and not latest else self.sequence
+            return sequence, self.slots[sequence % self.capacity]
+
+
+class FrameSubscription:
+    """
+    A consumer's view of a stream: await get(), or iterate with async for.
+    With latest, a frame that arrives while the consumer is still busy with the previous
+    one replaces the frames before it, so each consumer holds at most one pending frame.
+    """
+
+    def __init__(self, bus, key, ring, latest=False):
+        self.bus = bus
+        self.key = key
+        self.ring = ring
+        self.latest = latest
+        self.event = asyncio.Event()
+        self.waiter = (asyncio.get_running_loop(), self.event)
+        self.received = 0
+        self.skipped = 0
+        self.closed = False
+        # Only frames published from now on are delivered
+        self.position = ring.add_waiter(self.waiter)
+
+    async def get(self):
+        """Wait for the next frame and return its (metadata, data)"""
+        while True:
+            entry = self.ring.read(self.position, self.latest)
+            if entry is None:
+                self.event.clear()
+                # Recheck, a frame may have arrived before the event was cleared
+                entry = self.ring.read(self.position, self.latest)
+                if entry is None:
+                    await self.event.wait()
+                    continue
+
+            sequence, message = entry
+            self.skipped += sequence - self.position - 1
+            self.received += 1
+            self.position = sequence
+            return message
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.ring.remove_waiter(self.waiter)
+            self.bus.unsubscribe(self.key)
+
+
+class FrameBus:
+    """
+    Distributes live video frames to WebSocket consumers without the channel layer, which
+    is left to control and alert events.
+    Consumers in the producing process read frames from an in-process ring per stream.
+    With the 'redis' backend, processes with consumers of a stream they do not produce
+    register as its viewers and relay it from a capped Redis Stream into their own ring.
+    The producer appends each frame to that Redis Stream once, and only while another
+    process is registered, so frames watched in the producing process never leave it.
+    """
+
+    def __init__(self):
+        self.backend = settings.STREAMING_SETTINGS['FRAME_BUS']
+        self.ring_size = settings.STREAMING_SETTINGS['FRAME_RING_SIZE']
+        self.stream_maxlen = settings.STREAMING_SETTINGS['FRAME_STREAM_MAXLEN']
+        self.stream_ttl = settings.STREAMING_SETTINGS['FRAME_CACHE_TTL']
+        # Tells this process's own frames apart when relaying a stream
+        self.origin = uuid.uuid4().hex.encode('ascii')
+
+        self.redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        self.rings = {}
+        self.subscribers = {}
+        self.relays = {}
+        # Last publish time of the streams produced here, and (checked at, viewers elsewhere)
+        self.producing = {}
+        self.remote_viewers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, key: str, metadata: dict, data: dict):
+        """
+        Publish a frame of the stream key. metadata must be JSON serializable; data maps
+        payload names to bytes or str, and is handed to local consumers as-is.
+        """
+        self._ring(key).publish((metadata, data))
+
+        if self.backend != 'redis':
+            return
+
+        self.producing[key] = time.time()
+        if not self._has_remote_viewers(key):
+            return
+
+        fields = {'origin': self.origin, 'meta': json.dumps(metadata)}
+        for name, payload in data.items():
+            fields[f"t:{name}" if isinstance(payload, str) else f"b:{name}"] = payload
+
+        try:
+            stream_key = self._stream_key(key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.xadd(stream_key, fields, maxlen=self.stream_maxlen, approximate=True)
+            pipe.expire(stream_key, self.stream_ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Frame stream publish error for {key}: {str(e)}")
+
+    def subscribe(self, key: str, latest: bool = False) -> FrameSubscription:
+        """Subscribe to the stream key; must be called on the consumer's event loop"""
+        with self.lock:
+            ring = self.rings.get(key)
+            if ring is None:
+                ring = self.rings[key] = FrameRing(self.ring_size)
+            self.subscribers[key] = self.subscribers.get(key, 0) + 1
+
+            # One relay per stream feeds every local consumer of it
+            if self.backend == 'redis' and key not in self.relays:
+                stop_event = threading.Event()
+                thread = threading.Thread(target=self._relay, args=(key, ring, stop_event), daemon=True)
+                self.relays[key] = stop_event
+                thread.start()
+
+        return FrameSubscription(self, key, ring, latest)
+
+    def unsubscribe(self, key: str):
+        with self.lock:
+            count = self.subscribers.get(key, 0) - 1
+            if count > 0:
+                self.subscribers[key] = count
+                return
+
+            # A local producer starts a new ring with its next frame
+            self.subscribers.pop(key, None)
+            self.rings.pop(key, None)
+            stop_event = self.relays.pop(key, None)
+            if stop_event:
+                stop_event.set()
+
+    def discard(self, key: str):
+        """Drop a stream whose producer stopped; consumers still subscribed keep its ring"""
+        with self.lock:
+            if not self.subscribers.get(key):
+                self.rings.pop(key, None)
+        self.producing.pop(key, None)
+        self.remote_viewers.pop(key, None)
+
+        if self.backend == 'redis':
+            try:
+                self.redis_client.delete(self._stream_key(key))
+            except redis.RedisError as e:
+                logger.error(f"Frame stream cleanup error for {key}: {str(e)}")
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'backend': self.backend,
+                'streams': {
+                    key: {'frames': ring.sequence, 'subscribers': self.subscribers.get(key, 0)}
+                    for key, ring in self.rings.items()
+                }
+            }
+
+    def _ring(self, key: str) -> FrameRing:
+        with self.lock:
+            ring = self.rings.get(key)
+            if ring is None:
+                ring = self.rings[key] = FrameRing(self.ring_size)
+            return ring
+
+    def _stream_key(self, key: str) -> str:
+        return f"frames:{key}"
+
+    def _viewers_key(self, key: str) -> str:
+        return f"frames:{key}:viewers"
+
+    def _is_producing(self, key: str) -> bool:
+        published = self.producing.get(key)
+        return published is not None and time.time() - published < VIEWER_TTL
+
+    def _has_remote_viewers(self, key: str) -> bool:
+        """Whether another process relays the stream key, looked up at most every VIEWER_CHECK_INTERVAL"""
+        now = time.time()
+        checked = self.remote_viewers.get(key)
+        if checked is not None and now - checked[0] < VIEWER_CHECK_INTERVAL:
+            return checked[1]
+
+        try:
+            viewers = self.redis_client.zrangebyscore(self._viewers_key(key), now, '+inf')
+        except redis.RedisError as e:
+            logger.error(f"Frame stream viewer lookup error for {key}: {str(e)}")
+            viewers = []
+        remote = any(viewer != self.origin for viewer in viewers)
+        self.remote_viewers[key] = (now, remote)
+        return remote
+
+    def _relay(self, key: str, ring: FrameRing, stop_event: threading.Event):
+        """
+        Copy frames published by other processes from the Redis Stream into the local ring.
+        The relay keeps this process registered as a viewer of the stream while it runs,
+        except while the stream is produced here and its frames already go through the ring.
+        """
+        # Blocking reads get their own connection
+        client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB
+        )
+        stream_key = self._stream_key(key)
+        viewers_key = self._viewers_key(key)
+        last_id = '$'
+        registered_at = 0.0
+
+        try:
+            while not stop_event.is_set():
+                try:
+                    if self._is_producing(key):
+                        if registered_at:
+                            client.zrem(viewers_key, self.origin)
+                            registered_at = 0.0
+                        last_id = '$'
+                        stop_event.wait(1.0)
+                        continue
+
+                    now = time.time()
+                    if now - registered_at > VIEWER_TTL / 3:
+                        pipe = client.pipeline(transaction=False)
+                        pipe.zadd(viewers_key, {self.origin: now + VIEWER_TTL})
+                        pipe.zremrangebyscore(viewers_key, '-inf', now)
+                        pipe.expire(viewers_key, int(VIEWER_TTL) * 2)
+                        pipe.execute()
+                        registered_at = now
+
+                    entries = client.xread({stream_key: last_id}, count=self.ring_size, block=1000)
+                except redis.RedisError as e:
+                    logger.error(f"Frame stream read error for {key}: {str(e)}")
+                    registered_at = 0.0
+                    stop_event.wait(1.0)
+                    continue
+
+                for _, items in entries or []:
+                    for entry_id, fields in items:
+                        last_id = entry_id
+                        # Frames of this process already went through the ring
+                        if fields.get(b'origin') != self.origin:
+                            ring.publish(self._decode(fields))
+        finally:
+            try:
+                client.zrem(viewers_key, self.origin)
+            except redis.RedisError:
+                pass
+            client.close()
+
+    def _decode(self, fields):
+        metadata = json.loads(fields[b'meta'])
+        data = {}
+        for field, payload in fields.items():
+            field = field.decode('ascii')
+            if field.startswith('b:'):
+                data[field[2:]] = payload
+            elif field.startswith('t:'):
+                data[field[2:]] = payload.decode('utf-8')
+        return metadata, data
+
+
+frame_bus = FrameBus()
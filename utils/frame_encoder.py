@@ -0,0 +1,74 @@
+import base64
+import threading
+import cv2
+
+def rendition_name(width, max_width, quality):
+    """
+    Name of the rendition of a frame width wide, scaled down to max_width, used in cache
+    keys: e.g. 640w_q60, or full_q85 when the frame is not scaled.
+    """
+    if not max_width or max_width >= width:
+        return f"full_q{quality}"
+    return f"{max_width}w_q{quality}"
+
+
+class EncodedFrame:
+    """
+    The JPEG renditions of one live frame. Each distinct (max_width, quality) rendition is
+    resized and encoded on first request and the bytes are reused for every later request,
+    so a frame is encoded once per rendition no matter how many viewers, caches and
+    endpoints serve it.
+    """
+
+    def __init__(self, frame, frame_number, timestamp=None):
+        self.frame = frame
+        self.frame_number = frame_number
+        self.timestamp = timestamp
+        self.height, self.width = frame.shape[:2]
+        self.lock = threading.Lock()
+        self._jpeg = {}
+        self._base64 = {}
+
+    def rendition(self, max_width=None, quality=85):
+        return rendition_name(self.width, max_width, quality)
+
+    def jpeg(self, max_width=None, quality=85):
+        """JPEG bytes of the frame scaled down to max_width"""
+        name = self.rendition(max_width, quality)
+        with self.lock:
+            data = self._jpeg.get(name)
+            if data is None:
+                if self.frame is None:
+                    raise ValueError(f"Rendition {name} of frame {self.frame_number} was not encoded before release")
+                data = self._jpeg[name] = encode_jpeg(self.frame, quality, max_width)
+            return data
+
+    def base64(self, max_width=None, quality=85):
+        """The JPEG rendition as base64 text, for JSON messages"""
+        name = self.rendition(max_width, quality)
+        data = self._base64.get(name)
+        if data is None:
+            data = self._base64[name] = base64.b64encode(self.jpeg(max_width, quality)).decode('ascii')
+        return data
+
+    def renditions(self):
+        """Return {rendition name: JPEG bytes} of the renditions encoded so far"""
+        with self.lock:
+            return dict(self._jpeg)
+
+    def release(self):
+        """Drop the decoded frame once every rendition needed has been encoded"""
+        with self.lock:
+            self.frame = None
+
+
+def encode_jpeg(frame, quality, max_width=None):
+    """Encode a frame as JPEG, scaled down to max_width first when it is wider"""
+    height, width = frame.shape[:2]
+    if max_width and width > max_width:
+        frame = cv2.resize(frame, (max_width, int(height * max_width / width)), interpolation=cv2.INTER_AREA)
+
+    success, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not success:
+        raise ValueError("JPEG encoding failed")
+    return buffer.tobytes()
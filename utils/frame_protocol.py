@@ -0,0 +1,50 @@
+import struct
+
+# WebSocket subprotocol of the binary frame transport. Clients offer it when connecting
+# (or send {"type": "set_protocol", "protocol": "binary"}); everyone else gets JSON frames.
+BINARY_SUBPROTOCOL = 'saf.frames.v1'
+PROTOCOLS = ('json', 'binary')
+
+PROTOCOL_VERSION = 1
+MESSAGE_FRAME = 1
+
+# version, message type, detection count, camera id, frame number, timestamp (Unix seconds),
+# little-endian without padding: 20 bytes, followed by the JPEG bytes
+FRAME_HEADER = struct.Struct('<BBHIId')
+
+def pack_frame(camera_id, frame_number, timestamp, detection_count, jpeg):
+    """Build a binary frame message: the fixed header followed by the raw JPEG bytes"""
+    header = FRAME_HEADER.pack(
+        PROTOCOL_VERSION,
+        MESSAGE_FRAME,
+        min(int(detection_count), 0xFFFF),
+        int(camera_id) & 0xFFFFFFFF,
+        int(frame_number) & 0xFFFFFFFF,
+        float(timestamp or 0.0),
+    )
+    return header + jpeg
+
+
+def unpack_frame(data):
+    """Split a binary frame message into its header fields and JPEG bytes"""
+    version, message_type, detection_count, camera_id, frame_number, timestamp = FRAME_HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION or message_type != MESSAGE_FRAME:
+        raise ValueError(f"Unsupported frame message (version {version}, type {message_type})")
+
+    return {
+        'camera_id': camera_id,
+        'frame_number': frame_number,
+        'timestamp': timestamp,
+        'detection_count': detection_count,
+        'jpeg': bytes(data[FRAME_HEADER.size:]),
+    }
+
+
+def negotiate_protocol(scope):
+    """
+    Pick the frame protocol for a WebSocket connection from the subprotocols the client
+    offered. Returns (protocol, subprotocol to accept with).
+    """
+    if BINARY_SUBPROTOCOL in scope.get('subprotocols', []):
+        return 'binary', BINARY_SUBPROTOCOL
+    return 'json', None
@@ -0,0 +1,143 @@
+import cv2
+import numpy as np
+import logging
+
+logger = logging.getLogger('security_ai')
+
+class AdaptiveFrameSampler:
+    """
+    Decides which frames of a video or stream are worth running the detectors on.
+    Each frame is reduced to a small grayscale thumbnail and compared with the previous
+    one; the share of changed pixels is the motion score. While there is motion every
+    motion_stride-th frame is sampled, a static scene only every idle_stride-th frame,
+    and a scene change (e.g. a cut or a camera moved) is always sampled.
+    """
+
+    def __init__(self, motion_stride=2, idle_stride=30, motion_threshold=0.02,
+                 scene_change_threshold=0.25, pixel_threshold=25, hold_frames=15,
+                 baseline_stride=5, downscale_width=64, adaptive=True):
+        """
+        Initialize the sampler.
+        motion_threshold is the fraction of changed pixels that counts as motion,
+        scene_change_threshold the mean absolute difference (0 - 1) from the last sampled
+        frame that counts as a new scene. Motion keeps the fast rate for hold_frames frames.
+        baseline_stride is the fixed stride used to report the inferences saved.
+        With adaptive=False every motion_stride-th frame is sampled.
+        """
+        self.motion_stride = max(1, motion_stride)
+        self.idle_stride = max(self.motion_stride, idle_stride)
+        self.motion_threshold = motion_threshold
+        self.scene_change_threshold = scene_change_threshold * 255
+        self.pixel_threshold = pixel_threshold
+        self.hold_frames = hold_frames
+        self.baseline_stride = max(1, baseline_stride)
+        self.downscale_width = downscale_width
+        self.adaptive = adaptive
+
+        self.previous = None
+        self.last_frame = None
+        self.last_sampled = None
+        self.frames_since_sample = 0
+        self.motion_hold = 0
+        self.motion_score = 0.0
+
+        self.stats = {
+            'frames': 0,
+            'sampled': 0,
+            'motion_frames': 0,
+            'scene_changes': 0,
+        }
+
+    @classmethod
+    def from_camera(cls, camera, baseline_stride=None):
+        """Create a sampler with a camera's sampling settings"""
+        return cls(**cls.camera_options(camera, baseline_stride))
+
+    @staticmethod
+    def camera_options(camera, baseline_stride=None):
+        """Return the sampler keyword arguments for a camera's sampling settings"""
+        if not camera.adaptive_sampling:
+            return {
+                'motion_stride': camera.frame_rate,
+                'adaptive': False,
+                'baseline_stride': baseline_stride or camera.frame_rate,
+            }
+
+        return {
+            'motion_stride': camera.motion_frame_stride,
+            'idle_stride': camera.idle_frame_stride,
+            'motion_threshold': camera.motion_threshold,
+            'baseline_stride': baseline_stride or camera.frame_rate,
+        }
+
+    def should_sample(self, frame):
+        """Score the frame and return True if it should go through the detectors"""
+        self.stats['frames'] += 1
+        self.frames_since_sample += 1
+
+        # Sources that skip decoding a frame repeat the previous one in its place
+        if frame is self.last_frame:
+            return self._record(False)
+        self.last_frame = frame
+
+        if not self.adaptive:
+            sampled = self.stats['frames'] % self.motion_stride == 0
+            return self._record(sampled)
+
+        small = self._downscale(frame)
+        previous, self.previous = self.previous, small
+
+        # Always run the first frame
+        if previous is None:
+            self.last_sampled = small
+            return self._record(True)
+
+        # Share of pixels that changed noticeably since the previous frame
+        changed = cv2.absdiff(small, previous) > self.pixel_threshold
+        self.motion_score = float(np.count_nonzero(changed)) / changed.size
+
+        if self.motion_score >= self.motion_threshold:
+            self.motion_hold = self.hold_frames
+            self.stats['motion_frames'] += 1
+        elif self.motion_hold:
+            self.motion_hold -= 1
+
+        scene_change = float(cv2.absdiff(small, self.last_sampled).mean()) >= self.scene_change_threshold
+        if scene_change:
+            self.stats['scene_changes'] += 1
+
+        stride = self.motion_stride if self.motion_hold else self.idle_stride
+        sampled = scene_change or self.frames_since_sample >= stride
+
+        if sampled:
+            self.last_sampled = small
+        return self._record(sampled)
+
+    def get_stats(self):
+        """Return frame counts and the inferences saved against the fixed baseline stride"""
+        baseline = self.stats['frames'] // self.baseline_stride
+        return {
+            **self.stats,
+            'baseline_inferences': baseline,
+            'saved_inferences': max(0, baseline - self.stats['sampled']),
+            'sample_ratio': round(self.stats['sampled'] / self.stats['frames'], 3) if self.stats['frames'] else 0.0,
+            'motion_score': round(self.motion_score, 4),
+        }
+
+    def _record(self, sampled):
+        if sampled:
+            self.stats['sampled'] += 1
+            self.frames_since_sample = 0
+        return sampled
+
+    def _downscale(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / width
+        small = cv2.resize(
+            frame, (self.downscale_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA
+        )
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        # Blur away sensor noise and compression artifacts before differencing
+        return cv2.GaussianBlur(small, (3, 3), 0)
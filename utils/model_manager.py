@@ -1,5 +1,6 @@
 import os
-from detectors import FireSmokeDetector, FallDetector, ViolenceDetector, ChokingDetector
+from detectors import model_registry
+from detectors.backends import quantized_model_path
 from django.conf import settings
 import logging
 
@@ -10,12 +11,8 @@ class ModelManager:
     
     def __init__(self):
         """Initialize the model manager with all available detectors"""
-        self.detectors = {
-            "fire_smoke": FireSmokeDetector(),
-            "fall": FallDetector(),
-            "violence": ViolenceDetector(),
-            "choking": ChokingDetector()
-        }
+        # Detectors are shared process-wide; weights load on first use
+        self.detectors = model_registry.get_detectors()
         
         # Current active detector
         self.active_detector_key = "fire_smoke"
@@ -105,6 +102,25 @@ class ModelManager:
             
         return self.detector_configs[detector_key]
     
+    def set_model_variant(self, detector_key, variant):
+        """Select the fp32 or int8 model variant for a specific detector"""
+        if detector_key not in self.detectors:
+            logger.error(f"Unknown detector: {detector_key}")
+            raise ValueError(f"Unknown detector: {detector_key}")
+        
+        model_path = self.detectors[detector_key].model_path
+        if variant == 'int8' and not (
+            os.path.exists(model_path) and os.path.exists(quantized_model_path(model_path))
+        ):
+            logger.error(f"No INT8 model for {detector_key}")
+            raise ValueError(f"No INT8 model for {detector_key}; run 'manage.py quantize_models' first")
+        
+        return model_registry.set_variant(detector_key, variant)
+    
+    def get_model_variant(self, detector_key):
+        """Get the model variant a specific detector runs"""
+        return model_registry.get_variant(detector_key)
+    
     def validate_models(self):
         """Check if all model files exist"""
         missing_models = []
@@ -0,0 +1,206 @@
+import time
+import queue
+import threading
+import logging
+from django.conf import settings
+
+logger = logging.getLogger('security_ai')
+
+# Marks the end of the frame stream on a stage queue
+END_OF_STREAM = object()
+
+class StageTimer:
+    """Busy and blocked time of one pipeline stage"""
+
+    def __init__(self):
+        self.frames = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+
+    def to_dict(self):
+        return {
+            'frames': self.frames,
+            'busy_seconds': round(self.busy_time, 3),
+            'wait_seconds': round(self.wait_time, 3),
+            'ms_per_frame': round(self.busy_time / self.frames * 1000, 2) if self.frames else 0.0,
+        }
+
+
+class VideoPipeline:
+    """
+    Runs offline video processing as three overlapping stages: a decoder thread reading
+    frames, the inference stage on the calling thread, and an encoder thread rendering and
+    writing frames. Stages are connected by bounded queues, and each stage has a single
+    thread consuming its queue in order, so frames are written in decode order.
+    Throughput approaches that of the slowest stage instead of the sum of all three.
+    """
+
+    def __init__(self, cap, writer, render=None, queue_size=None):
+        """
+        Initialize the pipeline.
+        cap is a FrameSource (see utils.video_sources) and frames are VideoFrames.
+        render(frame, detections) returns the image to write; otherwise frames are written
+        as-is at full resolution. With writer None nothing is encoded, for runs that only
+        collect detections.
+        """
+        self.cap = cap
+        self.writer = writer
+        self.render = render
+        queue_size = queue_size or settings.DETECTION_SETTINGS['PIPELINE_QUEUE_SIZE']
+
+        self.decode_queue = queue.Queue(maxsize=queue_size)
+        self.encode_queue = queue.Queue(maxsize=queue_size)
+        self.failed = threading.Event()
+        self.errors = []
+
+        self.timers = {
+            'decode': StageTimer(),
+            'inference': StageTimer(),
+            'encode': StageTimer(),
+        }
+        self.elapsed = 0.0
+
+    def run(self, process_frame, finish=None):
+        """
+        Process the whole video.
+        process_frame(frame_number, frame) is called on this thread for every decoded frame,
+        in order, and returns the (frame, detections) pairs that are ready to be written.
+        finish() returns whatever is still held back once decoding ends.
+        Returns the per-stage timing statistics.
+        """
+        start_time = time.time()
+
+        decoder = threading.Thread(target=self._decode, name='video-decode')
+        encoder = threading.Thread(target=self._encode, name='video-encode')
+        decoder.daemon = True
+        encoder.daemon = True
+        decoder.start()
+        encoder.start()
+
+        timer = self.timers['inference']
+        try:
+            while not self.failed.is_set():
+                wait_start = time.perf_counter()
+                item = self._get(self.decode_queue)
+                busy_start = time.perf_counter()
+                timer.wait_time += busy_start - wait_start
+
+                if item is END_OF_STREAM or item is None:
+                    break
+
+                frame_number, frame = item
+                ready = process_frame(frame_number, frame)
+                timer.frames += 1
+                timer.busy_time += time.perf_counter() - busy_start
+
+                for output in ready:
+                    self._put(self.encode_queue, output, timer)
+
+            if finish is not None and not self.failed.is_set():
+                busy_start = time.perf_counter()
+                ready = finish()
+                timer.busy_time += time.perf_counter() - busy_start
+
+                for output in ready:
+                    self._put(self.encode_queue, output, timer)
+        except Exception as e:
+            self._fail('inference', e)
+        finally:
+            self._put(self.encode_queue, END_OF_STREAM, timer, force=True)
+            decoder.join()
+            encoder.join()
+            self.elapsed = time.time() - start_time
+
+        if self.errors:
+            stage, error = self.errors[0]
+            logger.error(f"Video pipeline {stage} stage failed: {str(error)}")
+            raise error
+
+        return self.get_stats()
+
+    def get_stats(self):
+        """Return per-stage timing, the overall frame rate and the bottleneck stage"""
+        frames = self.timers['decode'].frames
+        stages = {name: timer.to_dict() for name, timer in self.timers.items()}
+        return {
+            'frames': frames,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'fps': round(frames / self.elapsed, 2) if self.elapsed else 0.0,
+            'bottleneck': max(stages, key=lambda name: stages[name]['busy_seconds']),
+            'stages': stages,
+        }
+
+    def _decode(self):
+        timer = self.timers['decode']
+        frame_number = 0
+        try:
+            while not self.failed.is_set():
+                busy_start = time.perf_counter()
+                frame = self.cap.read_frame()
+                timer.busy_time += time.perf_counter() - busy_start
+                if frame is None:
+                    break
+
+                frame_number += 1
+                timer.frames += 1
+                self._put(self.decode_queue, (frame_number, frame), timer)
+        except Exception as e:
+            self._fail('decode', e)
+        finally:
+            self._put(self.decode_queue, END_OF_STREAM, timer, force=True)
+
+    def _encode(self):
+        timer = self.timers['encode']
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = self._get(self.encode_queue)
+                busy_start = time.perf_counter()
+                timer.wait_time += busy_start - wait_start
+
+                if item is END_OF_STREAM or item is None:
+                    break
+                if self.failed.is_set():
+                    continue
+
+                if self.writer is not None:
+                    frame, detections = item
+                    if self.render is not None and detections is not None:
+                        self.writer.write(self.render(frame, detections))
+                    else:
+                        self.writer.write(frame.full)
+
+                timer.frames += 1
+                timer.busy_time += time.perf_counter() - busy_start
+        except Exception as e:
+            self._fail('encode', e)
+
+    def _fail(self, stage, error):
+        self.errors.append((stage, error))
+        self.failed.set()
+
+    def _get(self, stage_queue):
+        # Poll so a failure elsewhere never leaves a stage waiting forever
+        while True:
+            try:
+                return stage_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self.failed.is_set() and stage_queue is self.decode_queue:
+                    return None
+
+    def _put(self, stage_queue, item, timer, force=False):
+        wait_start = time.perf_counter()
+        while True:
+            try:
+                stage_queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self.failed.is_set():
+                    if not force:
+                        break
+                    # Make room for the end marker; the frames are being discarded anyway
+                    try:
+                        stage_queue.get_nowait()
+                    except queue.Empty:
+                        pass
+        timer.wait_time += time.perf_counter() - wait_start
@@ -1,17 +1,36 @@
 import os
 import time
+import shutil
+import pickle
+import subprocess
+import threading
+import multiprocessing
 import cv2
 import numpy as np
 from datetime import datetime
 import uuid
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from django.conf import settings
+from django.db import connection
 from django.db.models import F
 from django.utils import timezone
 
 from alerts.models import Alert
 from cameras.models import Camera
+from detectors.models import JobTakenOver, VideoProcessingJob
+from detectors import FrameBatcher, render_detections
+from utils.detection_accumulator import DetectionAccumulator
+from utils.detection_track import DetectionTrack
+from utils.frame_buffer import TopFrameBuffer, make_contact_sheet, make_thumbnail, save_animated_preview
+from utils.frame_sampler import AdaptiveFrameSampler
 from utils.model_manager import ModelManager
+from utils.video_pipeline import VideoPipeline
+from utils.video_sources import open_stream, open_video, working_size
+from utils.video_segments import (
+    SegmentCapture, concat_segments, init_segment_worker, plan_segments, probe_keyframes, process_segment
+)
 
 logger = logging.getLogger('security_ai')
 
@@ -21,165 +40,455 @@ class VideoProcessor:
     def __init__(self, model_manager=None):
         """Initialize the video processor with the model manager"""
         self.model_manager = model_manager or ModelManager()
+        # Pipeline and sampling statistics of the last processed video
+        self.last_run_stats = {}
         self.output_dir = os.path.join(settings.MEDIA_ROOT, 'alerts', 'videos')
         
         # Create output directory if it doesn't exist
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
     
-    def process_video(self, video_path, detector_key, conf_threshold, iou_threshold, image_size, camera_id=None):
+    def process_video(self, video_path, detector_key, conf_threshold, iou_threshold, image_size, camera_id=None,
+                      batch_size=None, output_mode=None):
         """
         Process a video file using the specified detector.
+        Sampled frames are grouped into batches of batch_size (DETECTION_SETTINGS by default).
+        output_mode 'annotated' writes a re-encoded copy with the boxes drawn in; 'sidecar' keeps
+        the original video and stores the boxes in the alert's detections file.
+        The video is processed as a checkpointed job that can be resumed with run_job.
         Returns the path to the processed video file and created alert.
         """
-        detector = self.model_manager.get_detector(detector_key)
+        job = self.create_job(
+            video_path, detector_key, conf_threshold, iou_threshold, image_size,
+            camera_id=camera_id, batch_size=batch_size, output_mode=output_mode
+        )
+        return self.run_job(job)
+    
+    def process_video_parallel(self, video_path, detector_key, conf_threshold, iou_threshold, image_size,
+                               camera_id=None, workers=None, batch_size=None, output_mode=None):
+        """
+        Process a long video file across several worker processes.
+        The video is split into keyframe-aligned segments that are processed in parallel,
+        each worker with its own detector instance; the annotated segments are stitched
+        back together and their detections merged into a single alert.
+        Videos too short to split are processed in a single segment.
+        Returns the path to the processed video file and created alert.
+        """
+        workers = workers or settings.DETECTION_SETTINGS['VIDEO_WORKERS'] or os.cpu_count() or 1
+        job = self.create_job(
+            video_path, detector_key, conf_threshold, iou_threshold, image_size,
+            camera_id=camera_id, batch_size=batch_size, output_mode=output_mode, workers=workers
+        )
+        return self.run_job(job)
+    
+    def create_job(self, video_path, detector_key, conf_threshold, iou_threshold, image_size, camera_id=None,
+                   batch_size=None, output_mode=None, workers=1, user=None):
+        """Create a pending processing job for a video file"""
+        camera = None
+        if camera_id:
+            try:
+                camera = Camera.objects.get(id=camera_id)
+            except Camera.DoesNotExist:
+                logger.warning(f"Camera with ID {camera_id} not found.")
+        
+        return VideoProcessingJob.objects.create(
+            video_path=video_path,
+            detector_key=detector_key,
+            conf_threshold=conf_threshold,
+            iou_threshold=iou_threshold,
+            image_size=image_size,
+            batch_size=batch_size,
+            output_mode=self._get_output_mode(output_mode),
+            workers=max(1, workers),
+            camera=camera,
+            created_by=user
+        )
+    
+    def run_job(self, job):
+        """
+        Run or resume a video processing job.
+        The video is processed segment by segment, in this process or across job.workers
+        worker processes. Every finished segment is checkpointed to the job's work directory
+        and recorded on the job, so a resumed job only processes the missing segments.
+        Job updates only go through while the job belongs to the task it was loaded for;
+        once it is handed to another task, JobTakenOver is raised.
+        Returns the path to the processed video file and the job's alert.
+        """
+        detector = self.model_manager.get_detector(job.detector_key)
+        heartbeat = None
         
         try:
-            # Open the video file
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                logger.error(f"Failed to open video file: {video_path}")
-                raise ValueError(f"Failed to open video file: {video_path}")
-                
-            # Get video properties
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            logger.info(f"Processing video: {video_path}")
-            logger.info(f"Video properties: {width}x{height}, {total_frames} frames, {fps} FPS")
-            
-            # Create output file name
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            video_filename = f"{detector_key}_{timestamp}_{uuid.uuid4().hex[:8]}.mp4"
-            output_path = os.path.join(self.output_dir, video_filename)
-            
-            # Define codec and create VideoWriter object
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            
-            # Create an alert record
-            camera = None
-            location = None
+            if not job.segments:
+                self._plan_job(job, detector)
+            
+            os.makedirs(self._job_dir(job), exist_ok=True)
+            
+            job.status = 'running'
+            job.attempts += 1
+            job.error = None
+            job.attempt_started_at = timezone.now()
+            job.attempt_start_frames = job.processed_frames
+            job.heartbeat = job.attempt_started_at
+            job.save_owned([
+                'status', 'attempts', 'error', 'attempt_started_at',
+                'attempt_start_frames', 'heartbeat', 'updated_at'
+            ])
+            # Segments can take longer than the stale timeout, so the job also reports it is
+            # alive between checkpoints
+            heartbeat = self._start_heartbeat(job)
+            
+            # Results of the segments finished by earlier attempts
+            results = {index: self._load_checkpoint(job, index) for index in job.completed_segments}
+            if results:
+                logger.info(
+                    f"Resuming video job {job.id}: {len(results)} of {len(job.segments)} segments "
+                    f"({job.processed_frames} frames) already processed"
+                )
+            
+            accumulator = DetectionAccumulator(job.alert)
+            for result in results.values():
+                accumulator.merge(result['accumulator'])
+            
+            remaining = [index for index in range(len(job.segments)) if index not in results]
+            if job.workers > 1 and len(remaining) > 1:
+                segment_results = self._run_job_segments_parallel(job, remaining)
+            else:
+                segment_results = self._run_job_segments(job, detector, remaining)
             
-            if camera_id:
-                try:
-                    camera = Camera.objects.get(id=camera_id)
-                    location = camera.location
-                except Camera.DoesNotExist:
-                    logger.warning(f"Camera with ID {camera_id} not found.")
+            start_time = time.time()
+            for index, result in segment_results:
+                self._save_checkpoint(job, index, result, accumulator)
+                results[index] = result
             
-            alert = Alert.objects.create(
-                title=f"{detector.name} Detection",
-                description=f"Automatic detection of {detector.name.lower()} in video.",
-                alert_type=detector_key,
-                severity='medium',  # Default severity
-                camera=camera,
-                location=location,
-                video_file=f"alerts/videos/{video_filename}"
+            return self._finish_job(
+                job, detector, [results[index] for index in range(len(job.segments))],
+                accumulator, time.time() - start_time
             )
             
-            # Variables for detection tracking
-            detection_frames = []
-            detection_confidences = []
-            
-            # Process each frame
-            frame_count = 0
-            detection_count = 0
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                    
-                frame_count += 1
-                
-                # Process every 5th frame to speed things up
-                if frame_count % 5 == 0:
-                    try:
-                        # Process the frame
-                        annotated_frame, results = detector.predict_video_frame(
-                            frame, conf_threshold, iou_threshold, image_size
-                        )
-                        
-                        # Check if any detections with required confidence
-                        has_detection = False
-                        confidence = 0.0
-                        
-                        for r in results:
-                            if r.boxes is not None and len(r.boxes) > 0:
-                                # Get the confidences
-                                confidences = r.boxes.conf.tolist()
-                                
-                                if confidences:
-                                    max_conf = max(confidences)
-                                    if max_conf >= conf_threshold:
-                                        has_detection = True
-                                        confidence = max(confidence, max_conf)
-                                        detection_frames.append(frame_count)
-                                        detection_confidences.append(max_conf)
-                                        detection_count += 1
-                        
-                        # Write the annotated frame
-                        out.write(annotated_frame)
-                        
-                        # If we have a detection, update the alert
-                        if has_detection and confidence > alert.confidence:
-                            alert.confidence = confidence
-                            
-                            # Adjust severity based on confidence
-                            if confidence >= 0.9:
-                                alert.severity = 'critical'
-                            elif confidence >= 0.7:
-                                alert.severity = 'high'
-                            elif confidence >= 0.5:
-                                alert.severity = 'medium'
-                            else:
-                                alert.severity = 'low'
-                                
-                            alert.save(update_fields=['confidence', 'severity'])
-                            
-                    except Exception as e:
-                        logger.error(f"Error processing frame {frame_count}: {str(e)}")
-                        # Write the original frame
-                        out.write(frame)
-                else:
-                    # Write the original frame
-                    out.write(frame)
-                    
-            # Release resources
-            cap.release()
-            out.release()
-            
-            # Update the alert with detection statistics
-            if detection_count > 0:
-                description = f"Detected {detector.name.lower()} in {detection_count} frames. "
-                description += f"Average confidence: {sum(detection_confidences) / len(detection_confidences):.2f}."
-                
-                alert.description = description
-                alert.save(update_fields=['description'])
-                
-                # Create thumbnail from a frame with detection
-                if detection_frames:
-                    # Use the frame with highest confidence for thumbnail
-                    best_frame_idx = detection_confidences.index(max(detection_confidences))
-                    best_frame = detection_frames[best_frame_idx]
-                    
-                    # Extract the thumbnail
-                    self._create_thumbnail(video_path, alert, best_frame)
-            else:
-                # No detections found
-                alert.status = 'false_positive'
-                alert.description = f"No {detector.name.lower()} detected in the video."
-                alert.save(update_fields=['status', 'description'])
-            
-            logger.info(f"Video processing complete. Output saved to: {output_path}")
-            return output_path, alert
-            
+        except JobTakenOver:
+            # The task that took the job over carries on with it
+            raise
         except Exception as e:
-            logger.error(f"Error in video processing: {str(e)}")
+            logger.error(f"Error in video processing job {job.id}: {str(e)}")
+            job.status = 'failed'
+            job.error = str(e)
+            try:
+                job.save_owned(['status', 'error'])
+            except JobTakenOver:
+                logger.warning(f"Video job {job.id} was taken over by another task; not marking it failed")
             raise
+        finally:
+            if heartbeat is not None:
+                heartbeat.set()
+    
+    def _start_heartbeat(self, job):
+        """Refresh the heartbeat of a running job from a background thread until the returned event is set"""
+        interval = settings.DETECTION_SETTINGS['JOB_HEARTBEAT_SECONDS']
+        stop_event = threading.Event()
+        if interval <= 0:
+            return stop_event
+        
+        def beat():
+            try:
+                while not stop_event.wait(interval):
+                    # Stop once the job has been handed to another task
+                    if not VideoProcessingJob.objects.filter(
+                        id=job.id, task_id=job.task_id, status='running'
+                    ).update(heartbeat=timezone.now()):
+                        break
+            except Exception as e:
+                logger.error(f"Heartbeat of video job {job.id} failed: {str(e)}")
+            finally:
+                # The thread has its own database connection
+                connection.close()
+        
+        threading.Thread(target=beat, name=f"job-{job.id}-heartbeat", daemon=True).start()
+        return stop_event
+    
+    def _plan_job(self, job, detector):
+        """Read the video properties, split it into segments and create the output and alert"""
+        # Opened with the decoder the segments will use, so the frame counts agree
+        cap = open_video(job.video_path, **self._decode_options(job))
+        if not cap.isOpened():
+            logger.error(f"Failed to open video file: {job.video_path}")
+            raise ValueError(f"Failed to open video file: {job.video_path}")
+        
+        # Get video properties
+        job.total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        job.fps = cap.get(cv2.CAP_PROP_FPS)
+        job.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        job.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+        
+        logger.info(f"Processing video: {job.video_path}")
+        logger.info(f"Video properties: {job.width}x{job.height}, {job.total_frames} frames, {job.fps} FPS")
+        
+        # Segments double as checkpoints, so even a single worker gets several
+        checkpoint_frames = settings.DETECTION_SETTINGS['CHECKPOINT_FRAMES']
+        segment_count = max(job.workers, -(-job.total_frames // checkpoint_frames) if checkpoint_frames else 1)
+        min_segment_frames = settings.DETECTION_SETTINGS['MIN_SEGMENT_FRAMES'] if job.workers > 1 else 1
+        
+        if job.total_frames > 0:
+            keyframes = probe_keyframes(job.video_path) if segment_count > 1 else None
+            job.segments = [
+                list(segment)
+                for segment in plan_segments(job.total_frames, segment_count, keyframes, min_segment_frames)
+            ]
+        else:
+            # Unknown length: read to the end in one segment
+            job.segments = [[0, None]]
+        
+        # Create output file name
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        job.base_name = f"{job.detector_key}_{timestamp}_{uuid.uuid4().hex[:8]}"
+        
+        if job.output_mode == 'sidecar':
+            # Only the detections are produced; the video itself is never re-encoded
+            video_filename = self._store_original_video(job.video_path, job.base_name)
+        else:
+            video_filename = f"{job.base_name}.mp4"
+        job.output_path = os.path.join(self.output_dir, video_filename)
+        
+        # Create an alert record
+        job.alert = self._create_video_alert(detector, job.detector_key, job.camera, video_filename)
+        
+        job.save_owned([
+            'total_frames', 'fps', 'width', 'height', 'segments', 'base_name',
+            'output_path', 'alert', 'updated_at'
+        ])
+    
+    def _job_tasks(self, job, indices):
+        """Describe the given segments of a job for process_segment"""
+        return [
+            {
+                'index': index,
+                'video_path': job.video_path,
+                'start_frame': job.segments[index][0],
+                'end_frame': job.segments[index][1],
+                'output_path': (
+                    os.path.join(self._job_dir(job), f"segment_{index:04d}.mp4")
+                    if job.output_mode == 'annotated' else None
+                ),
+                'fps': job.fps,
+                'frame_size': (job.width, job.height),
+                'detector_key': job.detector_key,
+                'conf_threshold': job.conf_threshold,
+                'iou_threshold': job.iou_threshold,
+                'image_size': job.image_size,
+                'batch_size': job.batch_size,
+                'sampler': self._video_sampler_options(job.camera),
+                'decode': self._decode_options(job),
+            }
+            for index in indices
+        ]
+    
+    def _decode_options(self, job):
+        """
+        open_video options for a job. Frames are sampled and detected at reduced resolution;
+        annotated jobs also write every frame at full resolution. Sidecar jobs keep the
+        original video, so when frames are sampled sparsely they decode without the
+        frames no other frame references.
+        """
+        skip_stride = settings.DETECTION_SETTINGS['SKIP_NONREF_STRIDE']
+        motion_stride = self._video_sampler_options(job.camera).get('motion_stride', 1)
+        return {
+            'image_size': job.image_size,
+            'skip_non_reference': (
+                job.output_mode == 'sidecar' and bool(skip_stride) and motion_stride >= skip_stride
+            ),
+        }
+    
+    def _run_job_segments(self, job, detector, indices):
+        """Process segments in order in this process, yielding (index, result) as each finishes"""
+        cap = open_video(job.video_path, **self._decode_options(job))
+        if not cap.isOpened():
+            logger.error(f"Failed to open video file: {job.video_path}")
+            raise ValueError(f"Failed to open video file: {job.video_path}")
+        
+        position = 0
+        try:
+            for task in self._job_tasks(job, indices):
+                # Only seek when resuming past finished segments; otherwise keep reading
+                if task['start_frame'] != position:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, task['start_frame'])
+                
+                result = self.process_segment(cap, task, detector, alert=job.alert)
+                position = task['end_frame']
+                yield task['index'], result
+        finally:
+            cap.release()
+    
+    def _run_job_segments_parallel(self, job, indices):
+        """
+        Process segments in worker processes, yielding (index, result) as each finishes.
+        If a segment fails, the segments finished by other workers are still yielded before
+        its error is raised.
+        """
+        tasks = self._job_tasks(job, indices)
+        workers = min(job.workers, len(tasks))
+        
+        logger.info(f"Processing video: {job.video_path} in {len(tasks)} segments on {workers} workers")
+        
+        # Spawned workers do not inherit the parent's torch thread pools or open connections
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_segment_worker,
+            initargs=(max(1, (os.cpu_count() or 1) // workers),)
+        ) as executor:
+            futures = [executor.submit(process_segment, task) for task in tasks]
+            error = None
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # Segments already running still finish and are checkpointed before
+                    # the job fails; ones that have not started are left for the retry
+                    if error is None:
+                        error = e
+                        for pending in futures:
+                            pending.cancel()
+                    continue
+                yield result['index'], result
+            
+            if error is not None:
+                raise error
+    
+    def process_segment(self, cap, task, detector, alert=None):
+        """
+        Run the detector over one segment of a video, read from cap positioned at its start.
+        Writes the annotated segment to task['output_path'], or only records the detections
+        when it is None. Returns the detection, pipeline and sampling results of the segment.
+        """
+        width, height = task['frame_size']
+        
+        out = None
+        if task['output_path']:
+            out = cv2.VideoWriter(
+                task['output_path'], cv2.VideoWriter_fourcc(*'mp4v'), task['fps'], (width, height)
+            )
+        track = DetectionTrack(task['detector_key'], task['fps'], width, height)
+        
+        # Segments of unknown length run to the end of the video
+        frame_count = task['end_frame'] - task['start_frame'] if task['end_frame'] is not None else float('inf')
+        
+        try:
+            result = self._run_detection_pipeline(
+                SegmentCapture(cap, frame_count), out, detector, task['detector_key'],
+                task['conf_threshold'], task['iou_threshold'], task['image_size'],
+                AdaptiveFrameSampler(**task['sampler']), batch_size=task['batch_size'],
+                alert=alert, frame_offset=task['start_frame'], track=track
+            )
+        finally:
+            if out is not None:
+                out.release()
+        
+        self._log_pipeline_stats(f"{task['video_path']} segment {task['index']}", result['pipeline'])
+        
+        result['index'] = task['index']
+        result['output_path'] = task['output_path']
+        result['track'] = track
+        return result
+    
+    def _job_dir(self, job):
+        return os.path.join(settings.MEDIA_ROOT, 'alerts', 'jobs', str(job.id))
+    
+    def _checkpoint_path(self, job, index):
+        return os.path.join(self._job_dir(job), f"segment_{index:04d}.pkl")
+    
+    def _save_checkpoint(self, job, index, result, accumulator):
+        """Persist a finished segment and record the job's progress"""
+        path = self._checkpoint_path(job, index)
+        partial_path = f"{path}.partial"
+        
+        # Write then rename, so a crash never leaves a truncated checkpoint behind
+        with open(partial_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(partial_path, path)
+        
+        # Raise the alert confidence with what is known so far
+        accumulator.merge(result['accumulator'])
+        accumulator.flush()
+        
+        job.completed_segments = sorted(job.completed_segments + [index])
+        job.processed_frames += result['sampling']['frames']
+        job.stats = {'detections': accumulator.to_dict()}
+        job.heartbeat = timezone.now()
+        job.save_owned(['completed_segments', 'processed_frames', 'stats', 'heartbeat', 'updated_at'])
+    
+    def _load_checkpoint(self, job, index):
+        with open(self._checkpoint_path(job, index), 'rb') as f:
+            return pickle.load(f)
+    
+    def _finish_job(self, job, detector, results, accumulator, elapsed):
+        """Combine the segment results into the output video or detections file and complete the alert"""
+        alert = job.alert
+        
+        if job.output_mode == 'annotated':
+            concat_segments(
+                [result['output_path'] for result in results], job.output_path, job.fps, (job.width, job.height)
+            )
+        else:
+            # The last segment reads past the reported frame count when the container undercounts
+            frame_count = max(job.total_frames, sum(result['sampling']['frames'] for result in results))
+            track = DetectionTrack(job.detector_key, job.fps, job.width, job.height, frame_count)
+            for result in results:
+                track.merge(result['track'])
+            self._save_detection_track(alert, track, job.base_name)
+        
+        # Merge the segment statistics; frame numbers are already relative to the whole video
+        frame_buffer = self._create_frame_buffer()
+        sampling = {}
+        for result in results:
+            frame_buffer.merge(result['frame_buffer'])
+            for key in ('frames', 'sampled', 'motion_frames', 'scene_changes',
+                        'baseline_inferences', 'saved_inferences'):
+                sampling[key] = sampling.get(key, 0) + result['sampling'][key]
+        accumulator.flush()
+        
+        frames = job.processed_frames - job.attempt_start_frames
+        self.last_run_stats = {
+            'job': job.id,
+            'segments': len(results),
+            'elapsed_seconds': round(elapsed, 3),
+            'fps': round(frames / elapsed, 2) if elapsed else 0.0,
+            'pipeline': [result['pipeline'] for result in results],
+            'sampling': sampling,
+            'detections': accumulator.to_dict(),
+        }
+        logger.info(
+            f"Processed {sampling['frames']} frames from {job.video_path} in {len(results)} segments "
+            f"({frames} in this attempt at {self.last_run_stats['fps']} FPS); sampled {sampling['sampled']} "
+            f"frames, saving {sampling['saved_inferences']} of {sampling['baseline_inferences']} inferences"
+        )
+        
+        # Update the alert with detection statistics
+        if accumulator.count > 0:
+            description = f"Detected {detector.name.lower()} in {accumulator.count} frames. "
+            description += f"Average confidence: {accumulator.mean_confidence:.2f}."
+            
+            alert.description = description
+            alert.save(update_fields=['description'])
+            
+            # Thumbnail and previews come from the frames kept during processing
+            self._save_previews(alert, frame_buffer, job.detector_key)
+        else:
+            # No detections found
+            alert.status = 'false_positive'
+            alert.description = f"No {detector.name.lower()} detected in the video."
+            alert.save(update_fields=['status', 'description'])
+        
+        job.status = 'completed'
+        job.completed_at = timezone.now()
+        job.stats = {'detections': accumulator.to_dict(), 'sampling': sampling}
+        job.save_owned(['status', 'completed_at', 'stats', 'updated_at'])
+        
+        shutil.rmtree(self._job_dir(job), ignore_errors=True)
+        
+        logger.info(f"Video processing complete. Output saved to: {job.output_path}")
+        return job.output_path, alert
     
     def process_camera_stream(self, camera_id, detector_key, duration=60, frame_limit=300):
         """
@@ -202,8 +511,8 @@ class VideoProcessor:
             # Get the stream URL
             stream_url = camera.get_stream_url()
             
-            # Open the stream
-            cap = cv2.VideoCapture(stream_url)
+            # Open the stream; detection runs on a reduced view, full frames are only recorded
+            cap = open_stream(stream_url, max_dim=working_size(image_size))
             if not cap.isOpened():
                 logger.error(f"Failed to open camera stream: {stream_url}")
                 camera.status = 'offline'
@@ -245,72 +554,47 @@ class VideoProcessor:
             
             # Variables for detection tracking
             frame_count = 0
-            detection_count = 0
-            detection_frames = []
-            detection_confidences = []
+            accumulator = DetectionAccumulator(alert)
+            frame_buffer = self._create_frame_buffer()
+            
+            # Motion decides which frames are worth running the detector on
+            sampler = AdaptiveFrameSampler.from_camera(camera)
             
             # Process frames for the specified duration
             start_time = time.time()
             
             while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
+                frame = cap.read_frame()
+                if frame is None:
                     break
                     
                 frame_count += 1
                 
-                # Process every nth frame to reduce processing load
-                if frame_count % camera.frame_rate == 0:
+                if sampler.should_sample(frame.image):
                     try:
-                        # Process the frame
-                        annotated_frame, results = detector.predict_video_frame(
-                            frame, conf_threshold, iou_threshold, image_size
+                        # Detect without drawing, then render only the boxes being written
+                        detections = detector.detect(
+                            frame.image, conf_threshold, iou_threshold, image_size
                         )
                         
                         # Check if any detections with required confidence
-                        has_detection = False
-                        confidence = 0.0
-                        
-                        for r in results:
-                            if r.boxes is not None and len(r.boxes) > 0:
-                                # Get the confidences
-                                confidences = r.boxes.conf.tolist()
-                                
-                                if confidences:
-                                    max_conf = max(confidences)
-                                    if max_conf >= conf_threshold:
-                                        has_detection = True
-                                        confidence = max(confidence, max_conf)
-                                        detection_frames.append(frame_count)
-                                        detection_confidences.append(max_conf)
-                                        detection_count += 1
+                        confidence = detections.max_confidence(conf_threshold)
+                        if confidence is not None:
+                            # The alert confidence is written periodically, not per frame
+                            accumulator.add(frame_count, confidence)
+                            # Keep a copy before the boxes are drawn onto the frame
+                            frame_buffer.add(frame_count, frame.image, confidence, detections)
                         
                         # Write the annotated frame
-                        out.write(annotated_frame)
-                        
-                        # If we have a detection, update the alert
-                        if has_detection and confidence > alert.confidence:
-                            alert.confidence = confidence
-                            
-                            # Adjust severity based on confidence
-                            if confidence >= 0.9:
-                                alert.severity = 'critical'
-                            elif confidence >= 0.7:
-                                alert.severity = 'high'
-                            elif confidence >= 0.5:
-                                alert.severity = 'medium'
-                            else:
-                                alert.severity = 'low'
-                                
-                            alert.save(update_fields=['confidence', 'severity'])
+                        out.write(render_detections(frame.full, {detector_key: frame.to_full(detections)}, copy=False))
                             
                     except Exception as e:
                         logger.error(f"Error processing frame {frame_count}: {str(e)}")
                         # Write the original frame
-                        out.write(frame)
+                        out.write(frame.full)
                 else:
                     # Write the original frame
-                    out.write(frame)
+                    out.write(frame.full)
                 
                 # Check if we've processed enough frames or reached the time limit
                 elapsed_time = time.time() - start_time
@@ -321,22 +605,23 @@ class VideoProcessor:
             cap.release()
             out.release()
             
+            accumulator.flush()
+            self.last_run_stats = {
+                'sampling': sampler.get_stats(),
+                'detections': accumulator.to_dict(),
+            }
+            self._log_sampling_stats(f"camera {camera_id}", sampler)
+            
             # Update the alert with detection statistics
-            if detection_count > 0:
-                description = f"Detected {detector.name.lower()} in {detection_count} frames. "
-                description += f"Average confidence: {sum(detection_confidences) / len(detection_confidences):.2f}."
+            if accumulator.count > 0:
+                description = f"Detected {detector.name.lower()} in {accumulator.count} frames. "
+                description += f"Average confidence: {accumulator.mean_confidence:.2f}."
                 
                 alert.description = description
                 alert.save(update_fields=['description'])
                 
-                # Create thumbnail from a frame with detection
-                if detection_frames:
-                    # Use the frame with highest confidence for thumbnail
-                    best_frame_idx = detection_confidences.index(max(detection_confidences))
-                    
-                    # Extract the thumbnail
-                    # In this case, we need to create it from the output video
-                    self._create_thumbnail_from_output(output_path, alert, detection_frames[best_frame_idx])
+                # Thumbnail and previews come from the frames kept during processing
+                self._save_previews(alert, frame_buffer, detector_key)
             else:
                 # No detections found
                 alert.status = 'false_positive'
@@ -353,53 +638,300 @@ class VideoProcessor:
             logger.error(f"Error in camera stream processing: {str(e)}")
             raise
     
-    def _create_thumbnail(self, video_path, alert, frame_number):
-        """Create a thumbnail from a specific frame in the video"""
+    def render_annotated_video(self, alert):
+        """
+        Render the boxes of an alert's detections file onto its video.
+        The result is cached next to the alert videos and reused while the detections file
+        is unchanged. Returns the path of the annotated video.
+        """
+        output_path = self._annotated_video_path(alert)
+        if self.get_annotated_video(alert):
+            return output_path
+        
+        video_path = os.path.join(settings.MEDIA_ROOT, str(alert.video_file))
+        track_path = os.path.join(settings.MEDIA_ROOT, str(alert.detections_file))
+        
+        rendered_dir = os.path.dirname(output_path)
+        os.makedirs(rendered_dir, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(str(alert.video_file)))[0]
+        
+        track = DetectionTrack.load(track_path)
+        
+        cap = open_video(video_path)
+        if not cap.isOpened():
+            logger.error(f"Failed to open video file: {video_path}")
+            raise ValueError(f"Failed to open video file: {video_path}")
+        
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        
+        # Render to a private file first so concurrent requests never serve a partial video
+        partial_path = os.path.join(rendered_dir, f"{base_name}_{uuid.uuid4().hex[:8]}.partial.mp4")
+        out = cv2.VideoWriter(partial_path, cv2.VideoWriter_fourcc(*'mp4v'), track.fps, (width, height))
+        
+        pipeline = VideoPipeline(
+            cap, out,
+            render=lambda frame, detections: render_detections(frame.full, {track.detector_key: detections}, copy=False)
+        )
         try:
-            cap = cv2.VideoCapture(video_path)
+            pipeline.run(lambda frame_number, frame: [(frame, track.get(frame_number))])
+        finally:
+            cap.release()
+            out.release()
+        
+        os.replace(partial_path, output_path)
+        return output_path
+    
+    def get_annotated_video(self, alert):
+        """Return the path of the alert's rendered video if it is up to date, else None"""
+        output_path = self._annotated_video_path(alert)
+        track_path = os.path.join(settings.MEDIA_ROOT, str(alert.detections_file))
+        if os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(track_path):
+            return output_path
+        return None
+    
+    def _annotated_video_path(self, alert):
+        base_name = os.path.splitext(os.path.basename(str(alert.video_file)))[0]
+        return os.path.join(settings.MEDIA_ROOT, 'alerts', 'rendered', f"{base_name}_annotated.mp4")
+    
+    def _get_output_mode(self, output_mode):
+        output_mode = output_mode or settings.DETECTION_SETTINGS['VIDEO_OUTPUT_MODE']
+        if output_mode not in ('annotated', 'sidecar'):
+            logger.error(f"Unknown video output mode: {output_mode}")
+            raise ValueError(f"Unknown video output mode: {output_mode}")
+        return output_mode
+    
+    def _store_original_video(self, video_path, base_name):
+        """
+        Keep the original video with the alert videos. It is remuxed into MP4 without
+        re-encoding when ffmpeg is available and copied as-is otherwise.
+        Returns the stored file name.
+        """
+        if shutil.which('ffmpeg'):
+            video_filename = f"{base_name}.mp4"
+            try:
+                subprocess.run(
+                    [
+                        'ffmpeg', '-y', '-v', 'error', '-i', video_path,
+                        '-map', '0:v', '-map', '0:a?', '-c', 'copy', '-movflags', '+faststart',
+                        os.path.join(self.output_dir, video_filename)
+                    ],
+                    capture_output=True, timeout=3600, check=True
+                )
+                return video_filename
+            except (subprocess.SubprocessError, OSError) as e:
+                logger.warning(f"Could not remux {video_path}, copying it instead: {str(e)}")
+        
+        video_filename = f"{base_name}{os.path.splitext(video_path)[1] or '.mp4'}"
+        shutil.copyfile(video_path, os.path.join(self.output_dir, video_filename))
+        return video_filename
+    
+    def _save_detection_track(self, alert, track, base_name):
+        """Write the detections file of a sidecar-mode video and attach it to the alert"""
+        detections_dir = os.path.join(settings.MEDIA_ROOT, 'alerts', 'detections')
+        os.makedirs(detections_dir, exist_ok=True)
+        
+        detections_filename = f"{base_name}.json.gz"
+        track.save(os.path.join(detections_dir, detections_filename))
+        
+        alert.detections_file = f"alerts/detections/{detections_filename}"
+        alert.save(update_fields=['detections_file'])
+    
+    def _create_video_alert(self, detector, detector_key, camera, video_filename):
+        """Create the alert for a processed video file"""
+        alert = Alert.objects.create(
+            title=f"{detector.name} Detection",
+            description=f"Automatic detection of {detector.name.lower()} in video.",
+            alert_type=detector_key,
+            severity='medium',  # Default severity
+            camera=camera,
+            location=camera.location if camera else None,
+            video_file=f"alerts/videos/{video_filename}"
+        )
+        return alert
+    
+    def _video_sampler_options(self, camera):
+        """Sampler settings for uploaded videos"""
+        # Static stretches are skipped; busy scenes run at most at the previous fixed rate of
+        # every 5th frame. Camera strides are tuned for live streams (default every 2nd frame),
+        # which would more than double the detector work on uploads.
+        if camera:
+            options = AdaptiveFrameSampler.camera_options(camera, baseline_stride=5)
+            options['motion_stride'] = max(options['motion_stride'], 5)
+            return options
+        return {'motion_stride': 5, 'idle_stride': 30, 'baseline_stride': 5}
+    
+    def _run_detection_pipeline(self, cap, out, detector, detector_key, conf_threshold, iou_threshold,
+                                image_size, sampler, batch_size=None, alert=None, frame_offset=0, track=None):
+        """
+        Run the detector over every frame of cap chosen by the sampler and write the annotated
+        video to out, or only record the detections in track when out is None.
+        frame_offset is added to the reported frame numbers, and the alert confidence is
+        raised periodically as detections come in when an alert is given.
+        Returns the detection statistics and the pipeline and sampling statistics.
+        """
+        # Variables for detection tracking
+        accumulator = DetectionAccumulator(alert)
+        # The best frames are kept as they go by for the thumbnail and previews
+        frame_buffer = self._create_frame_buffer()
+        
+        # Sampled frames are run through the detector in batches; frames are
+        # held in order until their batch has run so the output stays in sequence.
+        # Offline processing has no latency budget, so batches only close when full.
+        batcher = FrameBatcher(
+            detector, conf_threshold, iou_threshold, image_size,
+            batch_size=batch_size or settings.DETECTION_SETTINGS['VIDEO_BATCH_SIZE'],
+            max_wait=None
+        )
+        pending_frames = deque()
+        frame_detections = {}
+        
+        def record(batch_outputs):
+            if track is not None:
+                for (frame_number, frame), detections in batch_outputs:
+                    track.add(frame_number, frame.to_full(detections))
             
-            # Seek to the specific frame
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            self._handle_batch_outputs(batch_outputs, frame_detections, accumulator, frame_buffer, conf_threshold)
+        
+        def process_frame(frame_number, frame):
+            frame_number += frame_offset
+            # Sampling and detection only touch the reduced view of the frame
+            sampled = sampler.should_sample(frame.image)
+            
+            # Without an output video there is nothing to hold frames back for
+            if out is not None:
+                pending_frames.append((frame_number, frame, sampled))
+            
+            if sampled:
+                record(batcher.add(frame.image, context=(frame_number, frame)))
+            
+            if out is None:
+                frame_detections.clear()
+                return []
+            return self._pop_ready_frames(pending_frames, frame_detections)
+        
+        def finish():
+            # Run whatever is left in the last partial batch
+            record(batcher.flush())
+            return self._pop_ready_frames(pending_frames, frame_detections, flush=True)
+        
+        # Decoding and encoding run on their own threads, overlapping with inference
+        pipeline = VideoPipeline(
+            cap, out,
+            render=lambda frame, detections: render_detections(frame.full, {detector_key: detections}, copy=False)
+        )
+        pipeline_stats = pipeline.run(process_frame, finish)
+        
+        return {
+            'detection_count': accumulator.count,
+            'accumulator': accumulator,
+            'frame_buffer': frame_buffer,
+            'pipeline': pipeline_stats,
+            'sampling': sampler.get_stats(),
+        }
+    
+    def _handle_batch_outputs(self, batch_outputs, frame_detections, accumulator, frame_buffer, conf_threshold):
+        """
+        Record the results of a finished batch: keep the detections for rendering at
+        write time and add the frames with a detection to the accumulator and frame buffer.
+        Batch contexts are (frame_number, VideoFrame) pairs; detections are on frame.image.
+        """
+        for (frame_number, frame), detections in batch_outputs:
+            # Failed batches are recorded as None so their frames are written unannotated
+            frame_detections[frame_number] = frame.to_full(detections)
+            if detections is None:
+                continue
+            
+            # Check if any detections with required confidence
+            confidence = detections.max_confidence(conf_threshold)
+            if confidence is None:
+                continue
+            
+            accumulator.add(frame_number, confidence)
+            frame_buffer.add(frame_number, frame.image, confidence, detections)
+    
+    def _log_pipeline_stats(self, source, stats):
+        """Log the throughput of a pipelined run and the time spent in each stage"""
+        stage_times = ", ".join(
+            f"{name} {stage['ms_per_frame']} ms/frame" for name, stage in stats['stages'].items()
+        )
+        logger.info(
+            f"Processed {stats['frames']} frames from {source} at {stats['fps']} FPS "
+            f"({stage_times}; bottleneck: {stats['bottleneck']})"
+        )
+    
+    def _log_sampling_stats(self, source, sampler):
+        """Log how many frames were sampled and how many inferences adaptive sampling saved"""
+        stats = sampler.get_stats()
+        logger.info(
+            f"Sampled {stats['sampled']} of {stats['frames']} frames from {source} "
+            f"({stats['motion_frames']} with motion, {stats['scene_changes']} scene changes), "
+            f"saving {stats['saved_inferences']} of {stats['baseline_inferences']} inferences"
+        )
+    
+    def _pop_ready_frames(self, pending_frames, frame_detections, flush=False):
+        """
+        Take queued frames in order, stopping at the first sampled frame whose batch has
+        not run yet. Returns (frame, detections) pairs; boxes are rendered by the encoder.
+        With flush=True everything left is returned.
+        """
+        ready = []
+        
+        while pending_frames:
+            frame_number, frame, sampled = pending_frames[0]
             
-            # Read the frame
-            ret, frame = cap.read()
-            if not ret:
-                logger.error(f"Failed to read frame {frame_number} for thumbnail.")
-                cap.release()
-                return
+            if sampled and frame_number not in frame_detections and not flush:
+                break
             
-            # Generate thumbnail path
+            pending_frames.popleft()
+            ready.append((frame, frame_detections.pop(frame_number, None)))
+        
+        return ready
+    
+    def _create_frame_buffer(self):
+        return TopFrameBuffer(
+            size=settings.DETECTION_SETTINGS['PREVIEW_FRAMES'],
+            min_gap=settings.DETECTION_SETTINGS['PREVIEW_MIN_GAP']
+        )
+    
+    def _save_previews(self, alert, frame_buffer, detector_key):
+        """
+        Save the alert thumbnail from the best buffered frame, plus a contact sheet and an
+        animated preview of all buffered frames when enabled.
+        """
+        best = frame_buffer.best()
+        if best is None:
+            return
+        
+        try:
             thumbnail_dir = os.path.join(settings.MEDIA_ROOT, 'alerts', 'thumbnails')
             if not os.path.exists(thumbnail_dir):
                 os.makedirs(thumbnail_dir)
-                
-            thumbnail_filename = f"thumb_{os.path.basename(alert.video_file).split('.')[0]}.jpg"
-            thumbnail_path = os.path.join(thumbnail_dir, thumbnail_filename)
-            
-            # Resize the frame to create a thumbnail
-            height, width = frame.shape[:2]
-            max_dim = 400
-            if height > width:
-                new_height = max_dim
-                new_width = int(width * (max_dim / height))
-            else:
-                new_width = max_dim
-                new_height = int(height * (max_dim / width))
-                
-            thumbnail = cv2.resize(frame, (new_width, new_height))
             
-            # Save the thumbnail
-            cv2.imwrite(thumbnail_path, thumbnail)
+            base_name = os.path.basename(str(alert.video_file)).split('.')[0]
+            update_fields = ['thumbnail']
             
-            # Update the alert with the thumbnail path
+            frame_number, frame, detections = best
+            thumbnail_filename = f"thumb_{base_name}.jpg"
+            cv2.imwrite(os.path.join(thumbnail_dir, thumbnail_filename), make_thumbnail(frame))
             alert.thumbnail = f"alerts/thumbnails/{thumbnail_filename}"
-            alert.save(update_fields=['thumbnail'])
             
-            cap.release()
+            if settings.DETECTION_SETTINGS['CONTACT_SHEET'] and len(frame_buffer) > 1:
+                sheet_filename = f"sheet_{base_name}.jpg"
+                sheet = make_contact_sheet(frame_buffer.by_confidence(), detector_key)
+                cv2.imwrite(os.path.join(thumbnail_dir, sheet_filename), sheet)
+                alert.contact_sheet = f"alerts/thumbnails/{sheet_filename}"
+                update_fields.append('contact_sheet')
+            
+            if settings.DETECTION_SETTINGS['ANIMATED_PREVIEW'] and len(frame_buffer) > 1:
+                preview_filename = f"preview_{base_name}.gif"
+                save_animated_preview(
+                    frame_buffer.by_time(), detector_key, os.path.join(thumbnail_dir, preview_filename)
+                )
+                alert.preview = f"alerts/thumbnails/{preview_filename}"
+                update_fields.append('preview')
+            
+            alert.save(update_fields=update_fields)
             
         except Exception as e:
             logger.error(f"Error creating thumbnail: {str(e)}")
-    
-    def _create_thumbnail_from_output(self, video_path, alert, frame_number):
-        """Create a thumbnail from a specific frame in the output video"""
-        self._create_thumbnail(video_path, alert, frame_number)
\ No newline at end of file
@@ -0,0 +1,156 @@
+import os
+import shutil
+import subprocess
+import logging
+import cv2
+
+logger = logging.getLogger('security_ai')
+
+def probe_keyframes(video_path):
+    """
+    Return the indices of the keyframes of the first video stream, using ffprobe.
+    Returns None when ffprobe is not installed or fails.
+    """
+    if not shutil.which('ffprobe'):
+        return None
+
+    try:
+        result = subprocess.run(
+            [
+                'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                '-show_entries', 'packet=flags', '-of', 'csv=p=0', video_path
+            ],
+            capture_output=True, text=True, timeout=300, check=True
+        )
+    except (subprocess.SubprocessError, OSError) as e:
+        logger.warning(f"Could not probe keyframes of {video_path}: {str(e)}")
+        return None
+
+    flags = [line.strip() for line in result.stdout.splitlines() if line.strip()]
+    return [index for index, flag in enumerate(flags) if flag.startswith('K')]
+
+
+def plan_segments(total_frames, segment_count, keyframes=None, min_segment_frames=1):
+    """
+    Split frames 0..total_frames into up to segment_count (start, end) ranges of similar
+    length. Boundaries are moved to the next keyframe when keyframes are known, so each
+    segment can be decoded from its start without reading the previous one.
+    Frame counts reported by containers can be short, so the last segment has no end
+    (None) and reads to the end of the video.
+    """
+    segment_count = max(1, min(segment_count, total_frames // max(1, min_segment_frames)))
+    candidates = sorted(set(keyframes)) if keyframes else None
+
+    boundaries = [0]
+    for index in range(1, segment_count):
+        target = total_frames * index // segment_count
+
+        if candidates is not None:
+            target = next((k for k in candidates if k >= target), total_frames)
+
+        if boundaries[-1] < target < total_frames:
+            boundaries.append(target)
+
+    boundaries.append(None)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+class SegmentCapture:
+    """Reads a fixed number of frames from a capture positioned at the segment start"""
+
+    def __init__(self, cap, frame_count):
+        self.cap = cap
+        self.remaining = frame_count
+
+    def read_frame(self):
+        if self.remaining <= 0:
+            return None
+
+        self.remaining -= 1
+        return self.cap.read_frame()
+
+    def release(self):
+        self.cap.release()
+
+
+def concat_segments(segment_paths, output_path, fps, frame_size):
+    """
+    Join the annotated segment files into one video, in order.
+    Segments are copied without re-encoding with ffmpeg's concat demuxer when ffmpeg
+    is installed, otherwise they are re-encoded frame by frame with OpenCV.
+    """
+    if len(segment_paths) == 1:
+        shutil.move(segment_paths[0], output_path)
+        return output_path
+
+    if shutil.which('ffmpeg'):
+        list_path = f"{output_path}.segments.txt"
+        with open(list_path, 'w') as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+
+        try:
+            subprocess.run(
+                [
+                    'ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0',
+                    '-i', list_path, '-c', 'copy', output_path
+                ],
+                capture_output=True, timeout=3600, check=True
+            )
+            return output_path
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.warning(f"ffmpeg concat failed, re-encoding segments instead: {str(e)}")
+        finally:
+            os.remove(list_path)
+
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, frame_size)
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        out.release()
+
+    return output_path
+
+
+def init_segment_worker(torch_threads):
+    """Set up Django in a freshly spawned segment worker process"""
+    # Segment workers load only the model they need, on first use
+    os.environ['DETECTION_PRELOAD_MODELS'] = 'False'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'security_ai_system.settings')
+
+    import django
+    django.setup()
+
+    # Split the cores between the workers instead of every worker claiming all of them
+    import torch
+    torch.set_num_threads(max(1, torch_threads))
+
+
+def process_segment(task):
+    """
+    Process one segment of a video in a worker process with its own detector instance.
+    task holds the video path, frame range, detector settings and segment output path.
+    Returns the segment's detections with frame numbers relative to the whole video.
+    """
+    from utils.video_processor import VideoProcessor
+    from utils.video_sources import open_video
+
+    processor = VideoProcessor()
+    detector = processor.model_manager.get_detector(task['detector_key'])
+
+    cap = open_video(task['video_path'], **task['decode'])
+    if not cap.isOpened():
+        raise ValueError(f"Failed to open video file: {task['video_path']}")
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, task['start_frame'])
+    try:
+        return processor.process_segment(cap, task, detector)
+    finally:
+        cap.release()
@@ -0,0 +1,307 @@
+import logging
+import cv2
+from django.conf import settings
+
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    av = None
+    PYAV_AVAILABLE = False
+
+logger = logging.getLogger('security_ai')
+
+class VideoFrame:
+    """
+    A decoded frame. image is a view at working resolution, small enough for sampling,
+    detection and display; the full-resolution frame is only converted or kept when full
+    is read, e.g. to write it to a video.
+    Boxes detected on image are mapped onto the full frame with to_full.
+    """
+
+    __slots__ = ('image', 'full_size', '_full', '_materialize')
+
+    def __init__(self, image, full=None, materialize=None, full_size=None):
+        """
+        full is the full-resolution frame when it already exists, materialize a callable
+        producing it on first use. With neither, image is the full-resolution frame.
+        """
+        self.image = image
+        self._full = full
+        self._materialize = materialize
+        if full_size is None:
+            full_size = (full.shape[1], full.shape[0]) if full is not None else (image.shape[1], image.shape[0])
+        self.full_size = full_size
+
+    @property
+    def full(self):
+        if self._full is None:
+            self._full = self._materialize() if self._materialize is not None else self.image
+            self._materialize = None
+        return self._full
+
+    @property
+    def scale(self):
+        """Size of image relative to the full frame"""
+        return self.image.shape[1] / self.full_size[0]
+
+    def to_full(self, detections):
+        """Return detections on image with their boxes in full-resolution coordinates"""
+        if detections is None or self.scale == 1.0:
+            return detections
+        return detections.scaled(1.0 / self.scale)
+
+
+class FrameSource:
+    """
+    Base class of the video sources shared by offline processing and live streaming.
+    read_frame returns VideoFrames; read, get, set, isOpened and release mirror
+    cv2.VideoCapture, with get reporting the full-resolution frame size.
+    """
+
+    def read_frame(self):
+        """Return the next VideoFrame, or None at the end of the video"""
+        raise NotImplementedError
+
+    def read(self):
+        frame = self.read_frame()
+        if frame is None:
+            return False, None
+        return True, frame.image
+
+    def get(self, prop):
+        return 0
+
+    def set(self, prop, value):
+        return False
+
+    def isOpened(self):
+        return False
+
+    def release(self):
+        pass
+
+
+def _scaled_size(width, height, max_dim):
+    """Frame size fitting max_dim, with the even dimensions encoders and swscale want"""
+    if not max_dim or max(width, height) <= max_dim:
+        return width, height
+
+    scale = max_dim / max(width, height)
+    return max(2, int(width * scale / 2) * 2), max(2, int(height * scale / 2) * 2)
+
+
+class OpenCVSource(FrameSource):
+    """
+    A cv2.VideoCapture as a frame source. OpenCV always decodes at full resolution, so
+    image is resized from the decoded frame, which is kept as full.
+    """
+
+    def __init__(self, cap, max_dim=None):
+        self.cap = cap
+        self.max_dim = max_dim
+
+    def read_frame(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+
+        height, width = frame.shape[:2]
+        size = _scaled_size(width, height, self.max_dim)
+        if size == (width, height):
+            return VideoFrame(frame)
+        return VideoFrame(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), full=frame)
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVSource(FrameSource):
+    """
+    Reads a video file or network stream through FFmpeg (PyAV).
+    Decoding runs on FFmpeg's frame and slice threads. image is converted to BGR and
+    scaled down to max_dim in one swscale pass, and the decoded frame is only converted
+    at full resolution when full is read, so full-resolution BGR frames of large videos
+    and cameras are never materialized otherwise.
+    With skip_non_reference the decoder drops frames no other frame depends on, and the
+    previous frame is returned in their place so frame numbers stay aligned with the file.
+    """
+
+    def __init__(self, path, max_dim=None, threads=0, thread_type='AUTO', skip_non_reference=False,
+                 options=None):
+        """
+        Open the video.
+        max_dim caps the longest side of image; threads is the number of decoder threads
+        (0 = FFmpeg's choice, usually one per core). Frame threading ('AUTO') holds back
+        a frame per thread, so live sources use 'SLICE'. options are passed to FFmpeg when
+        opening, e.g. the RTSP transport.
+        """
+        self.path = path
+        self.container = av.open(path, options=options or {})
+        self.stream = self.container.streams.video[0]
+        self.stream.thread_type = thread_type
+        self.stream.thread_count = threads
+        if skip_non_reference:
+            self.stream.codec_context.skip_frame = 'NONREF'
+        self.skip_non_reference = skip_non_reference
+
+        self.fps = float(self.stream.average_rate or self.stream.guessed_rate or 0)
+        self.source_width = self.stream.codec_context.width
+        self.source_height = self.stream.codec_context.height
+        self.width, self.height = _scaled_size(self.source_width, self.source_height, max_dim)
+
+        # Containers without a frame count in the header (mkv, webm, fragmented MP4) report 0,
+        # i.e. unknown; an estimate from the duration is often short and would be taken as exact
+        self.frame_count = self.stream.frames or 0
+
+        self.start_time = float(self.stream.start_time * self.stream.time_base) if self.stream.start_time else 0.0
+        self.position = 0
+        self.opened = True
+        self._frames = self.container.decode(self.stream)
+        self._last = None
+        self._ahead = None
+
+    def isOpened(self):
+        return self.opened
+
+    def read_frame(self):
+        if self._ahead is None:
+            self._ahead = self._decode_next()
+            if self._ahead is None:
+                return None
+
+        index, frame = self._ahead
+        if self.skip_non_reference and self._last is not None and index > self.position:
+            # Stand in for a frame the decoder skipped
+            self.position += 1
+            return self._last
+
+        self._ahead = None
+        self._last = self._to_video_frame(frame)
+        self.position += 1
+        return self._last
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.source_width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.source_height
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        return 0
+
+    def set(self, prop, value):
+        """Seek to a frame number (CAP_PROP_POS_FRAMES); the landing frame is exact, unlike OpenCV"""
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+
+        target = int(value)
+        if self.fps:
+            # Land on the keyframe before the target, then decode forward to it
+            timestamp = int((self.start_time + target / self.fps) / self.stream.time_base)
+            self.container.seek(timestamp, stream=self.stream, backward=True, any_frame=False)
+            self._frames = self.container.decode(self.stream)
+
+        self._last = None
+        self._ahead = None
+        while True:
+            ahead = self._decode_next()
+            if ahead is None or ahead[0] >= target:
+                self._ahead = ahead
+                self.position = target
+                return True
+
+    def release(self):
+        if self.opened:
+            self.container.close()
+            self.opened = False
+
+    def _decode_next(self):
+        try:
+            frame = next(self._frames)
+        except StopIteration:
+            return None
+
+        if frame.time is not None and self.fps:
+            index = int(round((frame.time - self.start_time) * self.fps))
+        else:
+            index = self.position
+        return index, frame
+
+    def _to_video_frame(self, frame):
+        image = frame.to_ndarray(width=self.width, height=self.height, format='bgr24')
+        if (self.width, self.height) == (frame.width, frame.height):
+            return VideoFrame(image)
+        return VideoFrame(
+            image,
+            materialize=lambda: frame.to_ndarray(format='bgr24'),
+            full_size=(frame.width, frame.height)
+        )
+
+
+def open_video(path, image_size=None, skip_non_reference=False):
+    """
+    Open a video file for offline processing.
+    Uses PyAV when VIDEO_DECODER is 'pyav', or 'auto' and PyAV is installed, and OpenCV
+    otherwise. With an image_size, frame images are at most DECODE_SCALE times the
+    model input.
+    """
+    max_dim = working_size(image_size)
+
+    if _use_pyav():
+        try:
+            return PyAVSource(
+                path,
+                max_dim=max_dim,
+                threads=settings.DETECTION_SETTINGS['DECODE_THREADS'],
+                skip_non_reference=skip_non_reference
+            )
+        except Exception as e:
+            logger.warning(f"PyAV could not open {path}, using OpenCV instead: {str(e)}")
+
+    return OpenCVSource(cv2.VideoCapture(path), max_dim=max_dim)
+
+
+def open_stream(url, max_dim=None):
+    """
+    Open a live camera stream, with frame images at most max_dim.
+    Uses the same decoder choice as open_video, tuned for latency instead of throughput.
+    """
+    if _use_pyav():
+        options = {'fflags': 'nobuffer', 'flags': 'low_delay'}
+        if url.startswith('rtsp://'):
+            options['rtsp_transport'] = 'tcp'
+        try:
+            return PyAVSource(url, max_dim=max_dim, thread_type='SLICE', options=options)
+        except Exception as e:
+            logger.warning(f"PyAV could not open {url}, using OpenCV instead: {str(e)}")
+
+    cap = cv2.VideoCapture(url)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return OpenCVSource(cap, max_dim=max_dim)
+
+
+def working_size(image_size):
+    """Longest side of the frame images detection runs on for a model input size"""
+    scale = settings.DETECTION_SETTINGS['DECODE_SCALE']
+    return int(image_size * scale) if image_size and scale else None
+
+
+def _use_pyav():
+    decoder = settings.DETECTION_SETTINGS['VIDEO_DECODER']
+    if decoder == 'pyav' and not PYAV_AVAILABLE:
+        logger.warning("VIDEO_DECODER is 'pyav' but PyAV is not installed; using OpenCV")
+    return decoder in ('pyav', 'auto') and PYAV_AVAILABLE